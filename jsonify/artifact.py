@@ -0,0 +1,90 @@
+# jsonify/artifact.py
+# Build a single user artifact on demand:
+#   python3 jsonify/artifact.py <username> <filetype>
+# writes users/<username>/<username>_<filetype>.json (the file server.js serves).
+# Results go through the result cache, so repeated requests don't re-query MySQL.
+import os
+import sys
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from user_analysis import get_contest_cards, get_contest_count_and_best_rank, get_user_rating_history
+from problem_anal import (
+    process_user_data_and_save,
+    get_user_problem_tags,
+    get_problem_count_by_rating,
+    get_user_submissions_by_verdict,
+    get_monthly_problem_count,
+    get_weekly_problem_count,
+    get_daily_activity,
+    get_last_10_submissions,
+    get_unsolved_problems
+)
+from user_basic_info import get_user_basic_info
+from rating_analytics import get_rating_analytics
+from result_cache import users_dir
+
+ARTIFACTS = {
+    "data": process_user_data_and_save,
+    "problem_tags": get_user_problem_tags,
+    "basic_info": get_user_basic_info,
+    "user_rating_history": get_user_rating_history,
+    "rating_analytics": get_rating_analytics,
+    "contest_cards": get_contest_cards,
+    "contest_count_best_rank": get_contest_count_and_best_rank,
+    "problem_count_by_rating": get_problem_count_by_rating,
+    "user_submissions_by_verdict": get_user_submissions_by_verdict,
+    "monthly_problem_count": get_monthly_problem_count,
+    "weekly_problem_count": get_weekly_problem_count,
+    "daily_activity": get_daily_activity,
+    "last_10_submissions": get_last_10_submissions,
+    "unsolved_problems": get_unsolved_problems
+}
+
+def json_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def artifact_path(username, filetype):
+    return os.path.join(users_dir, username, f"{username}_{filetype}.json")
+
+def build_artifact(username, filetype):
+    if filetype not in ARTIFACTS:
+        raise KeyError(f"Unknown artifact: {filetype}")
+    if not username or os.sep in username or username in (".", ".."):
+        raise ValueError(f"Invalid username: {username!r}")
+
+    data = ARTIFACTS[filetype](username)
+    if data is None:
+        raise RuntimeError(f"Failed to build {filetype} for {username}")
+    return write_artifact(username, filetype, data)
+
+def write_artifact(username, filetype, data):
+    file_path = artifact_path(username, filetype)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=json_default)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+def build_all_artifacts(username):
+    return {filetype: build_artifact(username, filetype) for filetype in ARTIFACTS}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 jsonify/artifact.py <username> <filetype>", file=sys.stderr)
+        print(f"Filetypes: {', '.join(ARTIFACTS)}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        print(build_artifact(sys.argv[1], sys.argv[2]))
+    except KeyError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
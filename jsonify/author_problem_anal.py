@@ -1,8 +1,18 @@
 import os
 import sys
 import json
+import time
+import datetime
+import threading
+import socketserver
+from collections import OrderedDict
 from decimal import Decimal
-from db import get_db_connection, close_db_connection, execute_query, execute_query_2
+from concurrent.futures import ProcessPoolExecutor
+from db import get_db_connection, get_pooled_connection, close_db_connection
+from problem_stats import (
+    ensure_problem_stats, fetch_problem_verdict_counts, fetch_problem_title_counts, solver_rating_profiles
+)
+from hll import distinct_users
 
 # Custom JSON encoder to handle Decimal types
 class DecimalEncoder(json.JSONEncoder):
@@ -11,222 +21,283 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
-# Create folder dynamically based on OS
-def get_save_path(filename):
-    # Combine base folder with filename
-    base_path = os.path.join("problem_analysis")
-    os.makedirs(base_path, exist_ok=True)
-    return os.path.join(base_path, filename)
+# problem_analysis/ folder at the repo root, where userController.js reads the reports
+analysis_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "problem_analysis")
 
-# Feature 1: Problem Acceptance Rate (Percentage of Accepted Submissions)
-def problem_acceptance_rate(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT 
-            (SUM(CASE WHEN verdict = 'Accepted' THEN 1 ELSE 0 END) / COUNT(*)) * 100 AS acceptance_rate
-        FROM submissions
-        WHERE problem_id = %s
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        result = cursor.fetchone()
-
-        return {"acceptance_rate": round(float(result[0]), 2) if result and result[0] is not None else 0}
-    finally:
-        close_db_connection(db, cursor)
+# Below this many reports the pool's startup costs more than it saves
+POOL_THRESHOLD = 200
+# Problems per round of aggregate reads when building reports
+REPORT_BATCH = 1000
 
-# Feature 2: Common Errors on the Problem (Including Time Limit Exceeded)
-def common_errors_on_problem(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT 
-            verdict, 
-            COUNT(*) AS error_count
-        FROM submissions
-        WHERE problem_id = %s
-        GROUP BY verdict
-        ORDER BY error_count DESC
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        errors = cursor.fetchall()
-
-        return {
+# Shape shared by every way of serving a report
+def assemble_problem_report(problem_id, actual_rating, verdict_counts, average_user_rating,
+                            successful_submission_count, unique_users, solvers_by_title,
+                            solver_attempt_total, solver_count, solver_rating_profile, date_range=None):
+    total = sum(verdict_counts.values())
+    accepted = verdict_counts.get('Accepted', 0)
+    return {
+        "problem_id": problem_id,
+        "problem_difficulty_rating": {"actual_rating": actual_rating},
+        "problem_acceptance_rate": {
+            "acceptance_rate": round(accepted / total * 100, 2) if total else 0
+        },
+        "common_errors_on_problem": {
             "common_errors": [
-                {
-                    "verdict": error[0],
-                    "error_count": error[1]
-                }
-                for error in errors
+                {"verdict": verdict, "error_count": count}
+                for verdict, count in sorted(verdict_counts.items(), key=lambda item: item[1], reverse=True)
+            ]
+        },
+        "difficulty_perception": {
+            "difficulty_perception": {
+                "average_user_rating": average_user_rating,
+                "successful_submission_count": successful_submission_count,
+                "solver_rating_profile": solver_rating_profile
+            }
+        },
+        "user_interaction_with_problem": {"unique_user_interactions": unique_users, **(date_range or {})},
+        "submissions_by_user_rating_title": {
+            "submissions_by_rating_title": [
+                {"rating_title": title, "user_count": count}
+                for title, count in sorted(solvers_by_title.items(), key=lambda item: item[1], reverse=True)
             ]
+        },
+        "average_submissions_to_solve": {
+            "average_submissions_to_solve": round(float(solver_attempt_total) / solver_count, 2) if solver_count else 0
         }
-    finally:
-        close_db_connection(db, cursor)
+    }
 
-# Feature 3: Difficulty Perception (Based on Submission Ratings)
-def difficulty_perception(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT 
-            AVG(u.rating) AS average_user_rating,
-            COUNT(*) AS successful_submission_count
-        FROM submissions s
-        JOIN users u ON s.username = u.username
-        WHERE s.problem_id = %s AND s.verdict IN ('Accepted', 'Correct')
-        GROUP BY s.problem_id
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        result = cursor.fetchone()
-
-        if result:
-            # Prepare the output with average user rating and submission count
-            return {
-                "difficulty_perception": {
-                    "average_user_rating": result[0],
-                    "successful_submission_count": result[1]
-                }
-            }
-        else:
-            # If no data is found for the problem_id
-            return {
-                "difficulty_perception": {
-                    "average_user_rating": None,
-                    "successful_submission_count": 0
-                }
-            }
-    finally:
-        close_db_connection(db, cursor)
-        
-def get_actual_rating(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT diff_rating
-        FROM problems
-        WHERE problem_id = %s
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        result = cursor.fetchone()
-
-        if result:
-            # Return the actual difficulty rating of the problem
-            return {
-                "actual_rating": result[0]
-            }
-        else:
-            # If the problem_id does not exist
-            return {
-                "actual_rating": None
-            }
-    finally:
-        close_db_connection(db, cursor)
+def _scope_filter(column, problem_ids=None, contest_id=None):
+    if problem_ids is not None:
+        return f"{column} IN ({', '.join(['%s'] * len(problem_ids))})", tuple(problem_ids)
+    if contest_id is not None:
+        return f"{column} IN (SELECT problem_id FROM problems WHERE contest_id = %s)", (contest_id,)
+    return "1 = 1", ()
 
+# Average rating of the rated solvers, from the per-title solver counts and rating sums.
+# Each solver counts once, with their rating at solve time (see problem_stats.py), where
+# the per-problem query used to average current ratings over accepted submissions.
+def _average_solver_rating(title_counts):
+    solvers = sum(count for title, (count, _) in title_counts.items() if title is not None)
+    rating_sum = sum(total for title, (_, total) in title_counts.items() if title is not None)
+    return round(float(rating_sum) / solvers, 2) if solvers else None
 
-# Feature 4: User Interaction with the Problem (Unique users who attempted the problem)
-def user_interaction_with_problem(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT COUNT(DISTINCT username) AS unique_users
-        FROM submissions
-        WHERE problem_id = %s
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        result = cursor.fetchone()
-
-        return {"unique_user_interactions": result[0] if result and result[0] is not None else 0}
-    finally:
-        close_db_connection(db, cursor)
+# Distinct users who attempted the problem between start and end (inclusive ISO dates, either
+# may be None), merged from the daily sketches; returns the count and the range details
+def _ranged_interactions(cursor, db, problem_id, start, end):
+    result = distinct_users(
+        cursor, db, problem_id, "attempted",
+        start=datetime.date.fromisoformat(start) if start else None,
+        end=datetime.date.fromisoformat(end) if end else None
+    )
+    return result["count"], {"start": start, "end": end, "exact": result["exact"], "error": result["error"]}
 
-# Feature 5: Number of people who solved a problem by rating title
-def submissions_by_user_rating_title(problem_id):
-    db, cursor = get_db_connection()
-    try:
-        query = """
-        SELECT 
-            u.rating_title, 
-            COUNT(DISTINCT s.username) AS user_count
-        FROM submissions s
-        JOIN users u ON s.username = u.username
-        WHERE s.problem_id = %s AND s.verdict = 'Accepted'
-        GROUP BY u.rating_title
-        ORDER BY user_count DESC
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        results = cursor.fetchall()
-
-        return {
-            "submissions_by_rating_title": [
-                {
-                    "rating_title": result[0],
-                    "user_count": result[1]
-                }
-                for result in results
-            ]
-        }
-    finally:
-        close_db_connection(db, cursor)
+# Reports for many problems, read from the per-problem aggregates and sketches kept up to
+# date on ingest (problem_stats.py, hll.py) rather than from submissions.
+# Pass problem_ids, or contest_id, or neither for the whole problemset. With start and/or
+# end, unique_user_interactions counts only users who submitted within that date range.
+def fetch_problem_reports(cursor, db, problem_ids=None, contest_id=None, start=None, end=None):
+    if problem_ids is not None and not problem_ids:
+        return {}
+    where, values = _scope_filter("problem_id", problem_ids, contest_id)
+    cursor.execute(f"SELECT problem_id, diff_rating FROM problems WHERE {where}", values)
+    ratings = dict(cursor.fetchall())
+
+    reports = {}
+    scope = list(ratings)
+    for i in range(0, len(scope), REPORT_BATCH):
+        batch = scope[i:i + REPORT_BATCH]
+        stats = ensure_problem_stats(cursor, db, batch)
+        verdicts = fetch_problem_verdict_counts(cursor, batch)
+        titles = fetch_problem_title_counts(cursor, batch)
+        profiles = solver_rating_profiles(cursor, batch)
+
+        for problem_id in batch:
+            problem = stats.get(problem_id) or {}
+            title_counts = titles.get(problem_id, {})
+            unique_users, date_range = problem.get("attempter_count", 0), None
+            if start or end:
+                unique_users, date_range = _ranged_interactions(cursor, db, problem_id, start, end)
+            reports[problem_id] = assemble_problem_report(
+                problem_id,
+                ratings[problem_id],
+                verdicts.get(problem_id, {}),
+                _average_solver_rating(title_counts),
+                problem.get("accepted_submissions", 0),
+                unique_users,
+                {title: solver_count for title, (solver_count, _) in title_counts.items()},
+                problem.get("solver_submissions", 0),
+                problem.get("solver_count", 0),
+                profiles[problem_id],
+                date_range
+            )
+    return reports
+
+def _write_report(item):
+    file_path, data = item
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=4, cls=DecimalEncoder)
+    os.replace(tmp_path, file_path)
+    return file_path
 
-# Feature 6: Average number of submissions to solve the problem
-def average_submissions_to_solve(problem_id):
+# Serialize reports to problem_analysis/<id>_analysis.json, across a process pool for large batches
+def save_problem_reports(reports, workers=None):
+    os.makedirs(analysis_dir, exist_ok=True)
+    items = [
+        (os.path.join(analysis_dir, f"{problem_id}_analysis.json"), data)
+        for problem_id, data in reports.items()
+    ]
+    if len(items) < POOL_THRESHOLD or workers == 1:
+        return [_write_report(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_write_report, items, chunksize=64))
+
+def run_batch(problem_ids=None, contest_id=None, workers=None, start=None, end=None):
     db, cursor = get_db_connection()
     try:
-        query = """
-        SELECT 
-            AVG(submission_count) AS avg_submissions
-        FROM (
-            SELECT 
-                username, 
-                COUNT(*) AS submission_count
-            FROM submissions
-            WHERE problem_id = %s
-            GROUP BY username
-            HAVING SUM(CASE WHEN verdict = 'Accepted' THEN 1 ELSE 0 END) > 0
-        ) AS user_attempts
-        """
-        execute_query_2(cursor, query, (problem_id,))
-        result = cursor.fetchone()
-
-        return {"average_submissions_to_solve": round(float(result[0]), 2) if result and result[0] is not None else 0}
+        reports = fetch_problem_reports(cursor, db, problem_ids, contest_id, start, end)
     finally:
         close_db_connection(db, cursor)
-
-# Save all feature data to JSON
-def save_prob_anal_json(data, filename):
-    file_path = get_save_path(filename)
-    with open(file_path, 'w') as json_file:
-        json.dump(data, json_file, indent=4, cls=DecimalEncoder)
-    return file_path
+    save_problem_reports(reports, workers)
+    print(f"Problem analysis written for {len(reports)} problems")
+    return reports
 
 def convert_problem_id(problem_id):
     # Split the problem_id on the underscore and join the parts
     return problem_id
 
 
+# Recent reports for the long-lived worker. Entries expire after max_age seconds,
+# since new submissions change a problem's report without the worker knowing.
+class ReportCache:
+    def __init__(self, max_entries=1024, max_age=300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Keys are (problem_id, start, end)
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, report):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), report)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+report_cache = ReportCache()
+
+# Socket mode serves connections on threads; don't ask the pool for more than it holds
+POOL_SIZE = 4
+db_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+def get_problem_report(problem_id, refresh=False, start=None, end=None):
+    key = (problem_id, start, end)
+    report = None if refresh else report_cache.get(key)
+    if report is None:
+        with db_slots:
+            db, cursor = get_pooled_connection(POOL_SIZE)
+            try:
+                report = fetch_problem_reports(cursor, db, [problem_id], start=start, end=end).get(problem_id)
+            finally:
+                close_db_connection(db, cursor)
+        if report is None:
+            raise KeyError(f"Unknown problem: {problem_id}")
+        report_cache.put(key, report)
+    return report
+
+# One request per line: {"id": ..., "problem_id": ..., "refresh": false, "start": null, "end": null}
+# (start/end are optional YYYY-MM-DD dates limiting unique_user_interactions)
+# One response per line: {"id": ..., "report": {...}} or {"id": ..., "error": "..."}
+def handle_request(line):
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        report = get_problem_report(
+            str(request["problem_id"]),
+            refresh=request.get("refresh", False),
+            start=request.get("start"),
+            end=request.get("end")
+        )
+        response = {"id": request_id, "report": report}
+    except Exception as e:
+        response = {"id": request_id, "error": str(e)}
+    return json.dumps(response, cls=DecimalEncoder)
+
+def serve_stdio():
+    out = sys.stdout
+    # Anything the query helpers print must not end up in the response stream
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        if line.strip():
+            out.write(handle_request(line) + "\n")
+            out.flush()
+
+class ReportRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write((handle_request(line.decode()) + "\n").encode())
+                self.wfile.flush()
+
+def serve_socket(socket_path):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, ReportRequestHandler) as server:
+        print(f"Serving problem analysis on {socket_path}", file=sys.stderr)
+        server.serve_forever()
+
+USAGE = """Usage: python3 author_problem_anal.py [--since <YYYY-MM-DD>] [--until <YYYY-MM-DD>] <problem_id>
+       python3 author_problem_anal.py [--since ...] [--until ...] --contest <contest_id>
+       python3 author_problem_anal.py [--since ...] [--until ...] --batch <problem_id> [<problem_id> ...]
+       python3 author_problem_anal.py [--since ...] [--until ...] --all
+       python3 author_problem_anal.py --serve [--socket <path>]"""
+
+# Pull "--since <date>" / "--until <date>" out of args; exits with the usage on a bad date
+def _pop_date_option(args, option):
+    if option not in args:
+        return None
+    at = args.index(option)
+    value = args[at + 1] if at + 1 < len(args) else None
+    try:
+        datetime.date.fromisoformat(value or "")
+    except ValueError:
+        print(USAGE)
+        sys.exit(1)
+    del args[at:at + 2]
+    return value
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 author_problem_anal.py <problem_id>")
+    args = sys.argv[1:]
+    start = _pop_date_option(args, "--since")
+    end = _pop_date_option(args, "--until")
+    if args == ["--all"]:
+        run_batch(start=start, end=end)
+    elif args == ["--serve"]:
+        serve_stdio()
+    elif len(args) == 3 and args[:2] == ["--serve", "--socket"]:
+        serve_socket(args[2])
+    elif len(args) == 2 and args[0] == "--contest":
+        run_batch(contest_id=args[1], start=start, end=end)
+    elif len(args) >= 2 and args[0] == "--batch":
+        run_batch(problem_ids=args[1:], start=start, end=end)
+    elif len(args) == 1 and not args[0].startswith("--"):
+        run_batch(problem_ids=args, start=start, end=end)
+    else:
+        print(USAGE)
         sys.exit(1)
-    
-    problem_id = sys.argv[1]
-    # Call your existing functions to gather data
-    data = {
-        "problem_id": problem_id,
-        "problem_difficulty_rating" : get_actual_rating(problem_id),
-        "problem_acceptance_rate": problem_acceptance_rate(problem_id),
-        "common_errors_on_problem": common_errors_on_problem(problem_id),
-        "difficulty_perception": difficulty_perception(problem_id),
-        "user_interaction_with_problem": user_interaction_with_problem(problem_id),
-        "submissions_by_user_rating_title": submissions_by_user_rating_title(problem_id),
-        "average_submissions_to_solve": average_submissions_to_solve(problem_id)
-    }
-    base_dir = "/run/media/arunav/Data/programming/DBIS_MAIN/Frontend/problem_analysis"
-    if not os.path.exists(base_dir):
-        os.makedirs(base_dir)
-    filename = f"{problem_id}_analysis.json"
-    filename = os.path.join(base_dir, filename)
-    save_prob_anal_json(data, filename)
 
 # Example usage
 if __name__ == "__main__":
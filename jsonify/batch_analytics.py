@@ -0,0 +1,175 @@
+# jsonify/batch_analytics.py
+# Nightly cohort recompute:
+#   python3 jsonify/batch_analytics.py [--skip-rebuild] [username ...]
+# 1. one streamed scan of `submissions` (ordered by user, then time) rebuilds
+#    every user's aggregate tables, with problem metadata loaded once up front.
+#    Each user's rows are replaced in one transaction, so readers never see them
+#    empty; bitsets for the whole cohort are written once at the end;
+# 2. a handful of GROUP BY username reads over the aggregates produce verdict,
+#    rating-bucket, tag, monthly and unsolved artifacts for the whole cohort.
+import sys
+from itertools import groupby
+from db import get_db_connection, get_streaming_connection, close_db_connection
+from user_stats import (
+    clear_user_stats,
+    rebuild_user_stats_from_rows,
+    fetch_problem_info,
+    fetch_problem_tag_ids,
+    fetch_all_usernames
+)
+from bitsets import save_group_bitsets, refresh_tag_bitsets
+from problem_anal import bucket_verdicts
+from result_cache import invalidate_user
+from artifact import write_artifact
+
+FETCH_SIZE = 10000
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+def _user_filter(usernames, column="username"):
+    if usernames is None:
+        return "", ()
+    return f"WHERE {column} IN ({_in_clause(usernames)})", tuple(usernames)
+
+# Yield (username, [submission, ...]) from one ordered scan of submissions
+def stream_user_submissions(usernames=None):
+    db, cursor = get_streaming_connection()
+    try:
+        where, values = _user_filter(usernames)
+        query = f"""
+        SELECT username, problem_id, verdict, submission_time
+        FROM submissions
+        {where}
+        ORDER BY username, submission_time, submission_id
+        """
+        cursor.execute(query, values)
+
+        def rows():
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    return
+                yield from batch
+
+        for username, user_rows in groupby(rows(), key=lambda row: row[0]):
+            yield username, [
+                {"problem_id": row[1], "verdict": row[2], "submission_time": row[3]}
+                for row in user_rows
+            ]
+    finally:
+        close_db_connection(db, cursor)
+
+# Rebuild the aggregate tables (and bitsets) for the cohort
+def rebuild_cohort_stats(cursor, db, usernames=None):
+    problem_info = fetch_problem_info(cursor)
+    problem_tag_ids = fetch_problem_tag_ids(cursor)
+    cohort = usernames if usernames is not None else fetch_all_usernames(cursor)
+
+    refresh_tag_bitsets(cursor, db)
+
+    # username -> (solved problem ids, attempted problem ids) for the bitsets
+    problem_sets = {}
+
+    def rebuild(username, submissions):
+        # The delete commits together with the new rows
+        clear_user_stats(cursor, [username])
+        delta = rebuild_user_stats_from_rows(cursor, db, username, submissions, problem_info, problem_tag_ids)
+        problem_sets[username] = (delta["newly_solved"], delta["newly_attempted"])
+
+    for username, submissions in stream_user_submissions(usernames):
+        rebuild(username, submissions)
+    # Users without submissions still get (zero) aggregate rows
+    for username in cohort:
+        if username not in problem_sets:
+            rebuild(username, [])
+
+    save_group_bitsets(cursor, db, problem_sets)
+    return cohort
+
+def _grouped(cursor, query, values):
+    cursor.execute(query, values)
+    return {
+        username: [row[1:] for row in rows]
+        for username, rows in groupby(cursor.fetchall(), key=lambda row: row[0])
+    }
+
+# Build the cohort's artifacts with one grouped read per artifact type
+def compute_cohort_artifacts(cursor, usernames=None):
+    cohort = usernames if usernames is not None else fetch_all_usernames(cursor)
+    where, values = _user_filter(usernames)
+    where_uts, _ = _user_filter(usernames, "uts.username")
+
+    verdicts = _grouped(cursor, f"""
+        SELECT username, verdict, problem_count
+        FROM user_verdict_stats
+        {where}
+        ORDER BY username
+    """, values)
+    ratings = _grouped(cursor, f"""
+        SELECT username, diff_rating, accepted_submissions
+        FROM user_rating_stats
+        {where}
+        ORDER BY username, diff_rating
+    """, values)
+    tags = _grouped(cursor, f"""
+        SELECT uts.username, t.tag_name, uts.solved_count
+        FROM user_tag_stats uts
+        JOIN tags t ON uts.tag_id = t.tag_id
+        {where_uts}
+        ORDER BY uts.username, uts.solved_count DESC
+    """, values)
+    monthly = _grouped(cursor, f"""
+        SELECT username, YEAR(activity_date), MONTH(activity_date), SUM(solved_count)
+        FROM user_daily_activity
+        {where}
+        GROUP BY username, YEAR(activity_date), MONTH(activity_date)
+        HAVING SUM(solved_count) > 0
+        ORDER BY username, YEAR(activity_date), MONTH(activity_date)
+    """, values)
+    unsolved = _grouped(cursor, f"""
+        SELECT username, problem_id
+        FROM user_problems
+        {where}{" AND" if where else "WHERE"} solved = FALSE
+        ORDER BY username, problem_id
+    """, values)
+
+    artifacts = {}
+    for username in cohort:
+        artifacts[username] = {
+            "user_submissions_by_verdict": bucket_verdicts(dict(verdicts.get(username, []))),
+            "problem_count_by_rating": [
+                {"diff_rating": rating, "solved_count": count}
+                for rating, count in ratings.get(username, [])
+                if count > 0
+            ],
+            "problem_tags": {tag: count for tag, count in tags.get(username, []) if count > 0},
+            "monthly_problem_count": [
+                {"year": year, "month": month, "problem_count": int(count)}
+                for year, month, count in monthly.get(username, [])
+            ],
+            "unsolved_problems": [row[0] for row in unsolved.get(username, [])]
+        }
+    return artifacts
+
+def run_batch(usernames=None, rebuild=True):
+    db, cursor = get_db_connection()
+    try:
+        if rebuild:
+            rebuild_cohort_stats(cursor, db, usernames)
+        artifacts = compute_cohort_artifacts(cursor, usernames)
+    finally:
+        close_db_connection(db, cursor)
+
+    for username, user_artifacts in artifacts.items():
+        invalidate_user(username)
+        for filetype, data in user_artifacts.items():
+            write_artifact(username, filetype, data)
+    print(f"Batch analytics written for {len(artifacts)} users")
+    return artifacts
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rebuild = "--skip-rebuild" not in args
+    usernames = [arg for arg in args if arg != "--skip-rebuild"] or None
+    run_batch(usernames, rebuild=rebuild)
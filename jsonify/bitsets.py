@@ -0,0 +1,266 @@
+from db import execute_query
+from user_stats import ensure_user_stats
+
+# Solved/attempted problem sets stored as bitsets over a dense problem index.
+# A bitset is a Python int (bit i set <=> problem with bit_index i is in the set),
+# persisted little-endian in a BLOB. ~10k problems is ~1.25 KB per set.
+#
+#   problem_bit_index   problem_id -> bit_index (AUTO_INCREMENT, never reused), and whether
+#                       the problem has been folded into tag_bitsets
+#   user_bitsets        per user: solved and attempted problem bitsets
+#   tag_bitsets         per tag: bitset of problems carrying the tag
+#
+# Per-tag counts are popcounts of (user set & tag set); the unsolved list is attempted & ~solved.
+
+def to_blob(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+def from_blob(blob):
+    return int.from_bytes(blob, "little") if blob else 0
+
+def popcount(bits):
+    return bits.bit_count()
+
+def bits_to_indexes(bits):
+    indexes = []
+    while bits:
+        low = bits & -bits
+        indexes.append(low.bit_length() - 1)
+        bits ^= low
+    return indexes
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+# Return {problem_id: bit_index}, assigning indexes to problems that have none yet.
+# Only missing problems are inserted: InnoDB burns an AUTO_INCREMENT value on every
+# ignored duplicate, which would leave gaps and grow every bitset.
+def ensure_problem_indexes(cursor, problem_ids):
+    if not problem_ids:
+        return {}
+    problem_ids = sorted(set(problem_ids))
+    query = f"SELECT problem_id, bit_index FROM problem_bit_index WHERE problem_id IN ({_in_clause(problem_ids)})"
+    cursor.execute(query, tuple(problem_ids))
+    index_map = {row[0]: row[1] for row in cursor.fetchall()}
+    missing = [problem_id for problem_id in problem_ids if problem_id not in index_map]
+    if missing:
+        # IGNORE only matters when a concurrent ingest assigned the same problem meanwhile
+        execute_query(
+            cursor,
+            "INSERT IGNORE INTO problem_bit_index (problem_id) VALUES (%s)",
+            [(problem_id,) for problem_id in missing],
+            commit=False
+        )
+        cursor.execute(
+            f"SELECT problem_id, bit_index FROM problem_bit_index WHERE problem_id IN ({_in_clause(missing)})",
+            tuple(missing)
+        )
+        index_map.update({row[0]: row[1] for row in cursor.fetchall()})
+    return index_map
+
+def indexes_to_problem_ids(cursor, indexes):
+    if not indexes:
+        return []
+    query = f"SELECT problem_id FROM problem_bit_index WHERE bit_index IN ({_in_clause(indexes)}) ORDER BY problem_id"
+    cursor.execute(query, tuple(indexes))
+    return [row[0] for row in cursor.fetchall()]
+
+def _bits_for(index_map, problem_ids):
+    bits = 0
+    for problem_id in problem_ids:
+        bits |= 1 << index_map[problem_id]
+    return bits
+
+def _save_user_bitsets(cursor, username, solved, attempted):
+    _save_bitset_rows(cursor, [(username, solved, attempted)])
+
+def _save_bitset_rows(cursor, rows):
+    query = """
+    INSERT INTO user_bitsets (username, solved_bits, attempted_bits)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        solved_bits = VALUES(solved_bits),
+        attempted_bits = VALUES(attempted_bits)
+    """
+    values = [(username, to_blob(solved), to_blob(attempted)) for username, solved, attempted in rows]
+    execute_query(cursor, query, values, commit=False)
+
+def fetch_user_bitsets(cursor, username):
+    cursor.execute("SELECT solved_bits, attempted_bits FROM user_bitsets WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return {"solved": from_blob(row[0]), "attempted": from_blob(row[1])}
+
+# Rebuild a user's bitsets from user_problems
+def rebuild_user_bitsets(cursor, db, username, commit=True):
+    ensure_user_stats(cursor, db, username, commit=False)
+    cursor.execute("SELECT problem_id, solved FROM user_problems WHERE username = %s", (username,))
+    rows = cursor.fetchall()
+    index_map = ensure_problem_indexes(cursor, [row[0] for row in rows])
+    solved = _bits_for(index_map, [row[0] for row in rows if row[1]])
+    attempted = _bits_for(index_map, [row[0] for row in rows])
+    _save_user_bitsets(cursor, username, solved, attempted)
+    if commit:
+        db.commit()
+    return {"solved": solved, "attempted": attempted}
+
+# Write the bitsets of many users at once from {username: (solved ids, attempted ids)},
+# assigning indexes for the whole group in one pass
+def save_group_bitsets(cursor, db, problem_sets):
+    if not problem_sets:
+        return
+    index_map = ensure_problem_indexes(
+        cursor, [problem_id for _, attempted in problem_sets.values() for problem_id in attempted]
+    )
+    _save_bitset_rows(cursor, [
+        (username, _bits_for(index_map, solved), _bits_for(index_map, attempted))
+        for username, (solved, attempted) in problem_sets.items()
+    ])
+    db.commit()
+
+# OR the problems from an ingest delta (see user_stats.fold_submissions) into the user's bitsets
+def update_user_bitsets(cursor, db, username, delta, commit=True):
+    if not delta:
+        return
+    current = fetch_user_bitsets(cursor, username)
+    if current is None:
+        rebuild_user_bitsets(cursor, db, username, commit=commit)
+        return
+
+    index_map = ensure_problem_indexes(cursor, delta["newly_attempted"] + delta["newly_solved"])
+    solved = current["solved"] | _bits_for(index_map, delta["newly_solved"])
+    attempted = current["attempted"] | _bits_for(index_map, delta["newly_attempted"])
+    _save_user_bitsets(cursor, username, solved, attempted)
+    if commit:
+        db.commit()
+
+def load_user_bitsets(cursor, db, username):
+    bitsets = fetch_user_bitsets(cursor, username)
+    if bitsets is None:
+        bitsets = rebuild_user_bitsets(cursor, db, username)
+    return bitsets
+
+# {username: bitsets} for a group in one query, building those that don't exist yet
+def load_group_bitsets(cursor, db, usernames):
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return {}
+    query = f"SELECT username, solved_bits, attempted_bits FROM user_bitsets WHERE username IN ({_in_clause(usernames)})"
+    cursor.execute(query, tuple(usernames))
+    bitsets = {row[0]: {"solved": from_blob(row[1]), "attempted": from_blob(row[2])} for row in cursor.fetchall()}
+    for username in usernames:
+        if username not in bitsets:
+            bitsets[username] = rebuild_user_bitsets(cursor, db, username)
+    return bitsets
+
+# Add the given problems to the bitsets of their tags and mark them tagged in problem_bit_index
+def refresh_tag_bitsets(cursor, db, problem_ids=None, commit=True):
+    if problem_ids is not None and not problem_ids:
+        return
+    query = "SELECT DISTINCT problem_id, tag_id FROM problem_tags"
+    values = ()
+    if problem_ids is not None:
+        problem_ids = sorted(set(problem_ids))
+        query += f" WHERE problem_id IN ({_in_clause(problem_ids)})"
+        values = tuple(problem_ids)
+    cursor.execute(query, values)
+    rows = cursor.fetchall()
+    if not rows:
+        return
+
+    index_map = ensure_problem_indexes(cursor, [row[0] for row in rows])
+    added = {}
+    for problem_id, tag_id in rows:
+        added[tag_id] = added.get(tag_id, 0) | (1 << index_map[problem_id])
+
+    # Lock the rows being OR'd into so concurrent ingests don't drop each other's bits;
+    # missing rows are created empty first so there is a row to lock
+    tag_ids = sorted(added)
+    execute_query(
+        cursor,
+        "INSERT IGNORE INTO tag_bitsets (tag_id, problem_bits) VALUES (%s, %s)",
+        [(tag_id, to_blob(0)) for tag_id in tag_ids],
+        commit=False
+    )
+    cursor.execute(
+        f"SELECT tag_id, problem_bits FROM tag_bitsets WHERE tag_id IN ({_in_clause(tag_ids)}) FOR UPDATE",
+        tuple(tag_ids)
+    )
+    current = {row[0]: from_blob(row[1]) for row in cursor.fetchall()}
+    execute_query(
+        cursor,
+        "UPDATE tag_bitsets SET problem_bits = %s WHERE tag_id = %s",
+        [(to_blob(current.get(tag_id, 0) | added[tag_id]), tag_id) for tag_id in tag_ids],
+        commit=False
+    )
+    tagged = sorted({row[0] for row in rows})
+    execute_query(
+        cursor,
+        f"UPDATE problem_bit_index SET tagged = TRUE WHERE problem_id IN ({_in_clause(tagged)})",
+        tuple(tagged),
+        commit=False
+    )
+    if commit:
+        db.commit()
+
+# Return {tag_id: bitset}, for all tags or the given ones
+def load_tag_bitsets(cursor, tag_ids=None):
+    query = "SELECT tag_id, problem_bits FROM tag_bitsets"
+    values = ()
+    if tag_ids:
+        query += f" WHERE tag_id IN ({_in_clause(tag_ids)})"
+        values = tuple(tag_ids)
+    cursor.execute(query, values)
+    return {row[0]: from_blob(row[1]) for row in cursor.fetchall()}
+
+def load_tag_names(cursor):
+    cursor.execute("SELECT tag_id, tag_name FROM tags")
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+# Tag counts as popcounts of (problem set & tag bitset), largest first
+def tag_counts(problem_bits, tag_bitsets, tag_names):
+    counts = {}
+    for tag_id, bits in tag_bitsets.items():
+        count = popcount(problem_bits & bits)
+        if count:
+            counts[tag_names.get(tag_id, str(tag_id))] = count
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+# Set algebra between two users' solved sets
+def solved_overlap(bits1, bits2):
+    return {
+        "common": popcount(bits1 & bits2),
+        "only_first": popcount(bits1 & ~bits2),
+        "only_second": popcount(bits2 & ~bits1)
+    }
+
+def unsolved_bits(bitsets):
+    return bitsets["attempted"] & ~bitsets["solved"]
+
+# All tag bitsets, first folding in any tagged problem that isn't in them yet
+# (problems ingested before the table existed, or by an ingest that failed midway)
+def ensure_tag_bitsets(cursor, db):
+    cursor.execute("""
+    SELECT DISTINCT pt.problem_id
+    FROM problem_tags pt
+    LEFT JOIN problem_bit_index bi ON pt.problem_id = bi.problem_id
+    WHERE bi.tagged IS NULL OR bi.tagged = FALSE
+    """)
+    missing = [row[0] for row in cursor.fetchall()]
+    if missing:
+        refresh_tag_bitsets(cursor, db, missing)
+    return load_tag_bitsets(cursor)
+
+# {username: {tag_name: problems}} over each user's solved or attempted set
+def fetch_tag_counts(cursor, db, usernames, kind="solved"):
+    tag_bitsets = ensure_tag_bitsets(cursor, db)
+    tag_names = load_tag_names(cursor)
+    return {
+        username: tag_counts(bitsets[kind], tag_bitsets, tag_names)
+        for username, bitsets in load_group_bitsets(cursor, db, usernames).items()
+    }
+
+# Attempted-but-unsolved problem ids, by problem id
+def unsolved_problem_ids(cursor, db, username):
+    return indexes_to_problem_ids(cursor, bits_to_indexes(unsolved_bits(load_user_bitsets(cursor, db, username))))
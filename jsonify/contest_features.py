@@ -0,0 +1,136 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from db import get_db_connection, close_db_connection
+
+# Contest feature store shared by label.py and model.py.
+# The feature matrix is materialized to .cache/contest_features.npz together with the
+# contests.problems_version each row was computed from; a refresh only re-extracts
+# contests whose version moved (fetch_and_insert_problem bumps it for new problems).
+
+store_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "contest_features.npz")
+
+FEATURE_COLUMNS = ["mean_difficulty", "difficulty_stddev", "num_problems", "tag_variety"]
+FETCH_SIZE = 10000
+# Contest ids per extraction query when refreshing a subset
+ID_BATCH = 1000
+
+def _empty_store():
+    return pd.DataFrame(
+        {column: pd.Series(dtype=float) for column in FEATURE_COLUMNS + ["problems_version"]},
+        index=pd.Index([], dtype=np.int64, name="contest_id")
+    )
+
+# One row per (problem, tag) of the given contests (all when contest_ids is None);
+# problems without tags get a NULL tag_id
+def fetch_contest_problem_frame(db, contest_ids=None):
+    columns = ["contest_id", "problem_id", "diff_rating", "tag_id"]
+    batches = [None] if contest_ids is None else [
+        contest_ids[i:i + ID_BATCH] for i in range(0, len(contest_ids), ID_BATCH)
+    ]
+    chunks = []
+    cursor = db.cursor()  # unbuffered, so rows are streamed instead of loaded at once
+    try:
+        for batch in batches:
+            where = "" if batch is None else f"WHERE p.contest_id IN ({', '.join(['%s'] * len(batch))})"
+            cursor.execute(f"""
+                SELECT p.contest_id, p.problem_id, p.diff_rating, pt.tag_id
+                FROM problems p
+                LEFT JOIN problem_tags pt ON p.problem_id = pt.problem_id
+                {where}
+            """, tuple(batch or ()))
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                chunks.append(pd.DataFrame.from_records(rows, columns=columns))
+    finally:
+        cursor.close()
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+# Per-contest features with the same meaning as the old SQL:
+# AVG/STDDEV (population) of diff_rating, problem count and distinct tag count
+def compute_contest_features(frame):
+    problems = frame.drop_duplicates(["contest_id", "problem_id"])
+    ratings = problems["diff_rating"].astype(float).groupby(problems["contest_id"])
+    features = pd.DataFrame({
+        "mean_difficulty": ratings.mean(),
+        "difficulty_stddev": ratings.std(ddof=0),
+        "num_problems": problems.groupby("contest_id")["problem_id"].count()
+    })
+    tagged = frame.dropna(subset=["tag_id"])
+    features["tag_variety"] = tagged.groupby("contest_id")["tag_id"].nunique()
+    features["tag_variety"] = features["tag_variety"].fillna(0)
+    features.index = features.index.astype(np.int64)
+    features.index.name = "contest_id"
+    return features[FEATURE_COLUMNS].astype(float)
+
+def load_feature_store(path=store_path):
+    if not os.path.exists(path):
+        return _empty_store()
+    with np.load(path) as data:
+        store = pd.DataFrame(
+            {column: data[column] for column in FEATURE_COLUMNS + ["problems_version"]},
+            index=pd.Index(data["contest_id"], name="contest_id")
+        )
+    return store
+
+def save_feature_store(store, path=store_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        contest_id=store.index.to_numpy(dtype=np.int64),
+        **{column: store[column].to_numpy(dtype=np.float64) for column in FEATURE_COLUMNS + ["problems_version"]}
+    )
+    os.replace(tmp_path, path)
+
+# Bring the store up to date with MySQL and return it. Contests without problems are
+# kept with num_problems 0 so they aren't re-extracted on every refresh.
+def refresh_feature_store(db, path=store_path):
+    store = load_feature_store(path)
+
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT contest_id, problems_version FROM contests")
+        versions = pd.Series(
+            {int(contest_id): version for contest_id, version in cursor.fetchall()}, dtype=float
+        )
+    finally:
+        cursor.close()
+
+    stored = store["problems_version"].reindex(versions.index)
+    changed = versions.index[stored.isna() | (stored != versions)].tolist()
+    removed = store.index.difference(versions.index)
+    if not changed and removed.empty:
+        return store
+
+    if changed:
+        frame = fetch_contest_problem_frame(db, None if store.empty else changed)
+        fresh = compute_contest_features(frame).reindex(changed)
+        fresh["num_problems"] = fresh["num_problems"].fillna(0)
+        fresh["tag_variety"] = fresh["tag_variety"].fillna(0)
+        fresh["problems_version"] = versions.reindex(changed).to_numpy()
+        store = pd.concat([store.drop(index=store.index.intersection(changed)), fresh])
+    store = store.drop(index=removed).sort_index()
+    save_feature_store(store, path)
+    print(f"Feature store: recomputed {len(changed)} contests, {len(store)} stored.")
+    return store
+
+# Features of contests that have problems, as label.py and model.py consume them
+def contest_features(db, path=store_path):
+    store = refresh_feature_store(db, path)
+    return store[store["num_problems"] > 0]
+
+# python3 contest_features.py [--rebuild]
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv[1:] and os.path.exists(store_path):
+        os.remove(store_path)
+    db, cursor = get_db_connection()
+    try:
+        refresh_feature_store(db)
+    finally:
+        close_db_connection(db, cursor)
@@ -0,0 +1,237 @@
+import os
+import sys
+import numpy as np
+from db import get_db_connection, close_db_connection
+from file_lock import file_lock
+
+# Inverted contest participation index kept in memory.
+#
+#   by user     username -> (sorted contest_id array, that user's rank in each)
+#   by contest  contest_id -> (sorted user-id array, each participant's rank)
+#
+# Users get dense integer ids. Common contests and head-to-head records are
+# sorted-array intersections (np.intersect1d) instead of user_contests self-joins.
+# Persisted as CSR arrays in .cache/contest_index.npz; fill_user_contest refreshes
+# the re-ingested user's entries in place, reloading the file under a lock first so
+# concurrent ingests don't drop each other's updates.
+
+index_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "contest_index.npz")
+
+EMPTY = np.zeros(0, dtype=np.int64)
+# Stored for a NULL contest_rank; reported as None and never counted as a win or loss
+NO_RANK = -1
+# Bump when the stored arrays change meaning; older files are rebuilt on load
+INDEX_FORMAT = 2
+
+def _rank(rank):
+    return rank if rank is not None else NO_RANK
+
+def _rank_or_none(rank):
+    return rank if rank != NO_RANK else None
+
+class ContestIndex:
+    def __init__(self, usernames, user_contests):
+        self.usernames = list(usernames)
+        self.user_ids = {username: i for i, username in enumerate(self.usernames)}
+        # user id -> (contest ids, ranks), both int64 and sorted by contest id
+        self.user_contests = user_contests
+        self.contest_users = {}
+        self._build_contest_users()
+
+    @staticmethod
+    def _sorted(contest_ids, ranks):
+        contest_ids = np.asarray(contest_ids, dtype=np.int64)
+        ranks = np.asarray(ranks, dtype=np.int64)
+        order = np.argsort(contest_ids, kind="stable")
+        return contest_ids[order], ranks[order]
+
+    def _build_contest_users(self):
+        if not self.user_contests:
+            self.contest_users = {}
+            return
+        user_ids = np.concatenate([
+            np.full(len(contests), user_id, dtype=np.int64)
+            for user_id, (contests, _) in self.user_contests.items()
+        ])
+        contest_ids = np.concatenate([contests for contests, _ in self.user_contests.values()])
+        ranks = np.concatenate([ranks for _, ranks in self.user_contests.values()])
+        order = np.lexsort((user_ids, contest_ids))
+        user_ids, contest_ids, ranks = user_ids[order], contest_ids[order], ranks[order]
+        boundaries = np.flatnonzero(np.diff(contest_ids)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(contest_ids)]))
+        self.contest_users = {
+            int(contest_ids[start]): (user_ids[start:end], ranks[start:end])
+            for start, end in zip(starts, ends)
+            if end > start
+        }
+
+    @classmethod
+    def build(cls, cursor):
+        cursor.execute("SELECT username, contest_id, contest_rank FROM user_contests ORDER BY username")
+        rows = cursor.fetchall()
+        usernames = sorted({row[0] for row in rows})
+        user_ids = {username: i for i, username in enumerate(usernames)}
+        grouped = {}
+        for username, contest_id, rank in rows:
+            contests, ranks = grouped.setdefault(user_ids[username], ([], []))
+            contests.append(contest_id)
+            ranks.append(_rank(rank))
+        return cls(usernames, {
+            user_id: cls._sorted(contests, ranks)
+            for user_id, (contests, ranks) in grouped.items()
+        })
+
+    # Re-read one user's contests and patch both directions of the index
+    def update_user(self, cursor, username):
+        cursor.execute("SELECT contest_id, contest_rank FROM user_contests WHERE username = %s", (username,))
+        rows = cursor.fetchall()
+        contests, ranks = self._sorted(
+            [row[0] for row in rows], [_rank(row[1]) for row in rows]
+        )
+
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            user_id = len(self.usernames)
+            self.user_ids[username] = user_id
+            self.usernames.append(username)
+        old_contests, _ = self.user_contests.get(user_id, (EMPTY, EMPTY))
+
+        for contest_id in old_contests.tolist():
+            members, member_ranks = self.contest_users[contest_id]
+            keep = members != user_id
+            self.contest_users[contest_id] = (members[keep], member_ranks[keep])
+        for contest_id, rank in zip(contests.tolist(), ranks.tolist()):
+            members, member_ranks = self.contest_users.get(contest_id, (EMPTY, EMPTY))
+            at = np.searchsorted(members, user_id)
+            self.contest_users[contest_id] = (np.insert(members, at, user_id), np.insert(member_ranks, at, rank))
+        self.user_contests[user_id] = (contests, ranks)
+
+    def contests_of(self, username):
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            return EMPTY, EMPTY
+        return self.user_contests.get(user_id, (EMPTY, EMPTY))
+
+    # [(contest_id, rank1, rank2)] for the contests both users took part in; missing ranks are None
+    def common_contests(self, username1, username2):
+        contests1, ranks1 = self.contests_of(username1)
+        contests2, ranks2 = self.contests_of(username2)
+        common, at1, at2 = np.intersect1d(contests1, contests2, assume_unique=True, return_indices=True)
+        return [
+            (contest_id, _rank_or_none(rank1), _rank_or_none(rank2))
+            for contest_id, rank1, rank2 in zip(common.tolist(), ranks1[at1].tolist(), ranks2[at2].tolist())
+        ]
+
+    # Wins/losses/ties of username against each of `others` over their common contests.
+    # Walks username's contests once, intersecting each participant list with the group.
+    # Contests where either rank is missing count as common but not as a win, loss or tie.
+    def head_to_head(self, username, others):
+        others = [other for other in dict.fromkeys(others) if other != username]
+        records = {other: {"common_contests": 0, "wins": 0, "losses": 0, "ties": 0} for other in others}
+        group = np.array(sorted(self.user_ids[other] for other in others if other in self.user_ids), dtype=np.int64)
+        if not len(group):
+            return records
+
+        contests, ranks = self.contests_of(username)
+        for contest_id, rank in zip(contests.tolist(), ranks.tolist()):
+            members, member_ranks = self.contest_users[contest_id]
+            _, at_members, _ = np.intersect1d(members, group, assume_unique=True, return_indices=True)
+            for member, member_rank in zip(members[at_members].tolist(), member_ranks[at_members].tolist()):
+                record = records[self.usernames[member]]
+                record["common_contests"] += 1
+                if rank == NO_RANK or member_rank == NO_RANK:
+                    continue
+                if rank < member_rank:
+                    record["wins"] += 1
+                elif rank > member_rank:
+                    record["losses"] += 1
+                else:
+                    record["ties"] += 1
+        return records
+
+    def save(self, path=index_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        user_ids = sorted(self.user_contests)
+        lengths = np.array([len(self.user_contests[user_id][0]) for user_id in user_ids], dtype=np.int64)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            format=INDEX_FORMAT,
+            usernames=np.array(self.usernames, dtype=str),
+            user_ids=np.array(user_ids, dtype=np.int64),
+            offsets=np.concatenate(([0], np.cumsum(lengths))),
+            contests=np.concatenate([self.user_contests[user_id][0] for user_id in user_ids] or [EMPTY]),
+            ranks=np.concatenate([self.user_contests[user_id][1] for user_id in user_ids] or [EMPTY])
+        )
+        os.replace(tmp_path, path)
+
+    # None when the file was written in an older format
+    @classmethod
+    def load(cls, path=index_path):
+        with np.load(path) as data:
+            if "format" not in data.files or int(data["format"]) != INDEX_FORMAT:
+                return None
+            offsets = data["offsets"]
+            contests = data["contests"]
+            ranks = data["ranks"]
+            user_contests = {
+                int(user_id): (contests[offsets[i]:offsets[i + 1]], ranks[offsets[i]:offsets[i + 1]])
+                for i, user_id in enumerate(data["user_ids"])
+            }
+            return cls(data["usernames"].tolist(), user_contests)
+
+_index = None
+
+# Load the saved index, or build and save it from MySQL; callers hold the file lock
+def _load_or_build(cursor=None):
+    index = ContestIndex.load() if os.path.exists(index_path) else None
+    if index is None:
+        db, own_cursor = (None, cursor) if cursor is not None else get_db_connection()
+        try:
+            index = ContestIndex.build(own_cursor)
+        finally:
+            if db is not None:
+                close_db_connection(db, own_cursor)
+        index.save()
+    return index
+
+# The process-wide index: loaded from disk, or built from MySQL the first time
+def get_index(cursor=None):
+    global _index
+    if _index is None:
+        with file_lock(index_path):
+            _index = _load_or_build(cursor)
+    return _index
+
+# Ingest hook: refresh a re-ingested user's contests if an index has been built
+def update_contest_index(cursor, username):
+    global _index
+    if _index is None and not os.path.exists(index_path):
+        return
+    with file_lock(index_path):
+        # Reload so rows saved by other processes since this one loaded the file are kept
+        index = _load_or_build(cursor)
+        index.update_user(cursor, username)
+        index.save()
+    _index = index
+
+# python3 contest_index.py --rebuild
+# python3 contest_index.py <username> <other> [<other> ...]
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args == ["--rebuild"]:
+        db, cursor = get_db_connection()
+        try:
+            index = ContestIndex.build(cursor)
+        finally:
+            close_db_connection(db, cursor)
+        with file_lock(index_path):
+            index.save()
+        print(f"Indexed {len(index.usernames)} users over {len(index.contest_users)} contests")
+    elif len(args) >= 2:
+        for other, record in get_index().head_to_head(args[0], args[1:]).items():
+            print(f"{other}\t{record['wins']}-{record['losses']}-{record['ties']} in {record['common_contests']} contests")
+    else:
+        print("Usage: python3 contest_index.py --rebuild | <username> <other> [<other> ...]", file=sys.stderr)
+        sys.exit(1)
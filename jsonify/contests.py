@@ -1,6 +1,13 @@
 import requests
 from datetime import datetime
 from db import execute_query
+from user_stats import update_user_stats
+from problem_stats import fetch_problem_baseline, update_problem_stats
+from hll import update_problem_sketches
+from perf_stats import update_perf_stats
+from peer_index import update_tag_profile
+from bitsets import update_user_bitsets, refresh_tag_bitsets
+from result_cache import invalidate_user
 
 api_url = "https://codeforces.com/api/"
 
@@ -17,10 +24,11 @@ def get_last_updated_time(cursor, handle):
     result = cursor.fetchone()
     return result[0] if result else None
 
-def update_last_updated_time(cursor, db, handle, last_submission_time):
+def update_last_updated_time(cursor, db, handle, last_submission_time, commit=True):
     query = "UPDATE users SET last_updated = %s WHERE username = %s"
-    execute_query(cursor, query, (last_submission_time, handle))
-    db.commit()
+    execute_query(cursor, query, (last_submission_time, handle), commit=commit)
+    if commit:
+        db.commit()
 
 def fetch_and_insert_contest(cursor, db, contest_id):
     url = f"{api_url}contest.standings?contestId={contest_id}"
@@ -72,6 +80,13 @@ def fetch_and_insert_problem(cursor, db, problem_info):
             problem_info.get("rating", 800)
         )
         execute_query(cursor, query, values)
+        # A new problem changes the contest's features (see label.py)
+        if cursor.rowcount == 1:
+            execute_query(
+                cursor,
+                "UPDATE contests SET problems_version = problems_version + 1 WHERE contest_id = %s",
+                (problem_info["contestId"],)
+            )
         db.commit()
         
         # Insert tags into the tags table and problem_tags table
@@ -116,38 +131,72 @@ def fetch_and_insert_user_submissions(cursor, db, handle, count=1000000):
 
         submissions = submissions[:min(count, len(submissions))]
 
+        # Contests, problems and tags are idempotent upserts, committed as they are fetched
         for submission in submissions:
-            problem_info = submission["problem"]
-            fetch_and_insert_problem(cursor, db, problem_info)
-
-            query = """
-            INSERT INTO submissions (
-                submission_id, problem_id, username, verdict, submission_time, execution_time, memory_used, language_used
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                verdict = VALUES(verdict),
-                submission_time = VALUES(submission_time),
-                execution_time = VALUES(execution_time),
-                memory_used = VALUES(memory_used),
-                language_used = VALUES(language_used)
-            """
-            values = (
-                submission.get("id"),
-                f"{problem_info['contestId']}_{problem_info['index']}",
-                handle,
-                "Accepted" if submission.get("verdict", "UNKNOWN") == "OK" else submission.get("verdict", "UNKNOWN"),
-                datetime.fromtimestamp(submission.get("creationTimeSeconds", 0)),
-                submission.get("timeConsumedMillis", 0),
-                f"{submission.get('memoryConsumedBytes', 0) // 1024} KB",
-                submission.get("programmingLanguage", "UNKNOWN")
-            )
-            execute_query(cursor, query, values)
+            fetch_and_insert_problem(cursor, db, submission["problem"])
+
+        # The submissions, every aggregate they feed and last_updated commit together:
+        # if any step fails nothing is kept and the same rows are fetched again next time
+        new_rows = []
+        try:
+            for submission in submissions:
+                problem_info = submission["problem"]
+                query = """
+                INSERT INTO submissions (
+                    submission_id, problem_id, username, verdict, submission_time, execution_time, memory_used, language_used
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    verdict = VALUES(verdict),
+                    submission_time = VALUES(submission_time),
+                    execution_time = VALUES(execution_time),
+                    memory_used = VALUES(memory_used),
+                    language_used = VALUES(language_used)
+                """
+                values = (
+                    submission.get("id"),
+                    f"{problem_info['contestId']}_{problem_info['index']}",
+                    handle,
+                    "Accepted" if submission.get("verdict", "UNKNOWN") == "OK" else submission.get("verdict", "UNKNOWN"),
+                    datetime.fromtimestamp(submission.get("creationTimeSeconds", 0)),
+                    submission.get("timeConsumedMillis", 0),
+                    f"{submission.get('memoryConsumedBytes', 0) // 1024} KB",
+                    submission.get("programmingLanguage", "UNKNOWN")
+                )
+                execute_query(cursor, query, values, commit=False)
+
+                # rowcount is 1 for a fresh insert, 2 when an existing row was updated
+                if cursor.rowcount == 1:
+                    new_rows.append({
+                        "problem_id": values[1],
+                        "verdict": values[3],
+                        "submission_time": values[4],
+                        "execution_time": values[5],
+                        "memory_used": values[6],
+                        "language_used": values[7]
+                    })
+
+            problem_baseline = fetch_problem_baseline(cursor, handle, new_rows)
+            delta = update_user_stats(cursor, db, handle, new_rows, commit=False)
+            update_problem_stats(cursor, db, handle, new_rows, problem_baseline, commit=False)
+            update_problem_sketches(cursor, db, handle, new_rows, commit=False)
+            update_perf_stats(cursor, db, new_rows, commit=False)
+            update_user_bitsets(cursor, db, handle, delta, commit=False)
+            if delta:
+                refresh_tag_bitsets(cursor, db, sorted(delta["touched"]), commit=False)
+
+            if submissions:
+                last_submission_time = datetime.fromtimestamp(submissions[0]["creationTimeSeconds"])
+                update_last_updated_time(cursor, db, handle, last_submission_time, commit=False)
             db.commit()
-
-        if submissions:
-            last_submission_time = datetime.fromtimestamp(submissions[0]["creationTimeSeconds"])
-            update_last_updated_time(cursor, db, handle, last_submission_time)
+        except Exception:
+            db.rollback()
+            raise
+
+        # Cached analytics for this user are stale once new submissions land
+        if new_rows:
+            invalidate_user(handle)
+            update_tag_profile(cursor, handle)
 
         print(f"Submissions for user {handle} added/updated successfully.")
     else:
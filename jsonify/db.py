@@ -1,12 +1,34 @@
 import mysql.connector
+from mysql.connector import pooling
+
+DB_CONFIG = {
+    "host": "127.0.0.1",
+    "user": "root",
+    "password": "279936",
+    "database": "cpdbs"  # Replace with your database name
+}
+
+_pool = None
 
 def get_db_connection():
-    db = mysql.connector.connect(
-        host="127.0.0.1",
-        user="root",
-        password="279936",
-        database="cpdbs"  # Replace with your database name
-    )
+    db = mysql.connector.connect(**DB_CONFIG)
+    cursor = db.cursor(buffered=True)
+    return db, cursor
+
+# For large scans: the cursor is unbuffered, so rows are streamed instead of loaded at once.
+# Use a separate connection from the one doing writes while the scan is open.
+def get_streaming_connection():
+    db = mysql.connector.connect(**DB_CONFIG)
+    cursor = db.cursor()
+    return db, cursor
+
+# For long-lived processes: connections stay open between requests.
+# close_db_connection() hands a pooled connection back instead of closing it.
+def get_pooled_connection(pool_size=4):
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(pool_name="cpdbs", pool_size=pool_size, **DB_CONFIG)
+    db = _pool.get_connection()
     cursor = db.cursor(buffered=True)
     return db, cursor
 
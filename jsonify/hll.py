@@ -0,0 +1,324 @@
+import math
+import hashlib
+from itertools import groupby
+import numpy as np
+from db import get_db_connection, get_streaming_connection, close_db_connection, execute_query
+
+# HyperLogLog sketches of distinct users per problem, updated on ingest.
+# A sketch is a uint8 NumPy array of 2**precision registers; two sketches merge with
+# an element-wise max, so per-day sketches combine into any date range.
+# Standard error is 1.04 / sqrt(2**precision): 1.6% at the default precision of 12.
+#
+#   problem_hll        per (problem_id, kind, rating_title): all-time sketch;
+#                      rating_title '*' covers every user, '' users without a title
+#   problem_daily_hll  per (problem_id, kind, sketch_date): that day's sketch
+#
+# kind is 'attempted' (any submission) or 'solved' (an Accepted submission).
+# A sketched problem without submissions keeps an empty 'attempted'/'*' row as a marker.
+# Titles are taken at ingest time, like problem_title_stats.
+
+HLL_PRECISION = 12
+ALL_TITLES = "*"
+KINDS = ("attempted", "solved")
+
+# Blob layout: one header byte (precision, high bit set for sparse), then either
+# every register (dense) or uint16 index + uint8 value pairs for non-zero registers
+SPARSE_FLAG = 0x80
+
+def new_sketch(precision=HLL_PRECISION):
+    return np.zeros(1 << precision, dtype=np.uint8)
+
+def sketch_precision(sketch):
+    return len(sketch).bit_length() - 1
+
+def standard_error(precision=HLL_PRECISION):
+    return 1.04 / math.sqrt(1 << precision)
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+def add_values(sketch, values):
+    precision = sketch_precision(sketch)
+    width = 64 - precision
+    indexes = []
+    ranks = []
+    for value in values:
+        h = _hash(value)
+        rest = h & ((1 << width) - 1)
+        indexes.append(h >> width)
+        ranks.append(width - rest.bit_length() + 1)
+    if indexes:
+        np.maximum.at(sketch, np.array(indexes, dtype=np.int64), np.array(ranks, dtype=np.uint8))
+    return sketch
+
+def merge(sketch, other):
+    if len(sketch) != len(other):
+        raise ValueError("Cannot merge sketches of different precision")
+    return np.maximum(sketch, other)
+
+def estimate(sketch):
+    m = len(sketch)
+    alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -sketch.astype(np.int32)))
+    zeros = int(np.count_nonzero(sketch == 0))
+    if raw <= 2.5 * m and zeros:
+        # Linear counting is more accurate while many registers are still empty
+        return m * math.log(m / zeros)
+    return float(raw)
+
+def to_blob(sketch):
+    precision = sketch_precision(sketch)
+    nonzero = np.flatnonzero(sketch)
+    if len(nonzero) * 3 < len(sketch):
+        pairs = np.empty(len(nonzero), dtype=[("index", "<u2"), ("value", "u1")])
+        pairs["index"] = nonzero
+        pairs["value"] = sketch[nonzero]
+        return bytes([precision | SPARSE_FLAG]) + pairs.tobytes()
+    return bytes([precision]) + sketch.tobytes()
+
+def from_blob(blob):
+    if not blob:
+        return new_sketch()
+    header = blob[0]
+    sketch = new_sketch(header & ~SPARSE_FLAG)
+    if header & SPARSE_FLAG:
+        pairs = np.frombuffer(blob, dtype=[("index", "<u2"), ("value", "u1")], offset=1)
+        sketch[pairs["index"].astype(np.int64)] = pairs["value"]
+    else:
+        sketch[:] = np.frombuffer(blob, dtype=np.uint8, offset=1)
+    return sketch
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+def _save_sketches(cursor, sketches, daily_sketches):
+    if sketches:
+        query = """
+        INSERT INTO problem_hll (problem_id, kind, rating_title, registers)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE registers = VALUES(registers)
+        """
+        execute_query(cursor, query, [
+            (problem_id, kind, title, to_blob(sketch))
+            for (problem_id, kind, title), sketch in sorted(sketches.items())
+        ], commit=False)
+    if daily_sketches:
+        query = """
+        INSERT INTO problem_daily_hll (problem_id, kind, sketch_date, registers)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE registers = VALUES(registers)
+        """
+        execute_query(cursor, query, [
+            (problem_id, kind, sketch_date, to_blob(sketch))
+            for (problem_id, kind, sketch_date), sketch in sorted(daily_sketches.items())
+        ], commit=False)
+
+# Group (problem_id, username, verdict, date, rating_title) rows into the sketch keys they feed
+def _sketch_members(rows):
+    members = {}
+    daily_members = {}
+    for problem_id, username, verdict, sketch_date, rating_title in rows:
+        kinds = KINDS if verdict == "Accepted" else KINDS[:1]
+        for kind in kinds:
+            members.setdefault((problem_id, kind, ALL_TITLES), set()).add(username)
+            members.setdefault((problem_id, kind, rating_title or ""), set()).add(username)
+            daily_members.setdefault((problem_id, kind, sketch_date), set()).add(username)
+    return members, daily_members
+
+# Fold one user's newly ingested submissions into the problem sketches.
+# Adding a user twice is harmless, so no baseline is needed.
+def update_problem_sketches(cursor, db, username, submissions, commit=True):
+    if not submissions:
+        return
+    cursor.execute("SELECT rating_title FROM users WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    rating_title = row[0] if row and row[0] else ""
+    members, daily_members = _sketch_members(
+        (s["problem_id"], username, s["verdict"], s["submission_time"].date(), rating_title)
+        for s in submissions
+    )
+    problem_ids = sorted({key[0] for key in members})
+
+    # Lock the rows being rewritten so concurrent ingests don't drop each other's users
+    sketches = {key: new_sketch() for key in members}
+    query = f"""
+    SELECT problem_id, kind, rating_title, registers
+    FROM problem_hll
+    WHERE problem_id IN ({_in_clause(problem_ids)})
+    FOR UPDATE
+    """
+    cursor.execute(query, tuple(problem_ids))
+    for problem_id, kind, title, blob in cursor.fetchall():
+        if (problem_id, kind, title) in sketches:
+            sketches[(problem_id, kind, title)] = from_blob(blob)
+
+    daily_sketches = {key: new_sketch() for key in daily_members}
+    dates = sorted({key[2] for key in daily_members})
+    query = f"""
+    SELECT problem_id, kind, sketch_date, registers
+    FROM problem_daily_hll
+    WHERE problem_id IN ({_in_clause(problem_ids)}) AND sketch_date IN ({_in_clause(dates)})
+    FOR UPDATE
+    """
+    cursor.execute(query, (*problem_ids, *dates))
+    for problem_id, kind, sketch_date, blob in cursor.fetchall():
+        if (problem_id, kind, sketch_date) in daily_sketches:
+            daily_sketches[(problem_id, kind, sketch_date)] = from_blob(blob)
+
+    for key, usernames in members.items():
+        add_values(sketches[key], usernames)
+    for key, usernames in daily_members.items():
+        add_values(daily_sketches[key], usernames)
+    _save_sketches(cursor, sketches, daily_sketches)
+    if commit:
+        db.commit()
+
+# Rebuild the sketches of the given problems (all problems when problem_ids is None)
+def rebuild_problem_sketches(cursor, db, problem_ids=None):
+    if problem_ids is not None and not problem_ids:
+        return
+    problem_filter = f"WHERE problem_id IN ({_in_clause(problem_ids)})" if problem_ids is not None else ""
+    where = f"WHERE s.problem_id IN ({_in_clause(problem_ids)})" if problem_ids is not None else ""
+    values = tuple(problem_ids) if problem_ids is not None else ()
+    for table in ("problem_hll", "problem_daily_hll"):
+        execute_query(cursor, f"DELETE FROM {table} {problem_filter}", values or None, commit=False)
+
+    # Stream on a second connection so sketches can be written while reading
+    stream_db, stream_cursor = get_streaming_connection()
+    try:
+        stream_cursor.execute(f"""
+            SELECT s.problem_id, s.username, s.verdict, DATE(s.submission_time), u.rating_title
+            FROM submissions s
+            LEFT JOIN users u ON s.username = u.username
+            {where}
+            ORDER BY s.problem_id
+        """, values)
+
+        def rows():
+            while True:
+                batch = stream_cursor.fetchmany(10000)
+                if not batch:
+                    return
+                yield from batch
+
+        for _, problem_rows in groupby(rows(), key=lambda row: row[0]):
+            members, daily_members = _sketch_members(row for row in problem_rows if row[1] is not None)
+            _save_sketches(
+                cursor,
+                {key: add_values(new_sketch(), usernames) for key, usernames in members.items()},
+                {key: add_values(new_sketch(), usernames) for key, usernames in daily_members.items()}
+            )
+            db.commit()
+    finally:
+        close_db_connection(stream_db, stream_cursor)
+
+    # Problems without submissions get an empty all-users sketch, marking them as sketched
+    # so reads don't rebuild them again
+    execute_query(cursor, f"""
+        INSERT IGNORE INTO problem_hll (problem_id, kind, rating_title, registers)
+        SELECT problem_id, %s, %s, %s
+        FROM problems
+        {problem_filter}
+    """, (KINDS[0], ALL_TITLES, to_blob(new_sketch()), *values), commit=False)
+    db.commit()
+
+# COUNT(DISTINCT) over submissions; titles here are the users' current ones
+def exact_distinct_users(cursor, problem_id, kind="attempted", rating_title=None, start=None, end=None):
+    conditions = ["s.problem_id = %s"]
+    values = [problem_id]
+    if kind == "solved":
+        conditions.append("s.verdict = 'Accepted'")
+    if rating_title is not None:
+        conditions.append("COALESCE(u.rating_title, '') = %s")
+        values.append(rating_title)
+    if start is not None:
+        conditions.append("s.submission_time >= %s")
+        values.append(start)
+    if end is not None:
+        conditions.append("s.submission_time < %s + INTERVAL 1 DAY")
+        values.append(end)
+    query = f"""
+    SELECT COUNT(DISTINCT s.username)
+    FROM submissions s
+    LEFT JOIN users u ON s.username = u.username
+    WHERE {" AND ".join(conditions)}
+    """
+    cursor.execute(query, tuple(values))
+    return cursor.fetchone()[0]
+
+# Distinct users who attempted/solved a problem, optionally for one rating title and/or
+# an inclusive date range. Falls back to an exact count when `max_error` is tighter than
+# the stored sketches allow, or for a title within a date range (no per-title daily sketches).
+# Returns {"count": ..., "exact": bool, "error": relative standard error}.
+def distinct_users(cursor, db, problem_id, kind="attempted", rating_title=None, start=None, end=None, max_error=None):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind}")
+    ranged = start is not None or end is not None
+    if ranged and rating_title is not None:
+        count = exact_distinct_users(cursor, problem_id, kind, rating_title, start, end)
+        return {"count": count, "exact": True, "error": 0.0}
+
+    if ranged:
+        ensure_problem_sketches(cursor, db, [problem_id])
+        conditions = ["problem_id = %s", "kind = %s"]
+        values = [problem_id, kind]
+        if start is not None:
+            conditions.append("sketch_date >= %s")
+            values.append(start)
+        if end is not None:
+            conditions.append("sketch_date <= %s")
+            values.append(end)
+        cursor.execute(f"SELECT registers FROM problem_daily_hll WHERE {' AND '.join(conditions)}", tuple(values))
+        blobs = [row[0] for row in cursor.fetchall()]
+    else:
+        blobs = fetch_sketch_blobs(cursor, db, problem_id, kind, ALL_TITLES if rating_title is None else rating_title)
+
+    sketch = None
+    for blob in blobs:
+        sketch = from_blob(blob) if sketch is None else merge(sketch, from_blob(blob))
+    error = standard_error(sketch_precision(sketch) if sketch is not None else HLL_PRECISION)
+    if max_error is not None and max_error < error:
+        count = exact_distinct_users(cursor, problem_id, kind, rating_title, start, end)
+        return {"count": count, "exact": True, "error": 0.0}
+    if sketch is None:
+        return {"count": 0, "exact": False, "error": error}
+    return {"count": int(round(estimate(sketch))), "exact": False, "error": error}
+
+def fetch_sketch_blobs(cursor, db, problem_id, kind, rating_title):
+    query = "SELECT registers FROM problem_hll WHERE problem_id = %s AND kind = %s AND rating_title = %s"
+    cursor.execute(query, (problem_id, kind, rating_title))
+    rows = cursor.fetchall()
+    if not rows:
+        # Problems ingested before the sketches existed get them built on first read;
+        # rebuilt problems always keep at least the all-users marker row
+        cursor.execute("SELECT 1 FROM problem_hll WHERE problem_id = %s LIMIT 1", (problem_id,))
+        if cursor.fetchone() is None:
+            rebuild_problem_sketches(cursor, db, [problem_id])
+            cursor.execute(query, (problem_id, kind, rating_title))
+            rows = cursor.fetchall()
+    return [row[0] for row in rows]
+
+# Build sketches for those of the problems that have never been sketched
+def ensure_problem_sketches(cursor, db, problem_ids):
+    if not problem_ids:
+        return
+    cursor.execute(
+        f"SELECT DISTINCT problem_id FROM problem_hll WHERE problem_id IN ({_in_clause(problem_ids)})",
+        tuple(problem_ids)
+    )
+    sketched = {row[0] for row in cursor.fetchall()}
+    missing = [problem_id for problem_id in problem_ids if problem_id not in sketched]
+    if missing:
+        rebuild_problem_sketches(cursor, db, missing)
+
+# Bulk rebuild: python3 hll.py [problem_id ...]
+if __name__ == "__main__":
+    import sys
+
+    problem_ids = sys.argv[1:] or None
+    db, cursor = get_db_connection()
+    try:
+        rebuild_problem_sketches(cursor, db, problem_ids)
+        print(f"Rebuilt distinct-user sketches for {len(problem_ids) if problem_ids else 'all'} problems")
+    finally:
+        close_db_connection(db, cursor)
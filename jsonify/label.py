@@ -1,60 +1,73 @@
+import sys
 import mysql.connector
+import numpy as np
 from db import get_db_connection, close_db_connection, execute_query
+from contest_features import contest_features
 
-def label_data():
+# Contests whose problems changed since they were last labeled, unless relabel_all
+def pending_contests(cursor, features, relabel_all=False):
+    if relabel_all:
+        return features
+    cursor.execute("SELECT contest_id, labeled_version FROM contests")
+    labeled = dict(cursor.fetchall())
+    labeled_versions = features.index.map(lambda contest_id: labeled.get(contest_id, -1))
+    return features[features["problems_version"].to_numpy() != labeled_versions.to_numpy(dtype=float)]
+
+def label_contests(features):
+    return (features["difficulty_stddev"] < 500) & (features["tag_variety"] >= 3)
+
+# Stage the labels in a temporary table and apply them with a single UPDATE ... JOIN
+def write_labels(cursor, db, features, labels):
+    execute_query(cursor, """
+    CREATE TEMPORARY TABLE contest_labels (
+        contest_id INT PRIMARY KEY,
+        is_balanced BOOL,
+        problems_version INT
+    )
+    """, commit=False)
+    try:
+        execute_query(
+            cursor,
+            "INSERT INTO contest_labels (contest_id, is_balanced, problems_version) VALUES (%s, %s, %s)",
+            [
+                (int(contest_id), bool(label), int(version))
+                for contest_id, label, version in zip(features.index, labels, features["problems_version"])
+            ],
+            commit=False
+        )
+        execute_query(cursor, """
+        UPDATE contests c
+        JOIN contest_labels l ON c.contest_id = l.contest_id
+        SET c.is_balanced = l.is_balanced,
+            c.labeled_version = l.problems_version
+        """, commit=False)
+        updated = cursor.rowcount
+        db.commit()
+        return updated
+    finally:
+        execute_query(cursor, "DROP TEMPORARY TABLE IF EXISTS contest_labels", commit=False)
+
+def label_data(relabel_all=False):
     # Connect to the database
     db, cursor = get_db_connection()
-      
-    fetch_data_query = """
-    SELECT 
-        c.contest_id,
-        AVG(p.diff_rating) AS mean_difficulty,
-        STDDEV(p.diff_rating) AS difficulty_stddev,
-        COUNT(p.problem_id) AS num_problems,
-        (SELECT COUNT(DISTINCT pt.tag_id) 
-         FROM problems p2 
-         JOIN problem_tags pt ON p2.problem_id = pt.problem_id 
-         WHERE p2.contest_id = c.contest_id) AS tag_variety
-    FROM contests c
-    JOIN problems p ON c.contest_id = p.contest_id
-    GROUP BY c.contest_id
-    """
-    
-    execute_query(cursor, fetch_data_query)
-    rows = cursor.fetchall()
-
-    # Step 3: Label data based on the defined criteria
-    update_query = """
-    UPDATE contests
-    SET is_balanced = %s
-    WHERE contest_id = %s
-    """
-    
-    values_to_update = []
-    
-    for row in rows:
-        contest_id, mean_difficulty, difficulty_stddev, num_problems, tag_variety = row
-        print(contest_id,difficulty_stddev)
-        
-        # Labeling logic (example)
-        is_balanced = (
-            difficulty_stddev < 500 and  # Standard deviation threshold
-            tag_variety >= 3             # Minimum tag variety
-        )
-        
-        values_to_update.append((is_balanced, contest_id))
-    
-    # Step 4: Update the database with the labels
+
     try:
-        execute_query(cursor, update_query, values_to_update)
-        db.commit()
-        print(f"Updated {cursor.rowcount} contests with labels.")
+        features = pending_contests(cursor, contest_features(db), relabel_all)
+        if features.empty:
+            print("No contests changed since the last labeling run.")
+            return
+
+        labels = label_contests(features)
+        print(f"Labeled {len(features)} contests: {int(np.sum(labels))} balanced.")
+
+        updated = write_labels(cursor, db, features, labels)
+        print(f"Updated {updated} contests with labels.")
     except mysql.connector.Error as err:
         print(f"Error updating labels: {err}")
+    finally:
+        # Close the database connection
+        close_db_connection(db, cursor)
 
-    # Close the database connection
-    close_db_connection(db, cursor)
-
-# Main function to run the labeling
+# Main function to run the labeling; --all relabels every contest
 if __name__ == "__main__":
-    label_data()
\ No newline at end of file
+    label_data(relabel_all="--all" in sys.argv[1:])
@@ -1,48 +1,45 @@
+import os
+import re
+import sys
+import pickle
+from datetime import datetime, timezone
 import mysql.connector
 import pandas as pd
 from db import get_db_connection, close_db_connection, execute_query
+from contest_features import contest_features, FEATURE_COLUMNS
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
 
+# Trained models are saved as versioned artifacts, .cache/models/contest_balance_v<N>.pkl,
+# holding the model and the feature columns it was trained on. `train` writes a new
+# version; `score` loads the latest one once and scores contests in a single predict_proba.
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "models")
+MODEL_NAME = "contest_balance"
+
 def fetch_labeled_data():
     # Connect to the database
     db, cursor = get_db_connection()
-    
-    # Query to fetch the features and labels
-    query = """
-    SELECT 
-        AVG(p.diff_rating) AS mean_difficulty,
-        STDDEV(p.diff_rating) AS difficulty_stddev,
-        COUNT(p.problem_id) AS num_problems,
-        (SELECT COUNT(DISTINCT pt.tag_id) 
-         FROM problems p2 
-         JOIN problem_tags pt ON p2.problem_id = pt.problem_id 
-         WHERE p2.contest_id = c.contest_id) AS tag_variety,
-        c.is_balanced
-    FROM contests c
-    JOIN problems p ON c.contest_id = p.contest_id
-    GROUP BY c.contest_id
-    """
-    
-    execute_query(cursor, query)
-    rows = cursor.fetchall()
 
-    # Convert the data into a DataFrame
-    columns = ['mean_difficulty', 'difficulty_stddev', 'num_problems', 'tag_variety', 'is_balanced']
-    data = pd.DataFrame(rows, columns=columns)
+    try:
+        # Features come from the shared feature store; only the labels are read from MySQL
+        features = contest_features(db)
+        cursor.execute("SELECT contest_id, is_balanced FROM contests")
+        labels = pd.Series(dict(cursor.fetchall()), dtype=object)
+    finally:
+        # Close the database connection
+        close_db_connection(db, cursor)
 
-    # Close the database connection
-    close_db_connection(db, cursor)
-
-    return data
+    data = features[FEATURE_COLUMNS].copy()
+    data['is_balanced'] = labels.reindex(data.index)
+    return data.reset_index(drop=True)
 
 def preprocess_data(data):
     # Handle missing values (if any)
     data = data.dropna()
     
     # Split features and labels
-    X = data[['mean_difficulty', 'difficulty_stddev', 'num_problems', 'tag_variety']]
+    X = data[FEATURE_COLUMNS]
     y = data['is_balanced'].astype(int)  # Convert labels to integer
 
     # Check the distribution of the labels
@@ -79,13 +76,130 @@ def train_logistic_regression(X, y):
 
     return model
 
-# Main function to run the process
-if __name__ == "__main__":
+def model_versions():
+    if not os.path.isdir(models_dir):
+        return []
+    pattern = re.compile(rf"{MODEL_NAME}_v(\d+)\.pkl$")
+    return sorted(int(match.group(1)) for match in map(pattern.match, os.listdir(models_dir)) if match)
+
+def model_path(version):
+    return os.path.join(models_dir, f"{MODEL_NAME}_v{version}.pkl")
+
+def save_model(model, training_rows):
+    os.makedirs(models_dir, exist_ok=True)
+    version = (model_versions() or [0])[-1] + 1
+    artifact = {
+        "version": version,
+        "features": list(FEATURE_COLUMNS),
+        "model": model,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "training_rows": training_rows
+    }
+    path = model_path(version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(artifact, f)
+    os.replace(tmp_path, path)
+    return version
+
+# The artifact of the given version (latest when None)
+def load_model(version=None):
+    if version is None:
+        versions = model_versions()
+        if not versions:
+            raise FileNotFoundError("No trained model found; run `python3 model.py train` first.")
+        version = versions[-1]
+    with open(model_path(version), "rb") as f:
+        artifact = pickle.load(f)
+    if artifact["features"] != list(FEATURE_COLUMNS):
+        raise ValueError(
+            f"Model v{version} was trained on {artifact['features']}, "
+            f"but the feature store provides {FEATURE_COLUMNS}; retrain it."
+        )
+    return artifact
+
+def train():
     # Step 1: Fetch and preprocess the data
     data = fetch_labeled_data()
     X, y = preprocess_data(data)
 
-    # Step 2: Train the logistic regression model and evaluate it
+    # Step 2: Train the logistic regression model, evaluate it and save it
     model = train_logistic_regression(X, y)
-    
-    
\ No newline at end of file
+    version = save_model(model, len(X))
+    print(f"Saved model v{version} to {model_path(version)}")
+    return version
+
+# Contests not yet scored by this model version, or whose problems changed since
+def unscored_contests(cursor, features, model_version):
+    cursor.execute("SELECT contest_id, scored_model_version, scored_version FROM contests")
+    scored = {contest_id: (model, version) for contest_id, model, version in cursor.fetchall()}
+    pending = [
+        scored.get(contest_id) != (model_version, int(version))
+        for contest_id, version in zip(features.index, features["problems_version"])
+    ]
+    return features[pending]
+
+# Stage the scores in a temporary table and apply them with a single UPDATE ... JOIN
+def write_scores(cursor, db, features, scores, model_version):
+    execute_query(cursor, """
+    CREATE TEMPORARY TABLE contest_scores (
+        contest_id INT PRIMARY KEY,
+        balance_score FLOAT,
+        problems_version INT
+    )
+    """, commit=False)
+    try:
+        execute_query(
+            cursor,
+            "INSERT INTO contest_scores (contest_id, balance_score, problems_version) VALUES (%s, %s, %s)",
+            [
+                (int(contest_id), float(score), int(version))
+                for contest_id, score, version in zip(features.index, scores, features["problems_version"])
+            ],
+            commit=False
+        )
+        execute_query(cursor, """
+        UPDATE contests c
+        JOIN contest_scores s ON c.contest_id = s.contest_id
+        SET c.balance_score = s.balance_score,
+            c.scored_model_version = %s,
+            c.scored_version = s.problems_version
+        """, (model_version,), commit=False)
+        updated = cursor.rowcount
+        db.commit()
+        return updated
+    finally:
+        execute_query(cursor, "DROP TEMPORARY TABLE IF EXISTS contest_scores", commit=False)
+
+# Batch inference with the latest model: new or changed contests, or every contest with rescore_all
+def score_contests(rescore_all=False):
+    artifact = load_model()
+    db, cursor = get_db_connection()
+
+    try:
+        features = contest_features(db).dropna(subset=artifact["features"])
+        if not rescore_all:
+            features = unscored_contests(cursor, features, artifact["version"])
+        if features.empty:
+            print("No contests to score.")
+            return
+
+        scores = artifact["model"].predict_proba(features[artifact["features"]])[:, 1]
+        updated = write_scores(cursor, db, features, scores, artifact["version"])
+        print(f"Scored {len(features)} contests with model v{artifact['version']}; updated {updated}.")
+    except mysql.connector.Error as err:
+        print(f"Error writing scores: {err}")
+    finally:
+        close_db_connection(db, cursor)
+
+# python3 model.py train
+# python3 model.py score [--all]
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args == ["train"]:
+        train()
+    elif args and args[0] == "score" and set(args[1:]) <= {"--all"}:
+        score_contests(rescore_all="--all" in args[1:])
+    else:
+        print("Usage: python3 model.py train | score [--all]", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,193 @@
+import os
+import sys
+import numpy as np
+from db import get_db_connection, close_db_connection
+from file_lock import file_lock
+
+# Nearest peers by tag profile.
+# Each user is a vector of solved problems per tag (user_tag_stats.solved_count),
+# L2-normalized into one row of a float32 matrix, so cosine similarity against
+# everyone is a single matrix-vector product. The matrix is persisted to
+# .cache/tag_profiles.npz and ingest updates the rows of re-ingested users in place,
+# reloading the file under a lock first so concurrent ingests don't drop each other's rows.
+
+index_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tag_profiles.npz")
+
+class TagProfileIndex:
+    def __init__(self, tag_ids, usernames, ratings, matrix):
+        self.tag_ids = list(tag_ids)
+        self.tag_pos = {tag_id: i for i, tag_id in enumerate(self.tag_ids)}
+        self.usernames = list(usernames)
+        self.user_pos = {username: i for i, username in enumerate(self.usernames)}
+        self.ratings = np.asarray(ratings, dtype=np.float64)
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+
+    @staticmethod
+    def _normalize(rows):
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+
+    @classmethod
+    def build(cls, cursor):
+        cursor.execute("SELECT tag_id FROM tags ORDER BY tag_id")
+        tag_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT username, rating FROM users ORDER BY username")
+        users = cursor.fetchall()
+        index = cls(
+            tag_ids,
+            [row[0] for row in users],
+            [np.nan if row[1] is None else row[1] for row in users],
+            np.zeros((len(users), len(tag_ids)), dtype=np.float32)
+        )
+
+        cursor.execute("SELECT username, tag_id, solved_count FROM user_tag_stats WHERE solved_count > 0")
+        rows = [
+            (index.user_pos[username], index.tag_pos[tag_id], count)
+            for username, tag_id, count in cursor.fetchall()
+            if username in index.user_pos and tag_id in index.tag_pos
+        ]
+        if rows:
+            user_idx, tag_idx, counts = (np.array(column) for column in zip(*rows))
+            np.add.at(index.matrix, (user_idx, tag_idx), counts.astype(np.float32))
+        index.matrix = cls._normalize(index.matrix)
+        return index
+
+    # Re-read one user's tag counts and rating, replacing (or appending) their row
+    def update_user(self, cursor, username):
+        cursor.execute("SELECT rating FROM users WHERE username = %s", (username,))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        rating = np.nan if row[0] is None else row[0]
+        vector = np.zeros((1, len(self.tag_ids)), dtype=np.float32)
+        cursor.execute("SELECT tag_id, solved_count FROM user_tag_stats WHERE username = %s", (username,))
+        for tag_id, count in cursor.fetchall():
+            if tag_id in self.tag_pos:
+                vector[0, self.tag_pos[tag_id]] = count
+        vector = self._normalize(vector)
+
+        if username in self.user_pos:
+            position = self.user_pos[username]
+            self.matrix[position] = vector[0]
+            self.ratings[position] = rating
+        else:
+            self.user_pos[username] = len(self.usernames)
+            self.usernames.append(username)
+            self.matrix = np.vstack([self.matrix, vector])
+            self.ratings = np.append(self.ratings, rating)
+
+    # k most similar users by cosine similarity, optionally only those rated in [min_rating, max_rating]
+    def nearest(self, username, k=10, min_rating=None, max_rating=None):
+        position = self.user_pos.get(username)
+        if position is None:
+            raise KeyError(f"Unknown user: {username}")
+        scores = self.matrix @ self.matrix[position]
+
+        candidates = np.ones(len(self.usernames), dtype=bool)
+        candidates[position] = False
+        candidates &= np.linalg.norm(self.matrix, axis=1) > 0
+        if min_rating is not None:
+            candidates &= self.ratings >= min_rating
+        if max_rating is not None:
+            candidates &= self.ratings <= max_rating
+
+        indexes = np.flatnonzero(candidates)
+        if len(indexes) > k:
+            indexes = indexes[np.argpartition(-scores[indexes], k)[:k]]
+        indexes = indexes[np.argsort(-scores[indexes], kind="stable")]
+        return [
+            {
+                "username": self.usernames[i],
+                "similarity": round(float(scores[i]), 4),
+                "rating": None if np.isnan(self.ratings[i]) else int(self.ratings[i])
+            }
+            for i in indexes
+        ]
+
+    def rating_of(self, username):
+        rating = self.ratings[self.user_pos[username]]
+        return None if np.isnan(rating) else float(rating)
+
+    def save(self, path=index_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            tag_ids=np.array(self.tag_ids, dtype=np.int64),
+            usernames=np.array(self.usernames, dtype=str),
+            ratings=self.ratings,
+            matrix=self.matrix
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=index_path):
+        with np.load(path) as data:
+            return cls(data["tag_ids"].tolist(), data["usernames"].tolist(), data["ratings"], data["matrix"])
+
+_index = None
+
+# Load the saved index, or build and save it from MySQL; callers hold the file lock
+def _load_or_build(cursor=None):
+    index = TagProfileIndex.load() if os.path.exists(index_path) else None
+    if index is None:
+        db, own_cursor = (None, cursor) if cursor is not None else get_db_connection()
+        try:
+            index = TagProfileIndex.build(own_cursor)
+        finally:
+            if db is not None:
+                close_db_connection(db, own_cursor)
+        index.save()
+    return index
+
+# The process-wide index: loaded from disk, or built from MySQL the first time
+def get_index(cursor=None):
+    global _index
+    if _index is None:
+        with file_lock(index_path):
+            _index = _load_or_build(cursor)
+    return _index
+
+# Ingest hook: refresh a re-ingested user's row if an index has been built
+def update_tag_profile(cursor, username):
+    global _index
+    if _index is None and not os.path.exists(index_path):
+        return
+    with file_lock(index_path):
+        # Reload so rows saved by other processes since this one loaded the file are kept
+        index = _load_or_build(cursor)
+        index.update_user(cursor, username)
+        index.save()
+    _index = index
+
+# Peers within +/- rating_band of the user's own rating when rating_band is given
+def find_peers(username, k=10, rating_band=None):
+    index = get_index()
+    min_rating = max_rating = None
+    if rating_band is not None:
+        rating = index.rating_of(username)
+        if rating is not None:
+            min_rating, max_rating = rating - rating_band, rating + rating_band
+    return index.nearest(username, k, min_rating, max_rating)
+
+# python3 peer_index.py --rebuild
+# python3 peer_index.py <username> [k] [rating_band]
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args == ["--rebuild"]:
+        db, cursor = get_db_connection()
+        try:
+            index = TagProfileIndex.build(cursor)
+        finally:
+            close_db_connection(db, cursor)
+        with file_lock(index_path):
+            index.save()
+        print(f"Indexed {len(index.usernames)} users over {len(index.tag_ids)} tags")
+    elif 1 <= len(args) <= 3:
+        k = int(args[1]) if len(args) > 1 else 10
+        rating_band = int(args[2]) if len(args) > 2 else None
+        for peer in find_peers(args[0], k, rating_band):
+            print(f"{peer['username']}\t{peer['similarity']}\t{peer['rating']}")
+    else:
+        print("Usage: python3 peer_index.py --rebuild | <username> [k] [rating_band]", file=sys.stderr)
+        sys.exit(1)
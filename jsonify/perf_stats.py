@@ -0,0 +1,190 @@
+import re
+import numpy as np
+from db import get_db_connection, close_db_connection, execute_query
+
+# Runtime/memory histograms of accepted submissions per (problem_id, language_used).
+#
+#   submission_perf_stats  per (problem_id, language_used, metric, bucket): accepted solutions
+#
+# metric is 'time' (execution_time, ms) or 'memory' (memory_used, KB). Buckets are
+# logarithmic, BUCKETS_PER_DOUBLING per power of two (~9% wide), so a histogram has
+# at most a couple of hundred rows however many solutions it covers.
+# A percentile is one aggregate over those rows, counting half of the own bucket.
+# A row with language_used '*' marks a problem whose histograms cover all of its accepted
+# submissions; problems without it are rebuilt from submissions before they are used.
+
+BUCKETS_PER_DOUBLING = 8
+BUILT_MARKER = "*"
+
+def parse_memory_kb(memory_used):
+    match = re.match(r"\s*(\d+)", memory_used or "")
+    return int(match.group(1)) if match else None
+
+def bucket_of(values):
+    values = np.maximum(np.asarray(values, dtype=np.float64), 0)
+    return np.floor(np.log2(values + 1) * BUCKETS_PER_DOUBLING).astype(np.int64)
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+# Bucket (problem_id, language, execution_time, memory_used) rows and count them per key
+def _histogram_rows(rows):
+    if not rows:
+        return []
+    keys = np.array([f"{row[0]}\x00{row[1]}" for row in rows])
+    key_values, key_index = np.unique(keys, return_inverse=True)
+
+    result = []
+    for metric, raw in (
+        ("time", [row[2] for row in rows]),
+        ("memory", [parse_memory_kb(row[3]) for row in rows])
+    ):
+        present = np.array([value is not None for value in raw])
+        values = np.array([value for value in raw if value is not None], dtype=np.float64)
+        buckets = bucket_of(values)
+        combined = key_index[present] * 4096 + buckets
+        cells, counts = np.unique(combined, return_counts=True)
+        for cell, count in zip(cells, counts):
+            problem_id, language = key_values[cell // 4096].split("\x00")
+            result.append((problem_id, language, metric, int(cell % 4096), int(count)))
+    return result
+
+def _add_histogram_rows(cursor, rows):
+    if not rows:
+        return
+    query = """
+    INSERT INTO submission_perf_stats (problem_id, language_used, metric, bucket, solution_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE solution_count = solution_count + VALUES(solution_count)
+    """
+    execute_query(cursor, query, rows, commit=False)
+
+# Rebuild the histograms of the given problems (all problems when problem_ids is None)
+def rebuild_perf_stats(cursor, db, problem_ids=None, commit=True):
+    if problem_ids is not None and not problem_ids:
+        return
+    in_clause = f"problem_id IN ({_in_clause(problem_ids)})" if problem_ids is not None else None
+    values = tuple(problem_ids) if problem_ids is not None else None
+    execute_query(
+        cursor,
+        "DELETE FROM submission_perf_stats" + (f" WHERE {in_clause}" if in_clause else ""),
+        values,
+        commit=False
+    )
+
+    cursor.execute(f"""
+        SELECT problem_id, COALESCE(language_used, ''), execution_time, memory_used
+        FROM submissions
+        WHERE verdict = 'Accepted'{f" AND {in_clause}" if in_clause else ""}
+    """, values)
+    _add_histogram_rows(cursor, _histogram_rows(cursor.fetchall()))
+    execute_query(cursor, f"""
+        INSERT IGNORE INTO submission_perf_stats (problem_id, language_used, metric, bucket, solution_count)
+        SELECT problem_id, %s, %s, 0, 0 FROM problems{f" WHERE {in_clause}" if in_clause else ""}
+    """, (BUILT_MARKER, BUILT_MARKER) + (values or ()), commit=False)
+    if commit:
+        db.commit()
+
+# Those of the problems whose histograms have been built
+def fetch_built_problems(cursor, problem_ids):
+    if not problem_ids:
+        return set()
+    query = f"""
+    SELECT problem_id FROM submission_perf_stats
+    WHERE problem_id IN ({_in_clause(problem_ids)}) AND language_used = %s
+    """
+    cursor.execute(query, (*problem_ids, BUILT_MARKER))
+    return {row[0] for row in cursor.fetchall()}
+
+# Build the histograms of those of the problems that predate the table
+def ensure_perf_stats(cursor, db, problem_ids):
+    problem_ids = sorted(set(problem_ids))
+    built = fetch_built_problems(cursor, problem_ids)
+    missing = [problem_id for problem_id in problem_ids if problem_id not in built]
+    if missing:
+        rebuild_perf_stats(cursor, db, missing)
+
+# Count newly ingested accepted submissions (dicts carrying problem_id, verdict,
+# language_used, execution_time and memory_used) into the histograms. Problems not built
+# yet are rebuilt instead; the new rows are already in submissions.
+def update_perf_stats(cursor, db, submissions, commit=True):
+    accepted = [s for s in submissions if s["verdict"] == "Accepted"]
+    if not accepted:
+        return
+    problem_ids = sorted({s["problem_id"] for s in accepted})
+    built = fetch_built_problems(cursor, problem_ids)
+    rows = [
+        (s["problem_id"], s.get("language_used") or "", s.get("execution_time"), s.get("memory_used"))
+        for s in accepted
+        if s["problem_id"] in built
+    ]
+    _add_histogram_rows(cursor, _histogram_rows(rows))
+    rebuild_perf_stats(
+        cursor, db, [problem_id for problem_id in problem_ids if problem_id not in built], commit=False
+    )
+    if commit:
+        db.commit()
+
+# {(problem_id, language, metric): (bucket array, count array)} for the given pairs
+def fetch_histograms(cursor, pairs):
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    query = f"""
+    SELECT problem_id, language_used, metric, bucket, solution_count
+    FROM submission_perf_stats
+    WHERE (problem_id, language_used) IN ({", ".join(["(%s, %s)"] * len(pairs))})
+    ORDER BY problem_id, language_used, metric, bucket
+    """
+    cursor.execute(query, tuple(value for pair in pairs for value in pair))
+    grouped = {}
+    for problem_id, language, metric, bucket, count in cursor.fetchall():
+        grouped.setdefault((problem_id, language, metric), ([], []))
+        grouped[(problem_id, language, metric)][0].append(bucket)
+        grouped[(problem_id, language, metric)][1].append(count)
+    return {
+        key: (np.array(buckets, dtype=np.int64), np.array(counts, dtype=np.int64))
+        for key, (buckets, counts) in grouped.items()
+    }
+
+# Percentage of accepted solutions that used more of the metric than `value`
+def percent_beaten(histogram, value):
+    if histogram is None or value is None:
+        return None
+    buckets, counts = histogram
+    total = counts.sum()
+    if total == 0:
+        return None
+    own = bucket_of([value])[0]
+    above = counts[buckets > own].sum()
+    same = counts[buckets == own].sum()
+    return round(float((above + 0.5 * same) / total * 100), 2)
+
+# {submission_id: {"faster_than": %, "less_memory_than": %, "accepted_count": n}}
+# for rows of accepted (submission_id, problem_id, language_used, execution_time, memory_used)
+def annotate_submissions(cursor, db, submissions):
+    ensure_perf_stats(cursor, db, [row[1] for row in submissions])
+    histograms = fetch_histograms(cursor, [(row[1], row[2] or "") for row in submissions])
+    annotations = {}
+    for submission_id, problem_id, language, execution_time, memory_used in submissions:
+        time_histogram = histograms.get((problem_id, language or "", "time"))
+        annotations[submission_id] = {
+            "faster_than": percent_beaten(time_histogram, execution_time),
+            "less_memory_than": percent_beaten(
+                histograms.get((problem_id, language or "", "memory")), parse_memory_kb(memory_used)
+            ),
+            "accepted_count": int(time_histogram[1].sum()) if time_histogram else 0
+        }
+    return annotations
+
+# Bulk rebuild: python3 perf_stats.py [problem_id ...]
+if __name__ == "__main__":
+    import sys
+
+    problem_ids = sys.argv[1:] or None
+    db, cursor = get_db_connection()
+    try:
+        rebuild_perf_stats(cursor, db, problem_ids)
+        print(f"Rebuilt runtime/memory histograms for {len(problem_ids) if problem_ids else 'all'} problems")
+    finally:
+        close_db_connection(db, cursor)
@@ -3,49 +3,22 @@ import mysql.connector
 import os
 import json
 import numpy as np
+import pandas as pd
 from db import get_db_connection, close_db_connection, execute_query,execute_query_2  # Import functions from your helper file
+from user_stats import ensure_user_stats, fetch_user_verdict_counts, fetch_user_rating_counts
+from bitsets import fetch_tag_counts, unsolved_problem_ids
+from result_cache import cached_artifact
+from perf_stats import annotate_submissions
 
 
 base_path = os.path.join("users") 
 
-def get_user_submissions(username):
-    db, cursor = get_db_connection()
-    cursor = db.cursor(dictionary=True)  # Make sure cursor is dictionary-enabled here
-    try:
-        query = """
-        SELECT s.problem_id, s.verdict, p.diff_rating AS rating
-        FROM submissions s
-        JOIN problems p ON s.problem_id = p.problem_id
-        WHERE s.username = %s
-        """
-        cursor.execute(query, (username,))
-        submissions = cursor.fetchall()  # Now submissions will be a list of dictionaries
-    except mysql.connector.Error as err:
-        db.rollback()  # Rollback transaction on error
-        print(f"Error: {err}")
-        raise
-    finally:
-        close_db_connection(db, cursor)  # Always close the cursor and connection
-    
-    return submissions
-
-
+@cached_artifact("problem_tags")
 def get_user_problem_tags(username):
     db, cursor = get_db_connection()
-    cursor = db.cursor(dictionary=True)
     try:
-        query = """
-        SELECT t.tag_name, COUNT(DISTINCT s.problem_id) AS problem_count
-        FROM submissions s
-        JOIN problems p ON s.problem_id = p.problem_id
-        JOIN problem_tags pt ON p.problem_id = pt.problem_id
-        JOIN tags t ON pt.tag_id = t.tag_id
-        WHERE s.username = %s AND s.verdict = 'Accepted'
-        GROUP BY t.tag_name
-        ORDER BY problem_count DESC
-        """
-        cursor.execute(query, (username,))
-        tag_counts = cursor.fetchall()
+        # Distinct solved problems per tag: popcount of (solved bitset & tag bitset)
+        tag_counts = fetch_tag_counts(cursor, db, [username])[username]
         print(tag_counts)
     except mysql.connector.Error as err:
         db.rollback()  # Rollback transaction in case of error
@@ -54,7 +27,7 @@ def get_user_problem_tags(username):
     finally:
         close_db_connection(db, cursor)
     
-    return {tag["tag_name"]: tag["problem_count"] for tag in tag_counts}
+    return tag_counts
 
 def save_data_to_json(data, username, filename):
     # Define the base directory for user data
@@ -69,141 +42,157 @@ def save_data_to_json(data, username, filename):
     print(f"Data saved to {file_path}")
     return file_path
 
-def process_user_data_and_save(username):
-    submissions = get_user_submissions(username)
-    problem_count = 0
-    first_attempt_solved = 0
-    solved_problems = set()
-    problem_ratings = []
-    problem_attempts = {}
-
-    for submission in submissions:
-        problem_id = submission['problem_id']
-        
-        if problem_id not in problem_attempts:
-            problem_attempts[problem_id] = {'solved': False, 'failed': 0}
-        
-        if submission['verdict'] == 'Accepted':
-            if problem_attempts[problem_id]['failed'] == 0 and not problem_attempts[problem_id]['solved']:
-                first_attempt_solved += 1
-                problem_attempts[problem_id]['solved'] = True
+def fetch_user_problem_frame(cursor, username):
+    query = """
+    SELECT problem_id, attempts, attempts_before_ac, solved, first_attempt_time, first_ac_time
+    FROM user_problems
+    WHERE username = %s
+    """
+    cursor.execute(query, (username,))
+    columns = ["problem_id", "attempts", "attempts_before_ac", "solved", "first_attempt_time", "first_ac_time"]
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+# Attempt metrics over the per-problem rows of user_problems. Those rows are
+# folded in submission-time order on ingest, so "first attempt" is well defined.
+def compute_attempt_metrics(problems, max_bucket=10):
+    solved = problems[problems["solved"].astype(bool)]
+    if solved.empty:
+        return {
+            "first_attempt_rate": 0,
+            "average_attempts_to_ac": 0,
+            "attempts_to_ac_distribution": {},
+            "median_minutes_to_ac": None,
+            "minutes_to_ac": {}
+        }
 
-            problem_rating = submission['rating']
-            if problem_rating is not None:
-                problem_ratings.append(problem_rating)
+    attempts_to_ac = solved["attempts_before_ac"].to_numpy(dtype=np.int64) + 1
+    buckets = np.minimum(attempts_to_ac, max_bucket)
+    counts = np.bincount(buckets, minlength=max_bucket + 1)[1:]
+    distribution = {
+        (f"{i}+" if i == max_bucket else str(i)): int(count)
+        for i, count in enumerate(counts, start=1)
+        if count
+    }
 
-            if problem_id not in solved_problems:
-                solved_problems.add(problem_id)
-                problem_count += 1
+    minutes_to_ac = (
+        pd.to_datetime(solved["first_ac_time"]) - pd.to_datetime(solved["first_attempt_time"])
+    ).dt.total_seconds().to_numpy() / 60
 
-        elif submission['verdict'] != 'OK':
-            problem_attempts[problem_id]['failed'] += 1
+    return {
+        "first_attempt_rate": float(np.mean(attempts_to_ac == 1) * 100),
+        "average_attempts_to_ac": float(attempts_to_ac.mean()),
+        "attempts_to_ac_distribution": distribution,
+        "median_minutes_to_ac": float(np.median(minutes_to_ac)),
+        "minutes_to_ac": dict(zip(solved["problem_id"], np.round(minutes_to_ac, 2).tolist()))
+    }
 
-    avg_rating = np.mean(problem_ratings) if problem_ratings else 0
-    highest_rating = max(problem_ratings) if problem_ratings else 0
-    first_attempt_percentage = (first_attempt_solved / problem_count) * 100 if problem_count else 0
+@cached_artifact("data")
+def compute_user_data(username):
+    db, cursor = get_db_connection()
+    try:
+        stats = ensure_user_stats(cursor, db, username)
+        problem_tags_count = fetch_tag_counts(cursor, db, [username])[username]
+        attempt_metrics = compute_attempt_metrics(fetch_user_problem_frame(cursor, username))
+    except mysql.connector.Error as err:
+        db.rollback()
+        print(f"Error: {err}")
+        raise
+    finally:
+        close_db_connection(db, cursor)
+
+    problem_count = stats["solved_count"]
 
-    problem_tags_count = get_user_problem_tags(username)
+    # Average and highest rating over accepted submissions, as before
+    accepted_submissions = stats["accepted_submissions"]
+    avg_rating = float(stats["accepted_rating_sum"]) / accepted_submissions if accepted_submissions else 0
+    highest_rating = stats["max_accepted_rating"] if accepted_submissions else 0
 
     data = {
         "username": username,
         "problem_count": problem_count,
         "average_rating": avg_rating,
         "highest_rating": highest_rating,
-        "first_attempt_percentage": first_attempt_percentage,
+        "first_attempt_percentage": attempt_metrics["first_attempt_rate"],
+        "average_attempts_to_ac": attempt_metrics["average_attempts_to_ac"],
+        "attempts_to_ac_distribution": attempt_metrics["attempts_to_ac_distribution"],
+        "median_minutes_to_ac": attempt_metrics["median_minutes_to_ac"],
         "problem_tags_count": problem_tags_count
     }
+    return {"data": data, "minutes_to_ac": attempt_metrics["minutes_to_ac"]}
+
+def process_user_data_and_save(username):
+    result = compute_user_data(username)
 
     # Save results to a JSON file inside users/user_handle
     filename = f"{username}_data.json"
-    save_data_to_json(data, username, filename)
+    save_data_to_json(result["data"], username, filename)
 
-    return data
+    # Per-problem time to AC is kept out of the profile summary file
+    save_data_to_json(result["minutes_to_ac"], username, f"{username}_time_to_ac.json")
 
-def get_problem_count_by_rating(username):
+    return result["data"]
+
+@cached_artifact("problem_count_by_rating")
+def compute_problem_count_by_rating(username):
     db, cursor = get_db_connection()  # Unpack connection and cursor correctly
 
     if db is None:
         return
 
     try:
-        cursor = db.cursor(dictionary=True)
-        
-        query = """
-            SELECT 
-                p.diff_rating, 
-                COUNT(s.problem_id) AS solved_count
-            FROM submissions s
-            JOIN problems p ON s.problem_id = p.problem_id
-            WHERE s.username = %s AND s.verdict = 'Accepted'
-            GROUP BY p.diff_rating
-            ORDER BY p.diff_rating;
-        """
-        cursor.execute(query, (username,))
-        results = cursor.fetchall()
-
-        # Create user-specific folder if it doesn't exist
-        base_dir = os.path.join("users", username)  # Platform-independent path
-        os.makedirs(base_dir, exist_ok=True)  # Create directory if it doesn't exist
-
-        # Save results to a JSON file inside users/user_handle
-        file_path = os.path.join(base_dir, f"{username}_problem_count_by_rating.json")
-        with open(file_path, 'w') as json_file:
-            json.dump(results, json_file, indent=4)
-
-        print(f"Problem count by rating saved to {file_path}")
+        # Accepted submissions per problem rating, read from user_rating_stats
+        ensure_user_stats(cursor, db, username)
+        results = [
+            {"diff_rating": row["diff_rating"], "solved_count": row["accepted_submissions"]}
+            for row in fetch_user_rating_counts(cursor, username)
+            if row["accepted_submissions"] > 0
+        ]
+        return results
 
     except mysql.connector.Error as e:
         db.rollback()  # Rollback transaction in case of error
         print(f"Error: {e}")
         raise
     finally:
-        if cursor is not None:
-            cursor.close()
-        if db is not None:
-            db.close()
+        close_db_connection(db, cursor)
 
-def get_user_submissions_by_verdict(username):
+def get_problem_count_by_rating(username):
+    results = compute_problem_count_by_rating(username)
+
+    # Save results to a JSON file inside users/user_handle
+    file_path = save_data_to_json(results, username, f"{username}_problem_count_by_rating.json")
+    print(f"Problem count by rating saved to {file_path}")
+
+    return results
+
+# Map {verdict: problem_count} onto the buckets shown in the profile
+def bucket_verdicts(verdict_problem_counts):
+    verdict_count = {
+        "Accepted": 0,
+        "Wrong Answer": 0,
+        "Time Limit Exceeded": 0,
+        "Others": 0  # You can add more verdict types as needed
+    }
+
+    for verdict, problem_count in verdict_problem_counts.items():
+        if verdict in verdict_count:
+            verdict_count[verdict] = problem_count
+        else:
+            verdict_count["Others"] += problem_count
+
+    return verdict_count
+
+@cached_artifact("user_submissions_by_verdict")
+def compute_user_submissions_by_verdict(username):
     db, cursor = get_db_connection()  # Unpack connection and cursor correctly
     
     if db is None:
         return
     
     try:
-        cursor = db.cursor(dictionary=True)
-        
-        # Query to get the count of problems solved per verdict type
-        query = """
-            SELECT s.verdict, COUNT(DISTINCT s.problem_id) AS problem_count
-            FROM submissions s
-            WHERE s.username = %s
-            GROUP BY s.verdict
-        """
-        cursor.execute(query, (username,))
-        results = cursor.fetchall()
-
-        # Prepare the verdict count data
-        verdict_count = {
-            "Accepted": 0,
-            "Wrong Answer": 0,
-            "Time Limit Exceeded": 0,
-            "Others": 0  # You can add more verdict types as needed
-        }
-
-        # Process the results and map them to the verdict count
-        for result in results:
-            verdict = result['verdict']
-            if verdict in verdict_count:
-                verdict_count[verdict] = result['problem_count']
-            else:
-                verdict_count["Others"] += result['problem_count']
-
-        # Save the results to a JSON file
-        file_path = save_data_to_json(verdict_count, username, "submissions_by_verdict.json")
-        
-        print(f"Problem counts by verdict saved to {file_path}")
-        
-        return verdict_count
+        # Distinct problems per verdict type, read from user_verdict_stats
+        ensure_user_stats(cursor, db, username)
+        return bucket_verdicts(fetch_user_verdict_counts(cursor, username))
 
     except mysql.connector.Error as e:
         print(f"Error: {e}")
@@ -212,25 +201,33 @@ def get_user_submissions_by_verdict(username):
             cursor.close()
         if db is not None:
             db.close()
-            
-def get_monthly_problem_count(username):
+
+def get_user_submissions_by_verdict(username):
+    verdict_count = compute_user_submissions_by_verdict(username)
+    if verdict_count is not None:
+        # Save the results to a JSON file
+        file_path = save_data_to_json(verdict_count, username, "submissions_by_verdict.json")
+        print(f"Problem counts by verdict saved to {file_path}")
+    return verdict_count
+
+@cached_artifact("monthly_problem_count")
+def compute_monthly_problem_count(username):
     db, cursor = get_db_connection()
     
     if db is None:
         return
     
     try:
-        cursor = db.cursor(dictionary=True)
-        
-        # SQL query to count problems solved by the user, grouped by month and year
+        # Monthly view derived from the user_daily_activity rollup (problems first solved per month)
+        ensure_user_stats(cursor, db, username)
         query = """
             SELECT 
-                YEAR(s.submission_time) AS year,
-                MONTH(s.submission_time) AS month,
-                COUNT(DISTINCT s.problem_id) AS problem_count
-            FROM submissions s
-            WHERE s.username = %s AND s.verdict = 'Accepted'
-            GROUP BY YEAR(s.submission_time), MONTH(s.submission_time)
+                YEAR(activity_date) AS year,
+                MONTH(activity_date) AS month,
+                SUM(solved_count) AS problem_count
+            FROM user_daily_activity
+            WHERE username = %s AND solved_count > 0
+            GROUP BY YEAR(activity_date), MONTH(activity_date)
             ORDER BY year, month;
         """
         
@@ -241,29 +238,145 @@ def get_monthly_problem_count(username):
         monthly_data = []
         for result in results:
             monthly_data.append({
-                "year": result["year"],
-                "month": result["month"],
-                "problem_count": result["problem_count"]
+                "year": result[0],
+                "month": result[1],
+                "problem_count": int(result[2])
             })
-        
+        return monthly_data
+    
+    except mysql.connector.Error as e:
+        print(f"Error: {e}")
+    finally:
+        close_db_connection(db, cursor)
+
+def get_monthly_problem_count(username):
+    monthly_data = compute_monthly_problem_count(username)
+    if monthly_data is not None:
         # Save the monthly data to a JSON file
         file_path = save_data_to_json(monthly_data, username, "monthly_problem_count.json")
-        
         print(f"Monthly problem count data saved to {file_path}")
-        
-        return monthly_data
-    
+    return monthly_data
+
+@cached_artifact("weekly_problem_count")
+def compute_weekly_problem_count(username):
+    db, cursor = get_db_connection()
+
+    try:
+        # Weekly view (ISO weeks) derived from the user_daily_activity rollup
+        ensure_user_stats(cursor, db, username)
+        query = """
+            SELECT 
+                YEARWEEK(activity_date, 3) AS year_week,
+                MIN(activity_date) AS week_start,
+                SUM(solved_count) AS problem_count,
+                SUM(submission_count) AS submission_count
+            FROM user_daily_activity
+            WHERE username = %s
+            GROUP BY YEARWEEK(activity_date, 3)
+            ORDER BY year_week;
+        """
+        cursor.execute(query, (username,))
+        weekly_data = [
+            {
+                "year": row[0] // 100,
+                "week": row[0] % 100,
+                "problem_count": int(row[2]),
+                "submission_count": int(row[3])
+            }
+            for row in cursor.fetchall()
+        ]
+        return weekly_data
+
     except mysql.connector.Error as e:
         print(f"Error: {e}")
     finally:
-        if cursor is not None:
-            cursor.close()
-        if db is not None:
-            db.close()
+        close_db_connection(db, cursor)
+
+def get_weekly_problem_count(username):
+    weekly_data = compute_weekly_problem_count(username)
+    if weekly_data is not None:
+        file_path = save_data_to_json(weekly_data, username, "weekly_problem_count.json")
+        print(f"Weekly problem count data saved to {file_path}")
+    return weekly_data
+
+def fetch_daily_activity(cursor, username):
+    query = """
+        SELECT activity_date, solved_count, attempted_count, submission_count, accepted_count
+        FROM user_daily_activity
+        WHERE username = %s
+        ORDER BY activity_date;
+    """
+    cursor.execute(query, (username,))
+    return [
+        {
+            "date": row[0],
+            "solved_count": row[1],
+            "attempted_count": row[2],
+            "submission_count": row[3],
+            "accepted_count": row[4]
+        }
+        for row in cursor.fetchall()
+    ]
+
+# Longest and current run of consecutive days with at least one submission
+def compute_activity_streaks(daily_rows, today=None):
+    today = today or datetime.date.today()
+    longest = 0
+    run = 0
+    previous = None
+    for row in daily_rows:
+        if row["submission_count"] <= 0:
+            continue
+        day = row["date"]
+        run = run + 1 if previous is not None and (day - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = day
+
+    # The current streak survives until the end of the day after the last active day
+    current = run if previous is not None and (today - previous).days <= 1 else 0
+    return {
+        "current_streak": current,
+        "longest_streak": longest,
+        "last_active_date": previous.isoformat() if previous else None
+    }
+
+@cached_artifact("daily_activity")
+def compute_daily_activity(username):
+    db, cursor = get_db_connection()
+
+    try:
+        # Daily heatmap and streaks read from the user_daily_activity rollup
+        ensure_user_stats(cursor, db, username)
+        daily_rows = fetch_daily_activity(cursor, username)
+    except mysql.connector.Error as e:
+        print(f"Error: {e}")
+        daily_rows = []
+    finally:
+        close_db_connection(db, cursor)
+
+    data = {
+        "streaks": compute_activity_streaks(daily_rows),
+        "heatmap": [
+            {
+                "date": row["date"].isoformat(),
+                "solved_count": row["solved_count"],
+                "submission_count": row["submission_count"]
+            }
+            for row in daily_rows
+        ]
+    }
+    return data
+
+def get_daily_activity(username):
+    data = compute_daily_activity(username)
+    file_path = save_data_to_json(data, username, f"{username}_daily_activity.json")
+    print(f"Daily activity saved to {file_path}")
+    return data
             
         
 
-def get_last_10_submissions(username):
+@cached_artifact("last_10_submissions")
+def compute_last_10_submissions(username):
     db, cursor = get_db_connection()
     
     query = """
@@ -306,6 +419,30 @@ def get_last_10_submissions(username):
     
     return submissions_dict
 
+# Percentiles are added after the cache lookup: every other user's ingest moves them
+def get_last_10_submissions(username):
+    submissions = compute_last_10_submissions(username)
+    db, cursor = get_db_connection()
+    try:
+        # Where each accepted submission sits among accepted solutions in the same language;
+        # other verdicts get None, since their runtime isn't comparable
+        percentiles = annotate_submissions(cursor, db, [
+            (s["submission_id"], s["problem_id"], s["language_used"], s["execution_time"], s["memory_used"])
+            for s in submissions.values()
+            if s["verdict"] == "Accepted"
+        ])
+    finally:
+        close_db_connection(db, cursor)
+
+    return {
+        title: {
+            **submission,
+            "faster_than_percent": percentiles.get(submission["submission_id"], {}).get("faster_than"),
+            "less_memory_than_percent": percentiles.get(submission["submission_id"], {}).get("less_memory_than")
+        }
+        for title, submission in submissions.items()
+    }
+
 
 # Function to save the last 10 submissions into a JSON file
 def save_last_10_submissions(username):
@@ -322,42 +459,37 @@ def save_last_10_submissions(username):
     return filename
 
 
-def get_unsolved_problems(username):
+@cached_artifact("unsolved_problems")
+def compute_unsolved_problems(username, recent_first=False):
     db, cursor = get_db_connection()
-    cursor = db.cursor(dictionary=True)
 
     try:
-        db.start_transaction()  # Start the transaction
-
-        # Query to select problem IDs where the user submitted but did not get Accepted or OK verdicts
-        query = """
-            SELECT s.problem_id
-            FROM submissions s
-            WHERE s.username = %s
-            AND s.verdict NOT IN ('Accepted', 'OK')
-            AND NOT EXISTS (
-                SELECT 1
-                FROM submissions s2
-                WHERE s2.username = s.username
-                    AND s2.problem_id = s.problem_id
-                    AND s2.verdict = 'Accepted'
-            )
-            GROUP BY s.problem_id;
-        """
-
-        cursor.execute(query, (username,))
-        unsolved_problems = cursor.fetchall()
-        
-        db.commit()  # Commit the transaction if no error occurs
+        # Attempted-minus-solved set: attempted bitset & ~solved bitset.
+        # recent_first orders by last attempt ("recently given up"), which only user_problems records.
+        if recent_first:
+            ensure_user_stats(cursor, db, username)
+            query = """
+                SELECT problem_id
+                FROM user_problems
+                WHERE username = %s AND solved = FALSE
+                ORDER BY last_attempt_time DESC, problem_id;
+            """
+            cursor.execute(query, (username,))
+            problem_ids = [row[0] for row in cursor.fetchall()]
+        else:
+            problem_ids = unsolved_problem_ids(cursor, db, username)
+        unsolved_problems = [{"problem_id": problem_id} for problem_id in problem_ids]
     except mysql.connector.Error as err:
-        db.rollback()  # Rollback in case of error
-        print(f"Error: {err}. Transaction rolled back.")
+        print(f"Error: {err}")
         unsolved_problems = []
     finally:
         close_db_connection(db, cursor)
-    
+
     # Create a list of unsolved problem IDs
-    unsolved_problem_ids = [problem['problem_id'] for problem in unsolved_problems]
+    return [problem['problem_id'] for problem in unsolved_problems]
+
+def get_unsolved_problems(username, recent_first=False):
+    unsolved_problem_ids = compute_unsolved_problems(username, recent_first)
 
     # Create user-specific folder if it doesn't exist
     base_dir = os.path.join("users", username)  # Platform-independent path
@@ -0,0 +1,385 @@
+import copy
+from collections import Counter
+import numpy as np
+from db import execute_query
+from user_stats import fold_submissions, fetch_user_stats, fetch_problem_states
+
+# Per-problem aggregates maintained on ingest so problem analysis is a point lookup.
+#
+#   problem_stats          one row per problem: submission, attempter and solver counters
+#   problem_verdict_stats  per (problem_id, verdict): submissions
+#   problem_title_stats    per (problem_id, rating_title): solvers and the sum of their ratings
+#   problem_rating_stats   per (problem_id, rating_bucket): solvers whose rating falls in the
+#                          RATING_BUCKET-wide bucket; a mergeable quantile sketch of solver ratings
+#
+# Solver titles and ratings are taken when the problem is first solved (when a problem is
+# rebuilt, from the solvers' ratings at rebuild time); later rating changes don't move them.
+# Missing verdicts and rating titles are stored as '', since they are part of the key.
+
+PROBLEM_TABLES = (
+    "problem_stats",
+    "problem_verdict_stats",
+    "problem_title_stats",
+    "problem_rating_stats"
+)
+
+# Quantiles read from the histogram are within RATING_BUCKET of the exact value
+RATING_BUCKET = 25
+
+# Rating bands behind users.rating_title (see the update_rating_title trigger)
+RATING_TITLES = (
+    ("Newbie", None, 1200),
+    ("Pupil", 1200, 1400),
+    ("Specialist", 1400, 1600),
+    ("Expert", 1600, 1900),
+    ("Candidate Master", 1900, 2100),
+    ("Master", 2100, 2300),
+    ("International Master", 2300, 2400),
+    ("Grandmaster", 2400, 2600),
+    ("International Grandmaster", 2600, 3000),
+    ("Legendary Grandmaster", 3000, 4000),
+    ("Tourist", 4000, None)
+)
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+# The per-problem readers take a list of problem ids and return dicts keyed by problem_id
+def fetch_problem_stats(cursor, problem_ids):
+    if not problem_ids:
+        return {}
+    query = f"""
+    SELECT problem_id, total_submissions, accepted_submissions, attempter_count, solver_count,
+           attempts_before_ac_sum, solver_submissions
+    FROM problem_stats
+    WHERE problem_id IN ({_in_clause(problem_ids)})
+    """
+    cursor.execute(query, tuple(problem_ids))
+    return {
+        row[0]: {
+            "total_submissions": row[1],
+            "accepted_submissions": row[2],
+            "attempter_count": row[3],
+            "solver_count": row[4],
+            "attempts_before_ac_sum": row[5],
+            "solver_submissions": row[6]
+        }
+        for row in cursor.fetchall()
+    }
+
+# {problem_id: {verdict: submissions}}
+def fetch_problem_verdict_counts(cursor, problem_ids):
+    if not problem_ids:
+        return {}
+    query = f"""
+    SELECT problem_id, verdict, submission_count
+    FROM problem_verdict_stats
+    WHERE problem_id IN ({_in_clause(problem_ids)}) AND submission_count > 0
+    """
+    cursor.execute(query, tuple(problem_ids))
+    counts = {}
+    for problem_id, verdict, count in cursor.fetchall():
+        counts.setdefault(problem_id, {})[verdict or None] = count
+    return counts
+
+# {problem_id: {rating_title: (solvers, sum of their ratings)}}
+def fetch_problem_title_counts(cursor, problem_ids):
+    if not problem_ids:
+        return {}
+    query = f"""
+    SELECT problem_id, rating_title, solver_count, rating_sum
+    FROM problem_title_stats
+    WHERE problem_id IN ({_in_clause(problem_ids)}) AND solver_count > 0
+    """
+    cursor.execute(query, tuple(problem_ids))
+    counts = {}
+    for problem_id, title, solver_count, rating_sum in cursor.fetchall():
+        counts.setdefault(problem_id, {})[title or None] = (solver_count, rating_sum)
+    return counts
+
+def _problem_filter(problem_ids, column="problem_id", keyword="WHERE"):
+    if problem_ids is None:
+        return ""
+    return f"{keyword} {column} IN ({_in_clause(problem_ids)})"
+
+# Recompute the aggregates of the given problems (all problems when problem_ids is None)
+# straight from submissions
+def rebuild_problem_stats(cursor, db, problem_ids=None, commit=True):
+    if problem_ids is not None and not problem_ids:
+        return
+    values = tuple(problem_ids) if problem_ids is not None else None
+    for table in PROBLEM_TABLES:
+        execute_query(cursor, f"DELETE FROM {table} {_problem_filter(problem_ids)}", values, commit=False)
+
+    # attempts_before_ac counts a solver's submissions strictly before their first AC
+    query = f"""
+    INSERT INTO problem_stats (
+        problem_id, total_submissions, accepted_submissions, attempter_count, solver_count,
+        attempts_before_ac_sum, solver_submissions
+    )
+    SELECT p.problem_id,
+           COALESCE(SUM(pu.submissions), 0),
+           COALESCE(SUM(pu.accepted), 0),
+           COUNT(pu.username),
+           COALESCE(SUM(pu.first_ac_time IS NOT NULL), 0),
+           COALESCE(SUM(pu.attempts_before_ac), 0),
+           COALESCE(SUM(CASE WHEN pu.first_ac_time IS NOT NULL THEN pu.submissions ELSE 0 END), 0)
+    FROM problems p
+    LEFT JOIN (
+        SELECT s.problem_id, s.username, COUNT(*) AS submissions,
+               SUM(s.verdict = 'Accepted') AS accepted,
+               MIN(fa.first_ac_time) AS first_ac_time,
+               SUM(s.submission_time < fa.first_ac_time) AS attempts_before_ac
+        FROM submissions s
+        LEFT JOIN (
+            SELECT problem_id, username, MIN(submission_time) AS first_ac_time
+            FROM submissions
+            WHERE verdict = 'Accepted' {_problem_filter(problem_ids, keyword="AND")}
+            GROUP BY problem_id, username
+        ) AS fa ON fa.problem_id = s.problem_id AND fa.username = s.username
+        WHERE s.username IS NOT NULL {_problem_filter(problem_ids, "s.problem_id", "AND")}
+        GROUP BY s.problem_id, s.username
+    ) AS pu ON pu.problem_id = p.problem_id
+    {_problem_filter(problem_ids, "p.problem_id")}
+    GROUP BY p.problem_id
+    """
+    execute_query(cursor, query, values * 3 if values else None, commit=False)
+
+    query = f"""
+    INSERT INTO problem_verdict_stats (problem_id, verdict, submission_count)
+    SELECT problem_id, COALESCE(verdict, ''), COUNT(*)
+    FROM submissions
+    {_problem_filter(problem_ids)}
+    GROUP BY problem_id, COALESCE(verdict, '')
+    """
+    execute_query(cursor, query, values, commit=False)
+
+    query = f"""
+    INSERT INTO problem_title_stats (problem_id, rating_title, solver_count, rating_sum)
+    SELECT solvers.problem_id, COALESCE(u.rating_title, ''), COUNT(*), COALESCE(SUM(u.rating), 0)
+    FROM (
+        SELECT DISTINCT problem_id, username
+        FROM submissions
+        WHERE verdict = 'Accepted' {_problem_filter(problem_ids, keyword="AND")}
+    ) AS solvers
+    JOIN users u ON solvers.username = u.username
+    GROUP BY solvers.problem_id, COALESCE(u.rating_title, '')
+    """
+    execute_query(cursor, query, values, commit=False)
+
+    query = f"""
+    INSERT INTO problem_rating_stats (problem_id, rating_bucket, solver_count)
+    SELECT solvers.problem_id, FLOOR(u.rating / {RATING_BUCKET}) * {RATING_BUCKET}, COUNT(*)
+    FROM (
+        SELECT DISTINCT problem_id, username
+        FROM submissions
+        WHERE verdict = 'Accepted' {_problem_filter(problem_ids, keyword="AND")}
+    ) AS solvers
+    JOIN users u ON solvers.username = u.username
+    WHERE u.rating IS NOT NULL
+    GROUP BY solvers.problem_id, FLOOR(u.rating / {RATING_BUCKET}) * {RATING_BUCKET}
+    """
+    execute_query(cursor, query, values, commit=False)
+    if commit:
+        db.commit()
+
+def _fetch_user_title(cursor, username):
+    cursor.execute("SELECT rating_title, rating FROM users WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    return (row[0] or "", row[1]) if row else ("", None)
+
+# Before update_user_stats folds new rows, snapshot what the problem aggregates need.
+# Returns None when the user's per-problem states can't be trusted as a baseline.
+def fetch_problem_baseline(cursor, username, submissions):
+    if fetch_user_stats(cursor, username) is None:
+        return None
+    return fetch_problem_states(cursor, username, sorted({s["problem_id"] for s in submissions}))
+
+# Apply one user's newly ingested submissions to the problem aggregates.
+# `before_states` is the user's per-problem state prior to these rows (fetch_problem_baseline).
+def update_problem_stats(cursor, db, username, submissions, before_states, commit=True):
+    if not submissions:
+        return
+    submissions = sorted(submissions, key=lambda s: s["submission_time"])
+    problem_ids = sorted({s["problem_id"] for s in submissions})
+
+    # No baseline, or rows landing before ones already folded: recount those problems
+    if before_states is None or any(
+        s["problem_id"] in before_states
+        and before_states[s["problem_id"]]["last_attempt_time"] is not None
+        and s["submission_time"] < before_states[s["problem_id"]]["last_attempt_time"]
+        for s in submissions
+    ):
+        rebuild_problem_stats(cursor, db, problem_ids, commit=commit)
+        return
+
+    states = copy.deepcopy(before_states)
+    delta = fold_submissions(states, submissions)
+    newly_attempted = set(delta["newly_attempted"])
+    newly_solved = set(delta["newly_solved"])
+
+    submission_counts = Counter(s["problem_id"] for s in submissions)
+    verdict_counts = Counter((s["problem_id"], s["verdict"] or "") for s in submissions)
+
+    stats_rows = []
+    for problem_id in problem_ids:
+        state = states[problem_id]
+        before = before_states.get(problem_id)
+        solver_submissions = 0
+        if state["solved"]:
+            solver_submissions = state["attempts"] - (before["attempts"] if before and before["solved"] else 0)
+        stats_rows.append((
+            problem_id,
+            submission_counts[problem_id],
+            delta["accepted_by_problem"][problem_id],
+            1 if problem_id in newly_attempted else 0,
+            1 if problem_id in newly_solved else 0,
+            state["attempts_before_ac"] if problem_id in newly_solved else 0,
+            solver_submissions
+        ))
+    query = """
+    INSERT INTO problem_stats (
+        problem_id, total_submissions, accepted_submissions, attempter_count, solver_count,
+        attempts_before_ac_sum, solver_submissions
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        total_submissions = total_submissions + VALUES(total_submissions),
+        accepted_submissions = accepted_submissions + VALUES(accepted_submissions),
+        attempter_count = attempter_count + VALUES(attempter_count),
+        solver_count = solver_count + VALUES(solver_count),
+        attempts_before_ac_sum = attempts_before_ac_sum + VALUES(attempts_before_ac_sum),
+        solver_submissions = solver_submissions + VALUES(solver_submissions)
+    """
+    execute_query(cursor, query, stats_rows, commit=False)
+
+    query = """
+    INSERT INTO problem_verdict_stats (problem_id, verdict, submission_count)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE submission_count = submission_count + VALUES(submission_count)
+    """
+    execute_query(cursor, query, [
+        (problem_id, verdict, count) for (problem_id, verdict), count in sorted(verdict_counts.items())
+    ], commit=False)
+
+    if newly_solved:
+        rating_title, rating = _fetch_user_title(cursor, username)
+        query = """
+        INSERT INTO problem_title_stats (problem_id, rating_title, solver_count, rating_sum)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            solver_count = solver_count + VALUES(solver_count),
+            rating_sum = rating_sum + VALUES(rating_sum)
+        """
+        execute_query(cursor, query, [
+            (problem_id, rating_title, 1, rating or 0) for problem_id in sorted(newly_solved)
+        ], commit=False)
+
+        if rating is not None:
+            query = """
+            INSERT INTO problem_rating_stats (problem_id, rating_bucket, solver_count)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE solver_count = solver_count + VALUES(solver_count)
+            """
+            execute_query(cursor, query, [
+                (problem_id, rating // RATING_BUCKET * RATING_BUCKET, 1) for problem_id in sorted(newly_solved)
+            ], commit=False)
+    if commit:
+        db.commit()
+
+# The problems' aggregate rows, building them first for problems that predate the tables
+def ensure_problem_stats(cursor, db, problem_ids):
+    stats = fetch_problem_stats(cursor, problem_ids)
+    missing = [problem_id for problem_id in problem_ids if problem_id not in stats]
+    if missing:
+        rebuild_problem_stats(cursor, db, missing)
+        stats.update(fetch_problem_stats(cursor, missing))
+    return stats
+
+# {problem_id: (bucket lower bounds, solver counts)} of the problems' solver-rating histograms, ascending
+def fetch_solver_rating_histograms(cursor, problem_ids):
+    if not problem_ids:
+        return {}
+    query = f"""
+    SELECT problem_id, rating_bucket, solver_count
+    FROM problem_rating_stats
+    WHERE problem_id IN ({_in_clause(problem_ids)}) AND solver_count > 0
+    ORDER BY problem_id, rating_bucket
+    """
+    cursor.execute(query, tuple(problem_ids))
+    grouped = {}
+    for problem_id, bucket, count in cursor.fetchall():
+        buckets, counts = grouped.setdefault(problem_id, ([], []))
+        buckets.append(bucket)
+        counts.append(count)
+    return {
+        problem_id: (np.array(buckets, dtype=np.float64), np.array(counts, dtype=np.float64))
+        for problem_id, (buckets, counts) in grouped.items()
+    }
+
+# Ratings at the given quantiles, interpolating linearly inside a bucket
+def rating_quantiles(buckets, counts, quantiles):
+    total = counts.sum()
+    if total == 0:
+        return [None for _ in quantiles]
+    cumulative = np.cumsum(counts)
+    targets = np.asarray(quantiles, dtype=np.float64) * total
+    indexes = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(counts) - 1)
+    before = cumulative[indexes] - counts[indexes]
+    offsets = (targets - before) / counts[indexes]
+    return [round(float(value), 1) for value in buckets[indexes] + np.clip(offsets, 0, 1) * RATING_BUCKET]
+
+# Solvers with a rating in [low, high); None leaves that side open
+def solvers_in_rating_range(buckets, counts, low=None, high=None):
+    mask = np.ones(len(buckets), dtype=bool)
+    if low is not None:
+        mask &= buckets >= low
+    if high is not None:
+        mask &= buckets < high
+    return int(counts[mask].sum())
+
+def fetch_title_user_counts(cursor):
+    cursor.execute("SELECT rating_title, COUNT(*) FROM users WHERE rating_title IS NOT NULL GROUP BY rating_title")
+    return dict(cursor.fetchall())
+
+# Quantiles of the solvers' ratings and, per title, the fraction of users holding it who solved the problem
+def rating_profile(buckets, counts, title_users):
+    p10, median, p90 = rating_quantiles(buckets, counts, (0.1, 0.5, 0.9))
+    title_solve_rates = {}
+    for title, low, high in RATING_TITLES:
+        solvers = solvers_in_rating_range(buckets, counts, low, high)
+        users = title_users.get(title, 0)
+        title_solve_rates[title] = {
+            "solver_count": solvers,
+            "solved_fraction": round(min(solvers / users, 1.0), 4) if users else None
+        }
+    return {
+        "rated_solver_count": int(counts.sum()),
+        "p10": p10,
+        "median": median,
+        "p90": p90,
+        "title_solve_rates": title_solve_rates
+    }
+
+# {problem_id: rating_profile} for problems whose aggregates already exist (see ensure_problem_stats)
+def solver_rating_profiles(cursor, problem_ids):
+    histograms = fetch_solver_rating_histograms(cursor, problem_ids)
+    title_users = fetch_title_user_counts(cursor)
+    empty = (np.zeros(0), np.zeros(0))
+    return {
+        problem_id: rating_profile(*histograms.get(problem_id, empty), title_users)
+        for problem_id in problem_ids
+    }
+
+# Bulk rebuild: python3 problem_stats.py [problem_id ...]
+if __name__ == "__main__":
+    import sys
+    from db import get_db_connection, close_db_connection
+
+    problem_ids = sys.argv[1:] or None
+    db, cursor = get_db_connection()
+    try:
+        rebuild_problem_stats(cursor, db, problem_ids)
+        print(f"Rebuilt problem aggregates for {len(problem_ids) if problem_ids else 'all'} problems")
+    finally:
+        close_db_connection(db, cursor)
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import numpy as np
+from db import get_db_connection, close_db_connection
+from result_cache import cached_artifact
+
+# Rolling statistics, drawdowns and percentile position over a user's rating history.
+# The series statistics only change with the user's own contests and are cached.
+# The percentile among all users moves with everyone else's rating, so it is
+# recomputed on every call and never stored in the cached result.
+
+base_path = os.path.join("users")
+
+def _cache_path(username):
+    return os.path.join(base_path, username, f"{username}_rating_analytics.json")
+
+def fetch_rating_series(cursor, username):
+    query = """
+    SELECT uc.contest_id, c.contest_name, c.start_time, uc.rating_change, uc.final_rating
+    FROM user_contests uc
+    JOIN contests c ON uc.contest_id = c.contest_id
+    WHERE uc.username = %s
+    ORDER BY c.start_time, uc.contest_id
+    """
+    cursor.execute(query, (username,))
+    return cursor.fetchall()
+
+# Share of rated users below `rating`, counting ties as half
+def fetch_rating_percentile(cursor, rating):
+    if rating is None:
+        return None
+    query = """
+    SELECT COUNT(*), SUM(rating < %s), SUM(rating = %s)
+    FROM users
+    WHERE rating IS NOT NULL
+    """
+    cursor.execute(query, (rating, rating))
+    total, below, equal = cursor.fetchone()
+    if not total:
+        return None
+    return float((float(below) + 0.5 * float(equal)) / total * 100)
+
+# Mean and standard deviation over a trailing window (shorter at the start of the series)
+def rolling_mean_std(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values, values
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    csq = np.concatenate(([0.0], np.cumsum(values * values)))
+    end = np.arange(1, n + 1)
+    start = np.maximum(0, end - window)
+    count = end - start
+    mean = (csum[end] - csum[start]) / count
+    var = (csq[end] - csq[start]) / count - mean * mean
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+def compute_rating_analytics(rows, window=5):
+    if not rows:
+        return {"summary": None, "series": []}
+
+    final_ratings = np.array([row[4] or 0 for row in rows], dtype=np.float64)
+    rating_changes = np.array([row[3] or 0 for row in rows], dtype=np.float64)
+
+    rolling_mean, _ = rolling_mean_std(final_ratings, window)
+    _, volatility = rolling_mean_std(rating_changes, window)
+    running_peak = np.maximum.accumulate(final_ratings)
+    drawdown = running_peak - final_ratings
+
+    peak_index = int(np.argmax(final_ratings))
+    current = float(final_ratings[-1])
+    summary = {
+        "latest_contest_id": rows[-1][0],
+        "contest_count": len(rows),
+        "window": window,
+        "current_rating": int(current),
+        "peak_rating": int(final_ratings[peak_index]),
+        "peak_contest_id": rows[peak_index][0],
+        "peak_to_current_gap": int(final_ratings[peak_index] - current),
+        "max_drawdown": int(drawdown.max()),
+        "current_drawdown": int(drawdown[-1]),
+        "volatility": float(rating_changes.std()),
+        "recent_volatility": float(volatility[-1])
+    }
+    series = [
+        {
+            "contest_id": row[0],
+            "contest_name": row[1],
+            "contest_date": row[2].strftime('%Y-%m-%d %H:%M:%S') if row[2] else None,
+            "final_rating": int(final_ratings[i]),
+            "rolling_mean": round(float(rolling_mean[i]), 2),
+            "rolling_volatility": round(float(volatility[i]), 2),
+            "drawdown": int(drawdown[i])
+        }
+        for i, row in enumerate(rows)
+    ]
+    return {"summary": summary, "series": series}
+
+@cached_artifact("rating_analytics")
+def compute_user_rating_analytics(username, window=5):
+    db, cursor = get_db_connection()
+    try:
+        return compute_rating_analytics(fetch_rating_series(cursor, username), window)
+    finally:
+        close_db_connection(db, cursor)
+
+def get_rating_analytics(username, window=5):
+    data = compute_user_rating_analytics(username, window)
+    if data["summary"] is not None:
+        db, cursor = get_db_connection()
+        try:
+            percentile = fetch_rating_percentile(cursor, data["summary"]["current_rating"])
+        finally:
+            close_db_connection(db, cursor)
+        # Copy rather than mutate: the cached result is shared
+        data = {**data, "summary": {**data["summary"], "percentile": percentile}}
+
+    os.makedirs(os.path.join(base_path, username), exist_ok=True)
+    with open(_cache_path(username), 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+    print(f"Rating analytics saved to {_cache_path(username)}")
+    return data
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 rating_analytics.py <username>", file=sys.stderr)
+        sys.exit(1)
+    get_rating_analytics(sys.argv[1])
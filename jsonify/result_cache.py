@@ -0,0 +1,241 @@
+import os
+import glob
+import pickle
+import shutil
+import inspect
+import hashlib
+import functools
+from collections import Counter, OrderedDict
+from db import get_pooled_connection, close_db_connection
+
+# Cache for per-user analytics results.
+#
+# Entries are keyed on (username, artifact, user version, code version, args), where the
+# user version is (users.last_updated, users.profile_version): the first moves with new
+# submissions, the second when profile details or contest results are rewritten.
+# The code version digests every module in this directory, so a change to a shared
+# helper invalidates the disk tier as well as a change to the decorated function.
+# Re-ingesting a user bumps that version, so old entries simply stop matching;
+# the ingest writer also calls invalidate_user() to drop them eagerly.
+# Hot entries live in an in-memory LRU, everything is also pickled under
+# .cache/results/<username>/ so retries of main.py start warm.
+# Pairwise comparisons use a second, size-bounded cache keyed on both users
+# (.cache/comparisons/<digest of the pair>/).
+#
+# Decorated functions must be pure: they compute and return a result and write nothing.
+# The get_* functions that call them write the users/ JSON files on every call, hits
+# included, so an artifact removed by invalidate_user() is written again on the next request.
+
+# Bump to drop cached results without a code change (e.g. after a data migration)
+CACHE_VERSION = "1"
+
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results")
+comparisons_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "comparisons")
+
+# users/ folder served by server.js; artifact.py writes <username>_<filetype>.json there
+users_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "users")
+
+# Directory of a key's owner: the username itself, or a digest for a (username1, username2)
+# pair, since no separator is both valid in file names everywhere and absent from handles
+def _owner_dir(owner):
+    if isinstance(owner, str):
+        return owner
+    return hashlib.sha1("\n".join(owner).encode()).hexdigest()[:16]
+
+class ResultCache:
+    # max_disk_entries bounds the pickles on disk too; the least recently used go first
+    def __init__(self, max_entries=512, directory=cache_dir, max_disk_entries=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.artifact_hits = Counter()
+        self.artifact_misses = Counter()
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, _owner_dir(key[0]), f"{key[1]}_{digest[:16]}.pkl")
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self._count_hit(key)
+            return True, self.entries[key]
+
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    stored_key, value = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError):
+                stored_key, value = None, None
+            if stored_key == key:
+                self._remember(key, value)
+                if self.max_disk_entries is not None:
+                    os.utime(path)
+                self._count_hit(key)
+                return True, value
+
+        self.misses += 1
+        self.artifact_misses[key[1]] += 1
+        return False, None
+
+    def _count_hit(self, key):
+        self.hits += 1
+        self.artifact_hits[key[1]] += 1
+
+    def put(self, key, value):
+        self._remember(key, value)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, value), f)
+        os.replace(tmp_path, path)
+        if self.max_disk_entries is not None:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        paths = glob.glob(os.path.join(self.directory, "*", "*.pkl"))
+        if len(paths) <= self.max_disk_entries:
+            return
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        # Trim to 90% so eviction doesn't run on every put once full
+        for path in paths[:len(paths) - int(self.max_disk_entries * 0.9)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate_user(self, username):
+        for key in [key for key in self.entries if key[0] == username]:
+            del self.entries[key]
+        shutil.rmtree(os.path.join(self.directory, username), ignore_errors=True)
+
+    def stats(self):
+        total = self.hits + self.misses
+        by_artifact = {}
+        for artifact in sorted(set(self.artifact_hits) | set(self.artifact_misses)):
+            hits, misses = self.artifact_hits[artifact], self.artifact_misses[artifact]
+            by_artifact[artifact] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+            "by_artifact": by_artifact
+        }
+
+result_cache = ResultCache()
+
+# Pairwise comparison results; popular pairs are requested by many viewers
+comparison_cache = ResultCache(max_entries=256, directory=comparisons_dir, max_disk_entries=4096)
+
+# Drop cached results and the generated artifact files so the next request rebuilds them
+def invalidate_user(username):
+    result_cache.invalidate_user(username)
+    for file_path in glob.glob(os.path.join(users_dir, glob.escape(username), f"{glob.escape(username)}_*.json")):
+        os.remove(file_path)
+
+def _user_version(last_updated, profile_version):
+    return (last_updated.isoformat() if last_updated else None, profile_version)
+
+# Runs on every cached call, hits included, so it borrows a pooled connection
+def fetch_user_version(username):
+    db, cursor = get_pooled_connection()
+    try:
+        cursor.execute("SELECT last_updated, profile_version FROM users WHERE username = %s", (username,))
+        row = cursor.fetchone()
+    finally:
+        close_db_connection(db, cursor)
+    return _user_version(*row) if row else None
+
+def fetch_user_versions(cursor, usernames):
+    cursor.execute(
+        f"SELECT username, last_updated, profile_version FROM users WHERE username IN ({', '.join(['%s'] * len(usernames))})",
+        tuple(usernames)
+    )
+    found = {row[0]: _user_version(row[1], row[2]) for row in cursor.fetchall()}
+    return tuple(found.get(username) for username in usernames)
+
+# Digest of the analytics sources next to this file
+def source_version(directory=os.path.dirname(os.path.abspath(__file__))):
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(directory, "*.py"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+CODE_VERSION = CACHE_VERSION + ":" + source_version()
+
+# Decorator for analytics functions whose first argument is the username.
+# None results are not cached, so failed computations are retried next time.
+def cached_artifact(artifact):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(username, *args, **kwargs):
+            key = (
+                username,
+                artifact,
+                fetch_user_version(username),
+                CODE_VERSION,
+                args,
+                tuple(sorted(kwargs.items()))
+            )
+            found, value = result_cache.get(key)
+            if found:
+                return value
+
+            value = func(username, *args, **kwargs)
+            if value is not None:
+                result_cache.put(key, value)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+# Decorator for comparison functions taking `cursor`, `username1` and `username2`.
+# Entries are keyed on both users' versions, so a cached pair is reused until either
+# user's submissions, profile or contest results change.
+def cached_comparison(part):
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            username1 = bound.arguments["username1"]
+            username2 = bound.arguments["username2"]
+            extra = tuple(
+                (name, value) for name, value in bound.arguments.items()
+                if name not in ("cursor", "db", "username1", "username2")
+            )
+            key = (
+                (username1, username2),
+                part,
+                fetch_user_versions(bound.arguments["cursor"], [username1, username2]),
+                CODE_VERSION,
+                extra
+            )
+            found, value = comparison_cache.get(key)
+            if found:
+                return value
+
+            value = func(*args, **kwargs)
+            if value is not None:
+                comparison_cache.put(key, value)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from contest_features import FEATURE_COLUMNS, compute_contest_features
+
+def test_features_per_contest():
+    frame = pd.DataFrame(
+        [
+            (1, "1_A", 800, 1),
+            (1, "1_A", 800, 2),
+            (1, "1_B", 1200, 2),
+            (2, "2_A", 1500, None),
+        ],
+        columns=["contest_id", "problem_id", "diff_rating", "tag_id"]
+    )
+    features = compute_contest_features(frame)
+
+    assert list(features.columns) == FEATURE_COLUMNS
+    assert features.index.tolist() == [1, 2]
+    assert features.index.dtype == np.int64
+    # A problem with several tags counts once toward the rating statistics
+    assert features.loc[1].tolist() == [1000.0, 200.0, 2.0, 2.0]
+    # Untagged contests get a tag variety of 0
+    assert features.loc[2].tolist() == [1500.0, 0.0, 1.0, 0.0]
@@ -0,0 +1,54 @@
+import numpy as np
+from contest_index import NO_RANK, ContestIndex
+
+def _index(participations):
+    usernames = sorted(participations)
+    return ContestIndex(usernames, {
+        i: ContestIndex._sorted(
+            [contest_id for contest_id, _ in participations[username]],
+            [rank for _, rank in participations[username]]
+        )
+        for i, username in enumerate(usernames)
+    })
+
+def test_head_to_head_counts_wins_losses_and_ties():
+    index = _index({
+        "alice": [(1, 10), (2, 5), (3, 7), (4, 1)],
+        "bob": [(1, 20), (2, 3), (3, 7)],
+        "carol": [(4, 2)],
+    })
+    assert index.head_to_head("alice", ["bob", "carol"]) == {
+        "bob": {"common_contests": 3, "wins": 1, "losses": 1, "ties": 1},
+        "carol": {"common_contests": 1, "wins": 1, "losses": 0, "ties": 0},
+    }
+
+def test_head_to_head_missing_rank_is_common_but_unscored():
+    index = _index({"alice": [(1, NO_RANK), (2, 4)], "bob": [(1, 2), (2, NO_RANK)]})
+    assert index.head_to_head("alice", ["bob"]) == {
+        "bob": {"common_contests": 2, "wins": 0, "losses": 0, "ties": 0}
+    }
+    assert index.common_contests("alice", "bob") == [(1, None, 2), (2, 4, None)]
+
+def test_head_to_head_ignores_self_duplicates_and_unknown_users():
+    index = _index({"alice": [(1, 1)], "bob": [(1, 2)]})
+    assert index.head_to_head("alice", ["alice", "bob", "bob", "dave"]) == {
+        "bob": {"common_contests": 1, "wins": 1, "losses": 0, "ties": 0},
+        "dave": {"common_contests": 0, "wins": 0, "losses": 0, "ties": 0},
+    }
+
+def test_head_to_head_after_update_user():
+    class Cursor:
+        def execute(self, query, values):
+            pass
+        def fetchall(self):
+            return [(2, 1), (3, None)]
+
+    index = _index({"alice": [(1, 3)], "bob": [(1, 1), (2, 2)]})
+    index.update_user(Cursor(), "alice")
+    contests, ranks = index.contests_of("alice")
+    assert contests.tolist() == [2, 3]
+    assert ranks.tolist() == [1, NO_RANK]
+    assert index.head_to_head("bob", ["alice"]) == {
+        "alice": {"common_contests": 1, "wins": 0, "losses": 1, "ties": 0}
+    }
+    assert np.array_equal(index.contest_users[1][0], [index.user_ids["bob"]])
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from hll import (
+    SPARSE_FLAG, add_values, estimate, from_blob, merge, new_sketch, standard_error, to_blob
+)
+
+def test_empty_sketch_estimates_zero():
+    assert estimate(new_sketch()) == 0
+
+@pytest.mark.parametrize("count", [10, 1000, 50000])
+def test_estimate_within_error(count):
+    sketch = add_values(new_sketch(), (f"user{i}" for i in range(count)))
+    assert abs(estimate(sketch) - count) <= 4 * standard_error() * count + 1
+
+def test_adding_values_again_changes_nothing():
+    sketch = add_values(new_sketch(), ["alice", "bob"])
+    again = add_values(sketch.copy(), ["alice", "bob", "alice"])
+    assert np.array_equal(sketch, again)
+
+def test_merge_is_union():
+    left = add_values(new_sketch(), (f"user{i}" for i in range(0, 3000)))
+    right = add_values(new_sketch(), (f"user{i}" for i in range(2000, 5000)))
+    both = add_values(new_sketch(), (f"user{i}" for i in range(0, 5000)))
+    assert np.array_equal(merge(left, right), both)
+
+def test_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        merge(new_sketch(), new_sketch(precision=10))
+
+def test_sparse_blob_round_trip():
+    sketch = add_values(new_sketch(), ["alice", "bob", "carol"])
+    blob = to_blob(sketch)
+    assert blob[0] & SPARSE_FLAG
+    assert len(blob) == 1 + 3 * 3
+    assert np.array_equal(from_blob(blob), sketch)
+
+def test_dense_blob_round_trip():
+    sketch = add_values(new_sketch(precision=8), (f"user{i}" for i in range(5000)))
+    blob = to_blob(sketch)
+    assert blob[0] == 8
+    assert len(blob) == 1 + 256
+    assert np.array_equal(from_blob(blob), sketch)
+
+def test_missing_blob_is_empty_sketch():
+    assert np.array_equal(from_blob(None), new_sketch())
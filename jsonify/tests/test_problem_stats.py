@@ -0,0 +1,17 @@
+import numpy as np
+from problem_stats import RATING_BUCKET, rating_quantiles
+
+def test_quantiles_interpolate_inside_bucket():
+    buckets = np.array([1200.0, 1300.0])
+    counts = np.array([2.0, 2.0])
+    assert rating_quantiles(buckets, counts, [0.25, 0.5, 0.75]) == [
+        1200 + RATING_BUCKET / 2, 1200 + RATING_BUCKET, 1300 + RATING_BUCKET / 2
+    ]
+
+def test_quantiles_skip_to_bucket_holding_target():
+    buckets = np.array([800.0, 1500.0, 2400.0])
+    counts = np.array([1.0, 0.0, 3.0])
+    assert rating_quantiles(buckets, counts, [0.0, 1.0]) == [800.0, 2400.0 + RATING_BUCKET]
+
+def test_quantiles_without_solvers():
+    assert rating_quantiles(np.array([1200.0]), np.array([0.0]), [0.5, 0.9]) == [None, None]
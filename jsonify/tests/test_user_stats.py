@@ -0,0 +1,53 @@
+from datetime import datetime
+from user_stats import fold_submissions
+
+def _submission(problem_id, verdict, minute):
+    return {"problem_id": problem_id, "verdict": verdict, "submission_time": datetime(2024, 1, 1, 10, minute)}
+
+def test_fold_counts_attempts_and_first_solve():
+    states = {}
+    delta = fold_submissions(states, [
+        _submission("1_A", "Wrong answer", 0),
+        _submission("1_A", "Accepted", 1),
+        _submission("1_A", "Accepted", 2),
+        _submission("1_B", "Accepted", 3),
+    ])
+
+    assert delta["total_submissions"] == 4
+    assert delta["accepted_submissions"] == 3
+    assert delta["newly_attempted"] == ["1_A", "1_B"]
+    assert delta["newly_solved"] == ["1_A", "1_B"]
+    assert delta["first_attempt_solved"] == 1
+    assert delta["accepted_by_problem"] == {"1_A": 2, "1_B": 1}
+    assert delta["verdict_problems"] == {"Wrong answer": 1, "Accepted": 2}
+    assert delta["touched"] == {"1_A", "1_B"}
+    assert delta["last_submission_time"] == datetime(2024, 1, 1, 10, 3)
+    assert delta["daily"] == {
+        datetime(2024, 1, 1).date(): {"solved": 2, "attempted": 2, "submissions": 4, "accepted": 3}
+    }
+
+    assert states["1_A"]["attempts"] == 3
+    assert states["1_A"]["attempts_before_ac"] == 1
+    assert states["1_A"]["first_ac_time"] == datetime(2024, 1, 1, 10, 1)
+    assert not states["1_A"]["first_attempt_solved"]
+    assert states["1_B"]["first_attempt_solved"]
+
+def test_fold_continues_from_existing_states():
+    states = {}
+    fold_submissions(states, [_submission("1_A", "Wrong answer", 0)])
+    delta = fold_submissions(states, [_submission("1_A", "Accepted", 5), _submission("1_A", "Wrong answer", 6)])
+
+    # Already attempted and already seen verdicts are not counted again
+    assert delta["newly_attempted"] == []
+    assert delta["newly_solved"] == ["1_A"]
+    assert delta["first_attempt_solved"] == 0
+    assert delta["verdict_problems"] == {"Accepted": 1}
+    assert states["1_A"]["attempts"] == 3
+    assert states["1_A"]["attempts_before_ac"] == 1
+    assert states["1_A"]["last_attempt_time"] == datetime(2024, 1, 1, 10, 6)
+
+def test_fold_nothing():
+    delta = fold_submissions({}, [])
+    assert delta["total_submissions"] == 0
+    assert delta["last_submission_time"] is None
+    assert delta["daily"] == {}
@@ -52,7 +52,8 @@ def fetch_and_insert_user_details(cursor, db, username, email, hashed_password):
                 university = VALUES(university),
                 problem_count = VALUES(problem_count),
                 max_rating = VALUES(max_rating),
-                rating_title = VALUES(rating_title)
+                rating_title = VALUES(rating_title),
+                profile_version = profile_version + 1
             """
             values = (
                 user["handle"],
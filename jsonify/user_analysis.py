@@ -1,8 +1,11 @@
 import mysql.connector
 import json
 import os
+import statistics
+from itertools import groupby
 from mysql.connector import Error
 from datetime import datetime
+from result_cache import cached_artifact
 
 # Database configuration
 db_config = {
@@ -43,56 +46,121 @@ def save_to_json(filename, data, username):
     with open(filepath, 'w') as json_file:
         json.dump(data, json_file, indent=4)
 
+# Summarize one user's contests from rows ordered by contest start time
+def summarize_contests(rows):
+    contests = list(rows)
+
+    summary = {
+        'contest_count': len(contests),
+        'best_rank_contest_id': None,
+        'best_rank': None,
+        'worst_rank_contest_id': None,
+        'worst_rank': None,
+        'median_rank': None,
+        'rank_trend': None,
+        'best_rating_change': None,
+        'best_rating_change_contest_id': None,
+        'worst_rating_change': None,
+        'worst_rating_change_contest_id': None
+    }
+
+    ranked = [c for c in contests if c['contest_rank'] is not None]
+    if ranked:
+        best = min(ranked, key=lambda c: c['contest_rank'])
+        worst = max(ranked, key=lambda c: c['contest_rank'])
+        summary['best_rank_contest_id'] = best['contest_id']
+        summary['best_rank'] = int(best['contest_rank'])
+        summary['worst_rank_contest_id'] = worst['contest_id']
+        summary['worst_rank'] = int(worst['contest_rank'])
+        summary['median_rank'] = float(statistics.median(c['contest_rank'] for c in ranked))
+
+        # Least-squares slope of rank over the contest sequence; negative means improving
+        n = len(ranked)
+        if n > 1:
+            mean_x = (n - 1) / 2
+            mean_y = sum(c['contest_rank'] for c in ranked) / n
+            cov = sum((i - mean_x) * (c['contest_rank'] - mean_y) for i, c in enumerate(ranked))
+            var = sum((i - mean_x) ** 2 for i in range(n))
+            summary['rank_trend'] = round(cov / var, 2)
+
+    rated = [c for c in contests if c['rating_change'] is not None]
+    if rated:
+        best = max(rated, key=lambda c: c['rating_change'])
+        worst = min(rated, key=lambda c: c['rating_change'])
+        summary['best_rating_change'] = int(best['rating_change'])
+        summary['best_rating_change_contest_id'] = best['contest_id']
+        summary['worst_rating_change'] = int(worst['rating_change'])
+        summary['worst_rating_change_contest_id'] = worst['contest_id']
+
+    return summary
+
+# Fetch contest rows for the given users (or everyone) in one ordered scan
+def fetch_contest_rows(cursor, usernames=None):
+    query = """
+        SELECT uc.username, uc.contest_id, uc.contest_rank, uc.rating_change
+        FROM user_contests uc
+        JOIN contests c ON uc.contest_id = c.contest_id
+    """
+    values = ()
+    if usernames:
+        query += " WHERE uc.username IN (" + ", ".join(["%s"] * len(usernames)) + ")"
+        values = tuple(usernames)
+    query += " ORDER BY uc.username, c.start_time, uc.contest_id"
+    cursor.execute(query, values)
+    return cursor.fetchall()
+
 # Get contest count and best rank for a user
-def get_contest_count_and_best_rank(username):
+@cached_artifact("contest_count_best_rank")
+def compute_contest_count_and_best_rank(username):
     db = get_db_connection()
     if db is None:
         return
 
     try:
         cursor = db.cursor(dictionary=True)
-        
-        # SQL query to get contest count, best rank, and worst rank
-        query = """
-            SELECT 
-                COUNT(DISTINCT uc.contest_id) AS contest_count,  -- Count distinct contests to avoid double counting
-                (SELECT uc.contest_id
-                 FROM user_contests uc
-                 WHERE uc.username = %s
-                 ORDER BY uc.contest_rank
-                 LIMIT 1) AS best_rank_contest_id,
-                (SELECT MIN(uc.contest_rank)
-                 FROM user_contests uc
-                 WHERE uc.username = %s) AS best_rank,
-                (SELECT uc.contest_id
-                 FROM user_contests uc
-                 WHERE uc.username = %s
-                 ORDER BY uc.contest_rank DESC
-                 LIMIT 1) AS worst_rank_contest_id,
-                (SELECT MAX(uc.contest_rank)
-                 FROM user_contests uc
-                 WHERE uc.username = %s) AS worst_rank
-            FROM user_contests uc
-            WHERE uc.username = %s;
-        """
-        
-        cursor.execute(query, (username, username, username, username, username))
-        data = cursor.fetchall()
-
-        for entry in data:
-            entry['contest_count'] = int(entry['contest_count'])
-            entry['best_rank'] = int(entry['best_rank']) if entry['best_rank'] is not None else None
-            entry['worst_rank'] = int(entry['worst_rank']) if entry['worst_rank'] is not None else None
-            entry['best_rank_contest_id'] = entry['best_rank_contest_id'] if entry['best_rank_contest_id'] is not None else None
-            entry['worst_rank_contest_id'] = entry['worst_rank_contest_id'] if entry['worst_rank_contest_id'] is not None else None
+        return [summarize_contests(fetch_contest_rows(cursor, [username]))]
+    
+    except mysql.connector.Error as e:
+        print(f"Error: {e}")
+    
+    finally:
+        cursor.close()
+        db.close()
 
+def get_contest_count_and_best_rank(username):
+    data = compute_contest_count_and_best_rank(username)
+    if data is not None:
         # Save the data to a JSON file
         save_to_json(f'{username}_contest_count_best_rank.json', data, username)
         print(f"Contest count, best rank, and worst rank saved to {username}_contest_count_best_rank.json")
-    
+    return data
+
+# Contest summaries for many users at once (all users when usernames is None)
+def get_contest_summaries(usernames=None, save=True):
+    db = get_db_connection()
+    if db is None:
+        return
+
+    try:
+        cursor = db.cursor(dictionary=True)
+        rows = fetch_contest_rows(cursor, usernames)
+
+        summaries = {
+            username: summarize_contests(list(user_rows))
+            for username, user_rows in groupby(rows, key=lambda row: row['username'])
+        }
+        for username in usernames or []:
+            summaries.setdefault(username, summarize_contests([]))
+
+        if save:
+            for username, summary in summaries.items():
+                save_to_json(f'{username}_contest_count_best_rank.json', [summary], username)
+            print(f"Contest summaries saved for {len(summaries)} users")
+        return summaries
+
     except mysql.connector.Error as e:
         print(f"Error: {e}")
-    
+
     finally:
         cursor.close()
         db.close()
@@ -100,7 +168,8 @@ def get_contest_count_and_best_rank(username):
 
 
 # Get user rating history
-def get_user_rating_history(username):
+@cached_artifact("user_rating_history")
+def compute_user_rating_history(username):
     db = get_db_connection()
     if db is None:
         return
@@ -127,70 +196,70 @@ def get_user_rating_history(username):
             entry['contest_date'] = mysql_datetime_to_str(entry['contest_date'])
             entry['rating_change'] = int(entry['rating_change']) if entry['rating_change'] is not None else None
             entry['final_rating'] = int(entry['final_rating']) if entry['final_rating'] is not None else None
-
-        # Remove duplicates based on contest_date and contest_name
-        seen = set()
-        unique_data = []
-        for entry in data:
-            identifier = (entry['contest_date'], entry['contest_name'])
-            if identifier not in seen:
-                unique_data.append(entry)
-                seen.add(identifier)
-
-        save_to_json(f'{username}_user_rating_history.json', unique_data, username)
-        print("User rating history saved to user_rating_history.json")
+        return data
     except Error as e:
         print(f"Error: {e}")
     finally:
         cursor.close()
         db.close()
 
+def get_user_rating_history(username):
+    data = compute_user_rating_history(username)
+    if data is not None:
+        save_to_json(f'{username}_user_rating_history.json', data, username)
+        print("User rating history saved to user_rating_history.json")
+    return data
+
 # Get contest cards for a user
-def get_contest_cards(username):
+@cached_artifact("contest_cards")
+def compute_contest_cards(username):
     db = get_db_connection()
     if db is None:
         return
 
     try:
         cursor = db.cursor(dictionary=True)
+        # Solve counts come from the user_contest_stats rollup maintained on ingest
         query = """
             SELECT 
                 c.contest_name, 
                 uc.contest_rank, 
                 uc.rating_change, 
                 uc.penalty,
-                (SELECT COUNT(DISTINCT s.problem_id) 
-                FROM submissions s 
-                JOIN problems p ON s.problem_id = p.problem_id
-                WHERE s.username = uc.username AND p.contest_id = uc.contest_id) AS problems_solved
+                COALESCE(ucs.problems_solved, 0) AS problems_solved,
+                COALESCE(ucs.problems_attempted, 0) AS problems_attempted,
+                ucs.first_ac_time
             FROM 
                 user_contests uc
             JOIN 
                 contests c ON uc.contest_id = c.contest_id
+            LEFT JOIN 
+                user_contest_stats ucs ON ucs.username = uc.username AND ucs.contest_id = uc.contest_id
             WHERE 
                 uc.username = %s;
         """
         cursor.execute(query, (username,))
         data = cursor.fetchall()
 
-        # Remove duplicates based on 'contest_name'
-        unique_data = []
-        seen_contests = set()
         for entry in data:
-            contest_name = entry['contest_name']
-            if contest_name not in seen_contests:
-                unique_data.append(entry)
-                seen_contests.add(contest_name)
-
-        # Save unique data to a JSON file
-        save_to_json(f'{username}_contest_cards.json', unique_data, username)
-        print("Contest cards saved to contest_cards.json")
+            entry['problems_solved'] = int(entry['problems_solved'])
+            entry['problems_attempted'] = int(entry['problems_attempted'])
+            entry['first_ac_time'] = mysql_datetime_to_str(entry['first_ac_time'])
+        return data
     except Error as e:
         print(f"Error: {e}")
     finally:
         cursor.close()
         db.close()
 
+def get_contest_cards(username):
+    data = compute_contest_cards(username)
+    if data is not None:
+        # Save data to a JSON file
+        save_to_json(f'{username}_contest_cards.json', data, username)
+        print("Contest cards saved to contest_cards.json")
+    return data
+
 # Main block to run the functions
 if __name__ == "__main__":
     username = "aru123"  # Replace with the desired username
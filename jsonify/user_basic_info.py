@@ -1,6 +1,8 @@
 import os
 import json
 from db import get_db_connection, close_db_connection, execute_query_2
+from user_stats import ensure_user_stats
+from result_cache import cached_artifact
 
 def get_user_rating_title(rating):
     if rating < 1200:
@@ -44,7 +46,8 @@ def save_to_json(filename, data, username):
         json.dump(data, json_file, indent=4)
 
 # Get basic user information including total submissions
-def get_user_basic_info(username):
+@cached_artifact("basic_info")
+def compute_user_basic_info(username):
     db, cursor = get_db_connection()
     try:
         # Query to fetch the basic user information
@@ -71,14 +74,8 @@ def get_user_basic_info(username):
             print(f"No data found for username: {username}")  # Debugging line
             return
 
-        # Query to fetch total number of submissions for the user
-        query_submissions = """
-            SELECT COUNT(*) 
-            FROM submissions
-            WHERE username = %s;
-        """
-        execute_query_2(cursor, query_submissions, (username,), commit=False)
-        total_submissions = cursor.fetchone()[0]  # Fetch the count of submissions
+        # Total number of submissions for the user, read from user_stats
+        total_submissions = ensure_user_stats(cursor, db, username)["total_submissions"]
 
         # Map the result to a dictionary
         data = {
@@ -94,17 +91,21 @@ def get_user_basic_info(username):
         }
 
         # Format JSON with username as the key
-        json_data = {username: data}
-
-        # Save to JSON file
-        save_to_json(f'{username}_basic_info.json', json_data, username)
-        print("User basic information and total submissions saved to JSON file.")
+        return {username: data}
         
     except Exception as e:
         print(f"Error: {e}")
     finally:
         close_db_connection(db, cursor)
 
+def get_user_basic_info(username):
+    json_data = compute_user_basic_info(username)
+    if json_data is not None:
+        # Save to JSON file
+        save_to_json(f'{username}_basic_info.json', json_data, username)
+        print("User basic information and total submissions saved to JSON file.")
+    return json_data
+
 # Main block to run the function
 if __name__ == "__main__":
     username = "aru123"  # Replace with the desired username
@@ -1,6 +1,11 @@
 import json
 from decimal import Decimal
-from db import get_db_connection, close_db_connection, execute_query  # Import functions from your helper file
+from db import get_db_connection, close_db_connection  # Import functions from your helper file
+from user_stats import ensure_user_stats
+from bitsets import load_user_bitsets, solved_overlap, fetch_tag_counts
+from peer_index import find_peers
+from contest_index import get_index as get_contest_index
+from result_cache import cached_comparison, comparison_cache
 
 # Custom function to convert Decimal objects to float
 def decimal_default(obj):
@@ -8,78 +13,156 @@ def decimal_default(obj):
         return float(obj)
     raise TypeError
 
-# Function to fetch and compute user comparison stats
-def fetch_user_comparison_stats(cursor, username1, username2):
-    # Fetch user stats
-    query = """
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+# Fields the leaderboard can be ranked by (descending), with tie-breakers after the first
+LEADERBOARD_KEYS = ("rating", "max_rating", "solved_count", "total_contests", "problem_count")
+
+# Rating, problem counts and contest totals for any number of users, one grouped query each
+def fetch_group_stats(cursor, db, usernames):
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return {}
+    values = tuple(usernames)
+
+    query = f"""
     SELECT username, rating, problem_count, max_rating
     FROM users
-    WHERE username = %s OR username = %s
+    WHERE username IN ({_in_clause(usernames)})
     """
-    execute_query(cursor, query, (username1, username2))
-    user_stats = {user[0]: {"rating": user[1], "problem_count": user[2], "max_rating": user[3]} for user in cursor.fetchall()}
+    cursor.execute(query, values)
+    group_stats = {
+        user[0]: {"rating": user[1], "problem_count": user[2], "max_rating": user[3]}
+        for user in cursor.fetchall()
+    }
 
-    # Fetch total contests (without total rating change)
-    contest_query = """
-    SELECT username, COUNT(*) AS total_contests
+    contest_query = f"""
+    SELECT username, COUNT(DISTINCT contest_id) AS total_contests
     FROM user_contests
-    WHERE username = %s OR username = %s
+    WHERE username IN ({_in_clause(usernames)})
     GROUP BY username
     """
-    execute_query(cursor, contest_query, (username1, username2))
-    contest_data = {contest[0]: {"total_contests": contest[1]} for contest in cursor.fetchall()}
+    cursor.execute(contest_query, values)
+    contest_counts = dict(cursor.fetchall())
+
+    aggregates = fetch_group_submission_stats(cursor, db, list(group_stats))
+    for username, stats in group_stats.items():
+        stats["total_contests"] = contest_counts.get(username, 0)
+        stats.update(aggregates.get(username, {"solved_count": 0, "avg_submissions": 0}))
+    return group_stats
+
+# Solved count and average submissions per attempted problem from user_stats;
+# users that predate the aggregate tables are built first
+def fetch_group_submission_stats(cursor, db, usernames):
+    if not usernames:
+        return {}
+    query = f"""
+    SELECT username, solved_count, attempted_count, total_submissions
+    FROM user_stats
+    WHERE username IN ({_in_clause(usernames)})
+    """
+    cursor.execute(query, tuple(usernames))
+    rows = {row[0]: row[1:] for row in cursor.fetchall()}
+    for username in usernames:
+        if username not in rows:
+            stats = ensure_user_stats(cursor, db, username)
+            rows[username] = (stats["solved_count"], stats["attempted_count"], stats["total_submissions"])
+    return {
+        username: {
+            "solved_count": solved,
+            "avg_submissions": total / attempted if attempted else 0
+        }
+        for username, (solved, attempted, total) in rows.items()
+    }
 
-    # Combine data
-    for username in [username1, username2]:
-        if username in user_stats:
-            user_stats[username].update(contest_data.get(username, {'total_contests': 0}))
+# Rank group stats (see fetch_group_stats) by one of LEADERBOARD_KEYS
+def build_leaderboard(group_stats, sort_by="rating"):
+    if sort_by not in LEADERBOARD_KEYS:
+        raise ValueError(f"Cannot rank by {sort_by}")
+    keys = (sort_by,) + tuple(key for key in LEADERBOARD_KEYS if key != sort_by)
+    ranked = sorted(
+        group_stats.items(),
+        key=lambda item: tuple(-(item[1].get(key) or 0) for key in keys) + (item[0],)
+    )
+    leaderboard = []
+    for position, (username, stats) in enumerate(ranked, start=1):
+        # Users level on the ranking key share a rank
+        if leaderboard and (stats.get(sort_by) or 0) == (leaderboard[-1].get(sort_by) or 0):
+            rank = leaderboard[-1]["rank"]
+        else:
+            rank = position
+        leaderboard.append({"rank": rank, "username": username, **stats})
+    return leaderboard
+
+# N-way comparison (a team, a friend list): a constant number of queries for any group size
+def compare_users(cursor, db, usernames, sort_by="rating"):
+    group_stats = fetch_group_stats(cursor, db, usernames)
+    return {
+        "leaderboard": build_leaderboard(group_stats, sort_by),
+        # {username: {tag_name: attempted problems}} for any number of users
+        "tags_comparison": fetch_tag_counts(cursor, db, list(group_stats), "attempted"),
+        "missing_users": [username for username in dict.fromkeys(usernames) if username not in group_stats]
+    }
 
-    return user_stats
+# Compare a user with their k nearest peers by tag profile (see peer_index.py)
+def compare_with_peers(cursor, db, username, k=10, rating_band=None):
+    peers = find_peers(username, k, rating_band)
+    comparison = compare_users(cursor, db, [username] + [peer["username"] for peer in peers])
+    comparison["peers"] = peers
+    return comparison
+
+# Function to fetch and compute user comparison stats.
+# db defaults to the cursor's connection; it commits aggregates built for users that predate them.
+@cached_comparison("stats")
+def fetch_user_comparison_stats(cursor, username1, username2, db=None):
+    db = db or cursor._connection
+    group_stats = fetch_group_stats(cursor, db, [username1, username2])
+    return {
+        username: {key: stats[key] for key in ("rating", "problem_count", "max_rating", "total_contests")}
+        for username, stats in group_stats.items()
+    }
 
-# Function to fetch common contests
+# Function to fetch common contests (sorted-array intersection over the contest index)
+@cached_comparison("common_contests")
 def fetch_common_contests(cursor, username1, username2):
-    query = """
-    SELECT uc1.contest_id, c.contest_name, uc1.contest_rank AS user1_rank, uc2.contest_rank AS user2_rank
-    FROM user_contests uc1
-    JOIN user_contests uc2 ON uc1.contest_id = uc2.contest_id
-    JOIN contests c ON uc1.contest_id = c.contest_id
-    WHERE uc1.username = %s AND uc2.username = %s
-    """
-    execute_query(cursor, query, (username1, username2))
-    return [{"contest_id": contest[0], "contest_name": contest[1], f"{username1}_rank": contest[2], f"{username2}_rank": contest[3]} for contest in cursor.fetchall()]
+    common = get_contest_index(cursor).common_contests(username1, username2)
+    if not common:
+        return []
+    contest_ids = [contest[0] for contest in common]
+    cursor.execute(
+        f"SELECT contest_id, contest_name FROM contests WHERE contest_id IN ({_in_clause(contest_ids)})",
+        tuple(contest_ids)
+    )
+    names = dict(cursor.fetchall())
+    return [{"contest_id": contest[0], "contest_name": names.get(contest[0]), f"{username1}_rank": contest[1], f"{username2}_rank": contest[2]} for contest in common]
+
+# Wins/losses/ties of a user against each member of a group over their common contests
+def fetch_head_to_head(cursor, username, others):
+    return get_contest_index(cursor).head_to_head(username, others)
 
 # Function to calculate average submissions per problem
-def fetch_avg_submissions(cursor, username):
-    query = """
-    SELECT AVG(submissions_per_problem) AS avg_submissions
-    FROM (
-        SELECT COUNT(*) AS submissions_per_problem
-        FROM submissions
-        WHERE username = %s
-        GROUP BY problem_id
-    ) AS problem_submission_data
-    """
-    execute_query(cursor, query, (username,))
-    result = cursor.fetchone()
-    return result[0] if result else 0
-
-# Function to fetch tags comparison
-def fetch_tags_comparison(cursor, username1, username2):
-    query = """
-    SELECT pt.tag_id, t.tag_name, COUNT(DISTINCT s.problem_id) AS problem_count
-    FROM problem_tags pt
-    JOIN tags t ON pt.tag_id = t.tag_id
-    JOIN submissions s ON pt.problem_id = s.problem_id
-    WHERE s.username = %s
-    GROUP BY pt.tag_id
-    """
-    execute_query(cursor, query, (username1,))
-    tags_user1 = {tag[1]: tag[2] for tag in cursor.fetchall()}
-
-    execute_query(cursor, query, (username2,))
-    tags_user2 = {tag[1]: tag[2] for tag in cursor.fetchall()}
-
-    return {f"{username1}": tags_user1, f"{username2}": tags_user2}
+def fetch_avg_submissions(cursor, username, db=None):
+    db = db or cursor._connection
+    return fetch_group_submission_stats(cursor, db, [username])[username]["avg_submissions"]
+
+# Function to fetch tags comparison (attempted bitset & tag bitset popcounts)
+@cached_comparison("tags")
+def fetch_tags_comparison(cursor, username1, username2, db=None):
+    db = db or cursor._connection
+    return fetch_tag_counts(cursor, db, [username1, username2], "attempted")
+
+# Function to compare solved problem sets (bitwise AND of the users' solved bitsets)
+@cached_comparison("solved_overlap")
+def fetch_solved_overlap(cursor, db, username1, username2):
+    solved1 = load_user_bitsets(cursor, db, username1)["solved"]
+    solved2 = load_user_bitsets(cursor, db, username2)["solved"]
+    overlap = solved_overlap(solved1, solved2)
+    return {
+        "common_solved": overlap["common"],
+        f"only_{username1}": overlap["only_first"],
+        f"only_{username2}": overlap["only_second"]
+    }
 
 # Function to save data to a JSON file
 def save_data_to_json(data, file_name="comparison_stats.json"):
@@ -87,33 +170,38 @@ def save_data_to_json(data, file_name="comparison_stats.json"):
         json.dump(data, file, indent=4, default=decimal_default)
     print(f"Data saved to {file_name}")
 
-# Main function to fetch data from the database and store it in JSON
-def main():
-    username1 = "err_hexa"  # Replace with actual usernames
-    username2 = "aru123"
+# Full two-user report; cached as a whole, and each part is cached on its own too
+@cached_comparison("report")
+def build_comparison_report(cursor, db, username1, username2):
+    group_stats = fetch_group_stats(cursor, db, [username1, username2])
+    return {
+        "leaderboard": build_leaderboard(group_stats),
+        "user_comparison_stats": fetch_user_comparison_stats(cursor, username1, username2, db=db),
+        "common_contests": fetch_common_contests(cursor, username1, username2),
+        "head_to_head": fetch_head_to_head(cursor, username1, [username2]),
+        "avg_submissions": {username: stats["avg_submissions"] for username, stats in group_stats.items()},
+        "tags_comparison": fetch_tags_comparison(cursor, username1, username2, db=db),
+        "solved_overlap": fetch_solved_overlap(cursor, db, username1, username2)
+    }
 
+# Main function to fetch data from the database and store it in JSON.
+# Two users get the full pairwise report; any number get the leaderboard.
+def main(usernames):
     db, cursor = get_db_connection()
 
-    # Fetch and compute data
-    user_comparison_stats = fetch_user_comparison_stats(cursor, username1, username2)
-    common_contests = fetch_common_contests(cursor, username1, username2)
-    avg_submissions = {
-        username1: fetch_avg_submissions(cursor, username1),
-        username2: fetch_avg_submissions(cursor, username2)
-    }
-    tags_comparison = fetch_tags_comparison(cursor, username1, username2)
-
-    # Combine all data
-    all_data = {
-        "user_comparison_stats": user_comparison_stats,
-        "common_contests": common_contests,
-        "avg_submissions": avg_submissions,
-        "tags_comparison": tags_comparison
-    }
+    if len(usernames) == 2:
+        all_data = build_comparison_report(cursor, db, *usernames)
+    else:
+        all_data = compare_users(cursor, db, usernames)
+        if len(usernames) > 1:
+            all_data["head_to_head"] = fetch_head_to_head(cursor, usernames[0], usernames[1:])
 
     # Save data to JSON file
     save_data_to_json(all_data, 'comparison_stats.json')
     close_db_connection(db, cursor)
+    print(f"Comparison cache: {comparison_cache.stats()}")
 
 if __name__ == "__main__":
-    main()
+    import sys
+
+    main(sys.argv[1:] or ["err_hexa", "aru123"])  # Replace with actual usernames
@@ -2,6 +2,8 @@ import mysql.connector
 import requests
 from mysql.connector import Error
 from db import execute_query, get_db_connection, close_db_connection
+from result_cache import invalidate_user
+from contest_index import update_contest_index
 
 def fetch_contest_data(username):
     url = f"https://codeforces.com/api/user.rating?handle={username}"
@@ -16,6 +18,11 @@ def insert_contest_data(username, contest_data, cursor, db):
     query = """
     INSERT INTO user_contests (username, contest_id, contest_rank, rating_change, final_rating, penalty)
     VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        contest_rank = VALUES(contest_rank),
+        rating_change = VALUES(rating_change),
+        final_rating = VALUES(final_rating),
+        penalty = VALUES(penalty)
     """
     values = [
         (
@@ -44,6 +51,10 @@ def fill_user_contest(username):
                 cursor.execute("SELECT 1 FROM contests WHERE contest_id = %s", (contest_id,))
                 if cursor.fetchone():  
                     insert_contest_data(username, [contest], cursor, db)
+            # Contest results don't move last_updated, so cached comparisons key on this too
+            execute_query(cursor, "UPDATE users SET profile_version = profile_version + 1 WHERE username = %s", (username,))
+            invalidate_user(username)
+            update_contest_index(cursor, username)
             
     finally:
         close_db_connection(db, cursor)
@@ -0,0 +1,486 @@
+from collections import Counter
+from db import execute_query
+
+# Per-user aggregates maintained on ingest so profile views are point lookups.
+#
+#   user_problems       one row per (username, problem_id) with the attempt state
+#   user_stats          one row per user with the headline counters
+#   user_verdict_stats  per (username, verdict): distinct problems and submissions
+#   user_tag_stats      per (username, tag_id): solved and attempted problems
+#   user_rating_stats   per (username, diff_rating): solved problems and AC submissions
+#   user_contest_stats  per (username, contest_id): solved/attempted problems and first AC
+#   user_daily_activity per (username, day): first solves, first attempts and submissions
+
+AGGREGATE_TABLES = (
+    "user_problems",
+    "user_stats",
+    "user_verdict_stats",
+    "user_tag_stats",
+    "user_rating_stats",
+    "user_contest_stats",
+    "user_daily_activity"
+)
+
+# Create an empty per-problem state for a user
+def new_problem_state():
+    return {
+        "attempts": 0,
+        "attempts_before_ac": 0,
+        "solved": False,
+        "first_attempt_solved": False,
+        "first_attempt_time": None,
+        "first_ac_time": None,
+        "last_attempt_time": None,
+        "verdicts": set()
+    }
+
+# Fold time-ordered submissions into the per-problem states and return what changed.
+# `states` maps problem_id -> state and is updated in place.
+def fold_submissions(states, submissions):
+    delta = {
+        "total_submissions": 0,
+        "accepted_submissions": 0,
+        "first_attempt_solved": 0,
+        "newly_attempted": [],
+        "newly_solved": [],
+        "verdict_submissions": Counter(),
+        "verdict_problems": Counter(),
+        "accepted_by_problem": Counter(),
+        "touched": set(),
+        "daily": {},
+        "last_submission_time": None
+    }
+
+    for submission in submissions:
+        problem_id = submission["problem_id"]
+        verdict = submission["verdict"]
+        submission_time = submission["submission_time"]
+
+        day = delta["daily"].setdefault(
+            submission_time.date(), {"solved": 0, "attempted": 0, "submissions": 0, "accepted": 0}
+        )
+        day["submissions"] += 1
+
+        state = states.get(problem_id)
+        if state is None:
+            state = new_problem_state()
+            states[problem_id] = state
+        if state["attempts"] == 0:
+            state["first_attempt_time"] = submission_time
+            delta["newly_attempted"].append(problem_id)
+            day["attempted"] += 1
+
+        state["attempts"] += 1
+        state["last_attempt_time"] = submission_time
+        if verdict not in state["verdicts"]:
+            state["verdicts"].add(verdict)
+            delta["verdict_problems"][verdict] += 1
+
+        if verdict == "Accepted":
+            delta["accepted_submissions"] += 1
+            delta["accepted_by_problem"][problem_id] += 1
+            day["accepted"] += 1
+            if not state["solved"]:
+                day["solved"] += 1
+                state["solved"] = True
+                state["first_ac_time"] = submission_time
+                state["attempts_before_ac"] = state["attempts"] - 1
+                state["first_attempt_solved"] = state["attempts"] == 1
+                delta["newly_solved"].append(problem_id)
+                if state["first_attempt_solved"]:
+                    delta["first_attempt_solved"] += 1
+
+        delta["total_submissions"] += 1
+        delta["verdict_submissions"][verdict] += 1
+        delta["touched"].add(problem_id)
+        delta["last_submission_time"] = submission_time
+
+    return delta
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+def fetch_user_stats(cursor, username):
+    query = """
+    SELECT solved_count, attempted_count, first_attempt_solved, total_submissions,
+           accepted_submissions, accepted_rating_sum, max_accepted_rating, last_submission_time
+    FROM user_stats
+    WHERE username = %s
+    """
+    cursor.execute(query, (username,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return {
+        "solved_count": row[0],
+        "attempted_count": row[1],
+        "first_attempt_solved": row[2],
+        "total_submissions": row[3],
+        "accepted_submissions": row[4],
+        "accepted_rating_sum": row[5],
+        "max_accepted_rating": row[6],
+        "last_submission_time": row[7]
+    }
+
+def fetch_problem_states(cursor, username, problem_ids):
+    if not problem_ids:
+        return {}
+    query = f"""
+    SELECT problem_id, attempts, attempts_before_ac, solved, first_attempt_solved,
+           first_attempt_time, first_ac_time, last_attempt_time, verdicts
+    FROM user_problems
+    WHERE username = %s AND problem_id IN ({_in_clause(problem_ids)})
+    """
+    cursor.execute(query, (username, *problem_ids))
+    states = {}
+    for row in cursor.fetchall():
+        states[row[0]] = {
+            "attempts": row[1],
+            "attempts_before_ac": row[2],
+            "solved": bool(row[3]),
+            "first_attempt_solved": bool(row[4]),
+            "first_attempt_time": row[5],
+            "first_ac_time": row[6],
+            "last_attempt_time": row[7],
+            "verdicts": set(row[8].split(",")) if row[8] else set()
+        }
+    return states
+
+# problem_id -> diff_rating/contest_id, for the given problems or all of them (problem_ids=None)
+def fetch_problem_info(cursor, problem_ids=None):
+    if problem_ids is not None and not problem_ids:
+        return {}
+    query = "SELECT problem_id, diff_rating, contest_id FROM problems"
+    if problem_ids is not None:
+        query += f" WHERE problem_id IN ({_in_clause(problem_ids)})"
+    cursor.execute(query, tuple(problem_ids or ()))
+    return {row[0]: {"diff_rating": row[1], "contest_id": row[2]} for row in cursor.fetchall()}
+
+# problem_id -> [tag_id], for the given problems or all of them (problem_ids=None)
+def fetch_problem_tag_ids(cursor, problem_ids=None):
+    if problem_ids is not None and not problem_ids:
+        return {}
+    query = "SELECT DISTINCT problem_id, tag_id FROM problem_tags"
+    if problem_ids is not None:
+        query += f" WHERE problem_id IN ({_in_clause(problem_ids)})"
+    cursor.execute(query, tuple(problem_ids or ()))
+    tag_ids = {}
+    for problem_id, tag_id in cursor.fetchall():
+        tag_ids.setdefault(problem_id, []).append(tag_id)
+    return tag_ids
+
+# Write the folded states and counter deltas back to the aggregate tables.
+# Batch callers pass preloaded problem_info/problem_tag_ids maps to skip the per-user lookups.
+def _write_delta(cursor, username, states, delta, problem_info=None, problem_tag_ids=None):
+    problem_rows = []
+    for problem_id in sorted(delta["touched"]):
+        state = states[problem_id]
+        problem_rows.append((
+            username, problem_id, state["attempts"], state["attempts_before_ac"], state["solved"],
+            state["first_attempt_solved"], state["first_attempt_time"], state["first_ac_time"],
+            state["last_attempt_time"], ",".join(sorted(state["verdicts"]))
+        ))
+    if problem_rows:
+        query = """
+        INSERT INTO user_problems (
+            username, problem_id, attempts, attempts_before_ac, solved, first_attempt_solved,
+            first_attempt_time, first_ac_time, last_attempt_time, verdicts
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            attempts = VALUES(attempts),
+            attempts_before_ac = VALUES(attempts_before_ac),
+            solved = VALUES(solved),
+            first_attempt_solved = VALUES(first_attempt_solved),
+            first_attempt_time = VALUES(first_attempt_time),
+            first_ac_time = VALUES(first_ac_time),
+            last_attempt_time = VALUES(last_attempt_time),
+            verdicts = VALUES(verdicts)
+        """
+        execute_query(cursor, query, problem_rows, commit=False)
+
+    if problem_info is None:
+        problem_info = fetch_problem_info(
+            cursor, sorted(set(delta["accepted_by_problem"]) | set(delta["newly_solved"]) | set(delta["newly_attempted"]))
+        )
+    ratings = {problem_id: info["diff_rating"] for problem_id, info in problem_info.items()}
+    accepted_rating_sum = 0
+    max_accepted_rating = 0
+    rating_rows = Counter()
+    rating_solved = Counter()
+    for problem_id, accepted in delta["accepted_by_problem"].items():
+        rating = ratings.get(problem_id)
+        if rating is None:
+            continue
+        accepted_rating_sum += rating * accepted
+        max_accepted_rating = max(max_accepted_rating, rating)
+        rating_rows[rating] += accepted
+    for problem_id in delta["newly_solved"]:
+        rating = ratings.get(problem_id)
+        if rating is not None:
+            rating_solved[rating] += 1
+
+    query = """
+    INSERT INTO user_stats (
+        username, solved_count, attempted_count, first_attempt_solved, total_submissions,
+        accepted_submissions, accepted_rating_sum, max_accepted_rating, last_submission_time
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        solved_count = solved_count + VALUES(solved_count),
+        attempted_count = attempted_count + VALUES(attempted_count),
+        first_attempt_solved = first_attempt_solved + VALUES(first_attempt_solved),
+        total_submissions = total_submissions + VALUES(total_submissions),
+        accepted_submissions = accepted_submissions + VALUES(accepted_submissions),
+        accepted_rating_sum = accepted_rating_sum + VALUES(accepted_rating_sum),
+        max_accepted_rating = GREATEST(max_accepted_rating, VALUES(max_accepted_rating)),
+        last_submission_time = COALESCE(GREATEST(last_submission_time, VALUES(last_submission_time)), VALUES(last_submission_time))
+    """
+    values = (
+        username,
+        len(delta["newly_solved"]),
+        len(delta["newly_attempted"]),
+        delta["first_attempt_solved"],
+        delta["total_submissions"],
+        delta["accepted_submissions"],
+        accepted_rating_sum,
+        max_accepted_rating,
+        delta["last_submission_time"]
+    )
+    execute_query(cursor, query, values, commit=False)
+
+    verdict_rows = [
+        (username, verdict, delta["verdict_problems"][verdict], delta["verdict_submissions"][verdict])
+        for verdict in sorted(delta["verdict_submissions"])
+    ]
+    if verdict_rows:
+        query = """
+        INSERT INTO user_verdict_stats (username, verdict, problem_count, submission_count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            problem_count = problem_count + VALUES(problem_count),
+            submission_count = submission_count + VALUES(submission_count)
+        """
+        execute_query(cursor, query, verdict_rows, commit=False)
+
+    tag_ids = problem_tag_ids
+    if tag_ids is None:
+        tag_ids = fetch_problem_tag_ids(cursor, sorted(set(delta["newly_attempted"]) | set(delta["newly_solved"])))
+    tag_solved = Counter()
+    tag_attempted = Counter()
+    for problem_id in delta["newly_attempted"]:
+        for tag_id in tag_ids.get(problem_id, []):
+            tag_attempted[tag_id] += 1
+    for problem_id in delta["newly_solved"]:
+        for tag_id in tag_ids.get(problem_id, []):
+            tag_solved[tag_id] += 1
+    tag_rows = [
+        (username, tag_id, tag_solved[tag_id], tag_attempted[tag_id])
+        for tag_id in sorted(set(tag_solved) | set(tag_attempted))
+    ]
+    if tag_rows:
+        query = """
+        INSERT INTO user_tag_stats (username, tag_id, solved_count, attempted_count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            solved_count = solved_count + VALUES(solved_count),
+            attempted_count = attempted_count + VALUES(attempted_count)
+        """
+        execute_query(cursor, query, tag_rows, commit=False)
+
+    rating_values = [
+        (username, rating, rating_solved[rating], rating_rows[rating])
+        for rating in sorted(set(rating_solved) | set(rating_rows))
+    ]
+    if rating_values:
+        query = """
+        INSERT INTO user_rating_stats (username, diff_rating, solved_count, accepted_submissions)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            solved_count = solved_count + VALUES(solved_count),
+            accepted_submissions = accepted_submissions + VALUES(accepted_submissions)
+        """
+        execute_query(cursor, query, rating_values, commit=False)
+
+    contest_rows = {}
+    for problem_id in delta["newly_attempted"] + delta["newly_solved"]:
+        contest_id = problem_info.get(problem_id, {}).get("contest_id")
+        if contest_id is not None:
+            contest_rows.setdefault(contest_id, {"solved": 0, "attempted": 0, "first_ac_time": None})
+    for problem_id in delta["newly_attempted"]:
+        contest_id = problem_info.get(problem_id, {}).get("contest_id")
+        if contest_id is not None:
+            contest_rows[contest_id]["attempted"] += 1
+    for problem_id in delta["newly_solved"]:
+        contest_id = problem_info.get(problem_id, {}).get("contest_id")
+        if contest_id is None:
+            continue
+        row = contest_rows[contest_id]
+        row["solved"] += 1
+        first_ac_time = states[problem_id]["first_ac_time"]
+        if row["first_ac_time"] is None or first_ac_time < row["first_ac_time"]:
+            row["first_ac_time"] = first_ac_time
+    contest_values = [
+        (username, contest_id, row["solved"], row["attempted"], row["first_ac_time"])
+        for contest_id, row in sorted(contest_rows.items())
+    ]
+    if contest_values:
+        query = """
+        INSERT INTO user_contest_stats (username, contest_id, problems_solved, problems_attempted, first_ac_time)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            problems_solved = problems_solved + VALUES(problems_solved),
+            problems_attempted = problems_attempted + VALUES(problems_attempted),
+            first_ac_time = COALESCE(LEAST(first_ac_time, VALUES(first_ac_time)), first_ac_time, VALUES(first_ac_time))
+        """
+        execute_query(cursor, query, contest_values, commit=False)
+
+    daily_values = [
+        (username, activity_date, day["solved"], day["attempted"], day["submissions"], day["accepted"])
+        for activity_date, day in sorted(delta["daily"].items())
+    ]
+    if daily_values:
+        query = """
+        INSERT INTO user_daily_activity (
+            username, activity_date, solved_count, attempted_count, submission_count, accepted_count
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            solved_count = solved_count + VALUES(solved_count),
+            attempted_count = attempted_count + VALUES(attempted_count),
+            submission_count = submission_count + VALUES(submission_count),
+            accepted_count = accepted_count + VALUES(accepted_count)
+        """
+        execute_query(cursor, query, daily_values, commit=False)
+
+# Delete the aggregate rows of the given users (all users when usernames is None)
+def clear_user_stats(cursor, usernames=None):
+    for table in AGGREGATE_TABLES:
+        if usernames is None:
+            execute_query(cursor, f"DELETE FROM {table}", commit=False)
+        elif usernames:
+            execute_query(cursor, f"DELETE FROM {table} WHERE username IN ({_in_clause(usernames)})", tuple(usernames), commit=False)
+
+# Fold a user's complete, time-ordered history into freshly cleared aggregates
+def rebuild_user_stats_from_rows(cursor, db, username, submissions, problem_info=None, problem_tag_ids=None, commit=True):
+    states = {}
+    delta = fold_submissions(states, submissions)
+    _write_delta(cursor, username, states, delta, problem_info, problem_tag_ids)
+    if commit:
+        db.commit()
+    return delta
+
+# Recompute every aggregate for a user from the submissions table
+def rebuild_user_stats(cursor, db, username, commit=True):
+    clear_user_stats(cursor, [username])
+
+    query = """
+    SELECT problem_id, verdict, submission_time
+    FROM submissions
+    WHERE username = %s
+    ORDER BY submission_time, submission_id
+    """
+    cursor.execute(query, (username,))
+    submissions = [
+        {"problem_id": row[0], "verdict": row[1], "submission_time": row[2]}
+        for row in cursor.fetchall()
+    ]
+    return rebuild_user_stats_from_rows(cursor, db, username, submissions, commit=commit)
+
+# Apply newly ingested submissions to the user's aggregates and return the folded delta.
+# Each submission is a dict with problem_id, verdict and submission_time.
+def update_user_stats(cursor, db, username, submissions, commit=True):
+    if not submissions:
+        return
+    submissions = sorted(submissions, key=lambda s: s["submission_time"])
+
+    stats = fetch_user_stats(cursor, username)
+    last_seen = stats["last_submission_time"] if stats else None
+    if stats is None or (last_seen is not None and submissions[0]["submission_time"] < last_seen):
+        # No aggregates yet, or the new rows land before ones we already folded:
+        # the rows are already in `submissions`, so recompute in order from there.
+        return rebuild_user_stats(cursor, db, username, commit=commit)
+
+    problem_ids = sorted({s["problem_id"] for s in submissions})
+    states = fetch_problem_states(cursor, username, problem_ids)
+    delta = fold_submissions(states, submissions)
+    _write_delta(cursor, username, states, delta)
+    if commit:
+        db.commit()
+    return delta
+
+# Return the user's aggregate row, building it first if the user predates the tables
+def ensure_user_stats(cursor, db, username, commit=True):
+    stats = fetch_user_stats(cursor, username)
+    if stats is None:
+        rebuild_user_stats(cursor, db, username, commit=commit)
+        stats = fetch_user_stats(cursor, username)
+    return stats
+
+def fetch_user_verdict_counts(cursor, username):
+    query = "SELECT verdict, problem_count FROM user_verdict_stats WHERE username = %s"
+    cursor.execute(query, (username,))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+def fetch_user_rating_counts(cursor, username):
+    query = """
+    SELECT diff_rating, solved_count, accepted_submissions
+    FROM user_rating_stats
+    WHERE username = %s
+    ORDER BY diff_rating
+    """
+    cursor.execute(query, (username,))
+    return [
+        {"diff_rating": row[0], "solved_count": row[1], "accepted_submissions": row[2]}
+        for row in cursor.fetchall()
+    ]
+
+# Rebuild user_contest_stats for every user (or one) straight from user_problems
+def rebuild_user_contest_stats(cursor, db, username=None):
+    where = "WHERE up.username = %s" if username else ""
+    values = (username,) if username else None
+    delete_query = "DELETE FROM user_contest_stats" + (" WHERE username = %s" if username else "")
+    execute_query(cursor, delete_query, values, commit=False)
+
+    query = f"""
+    INSERT INTO user_contest_stats (username, contest_id, problems_solved, problems_attempted, first_ac_time)
+    SELECT up.username, p.contest_id, SUM(up.solved), COUNT(*), MIN(up.first_ac_time)
+    FROM user_problems up
+    JOIN problems p ON up.problem_id = p.problem_id
+    {where}
+    GROUP BY up.username, p.contest_id
+    """
+    execute_query(cursor, query, values, commit=False)
+    db.commit()
+
+def fetch_all_usernames(cursor):
+    cursor.execute("SELECT username FROM users")
+    return [row[0] for row in cursor.fetchall()]
+
+# Bulk rebuild: python3 user_stats.py [--contests-only] [username ...]
+if __name__ == "__main__":
+    import sys
+    from db import get_db_connection, close_db_connection
+
+    args = sys.argv[1:]
+    contests_only = "--contests-only" in args
+    usernames = [arg for arg in args if arg != "--contests-only"]
+
+    db, cursor = get_db_connection()
+    try:
+        if contests_only:
+            if usernames:
+                for username in usernames:
+                    rebuild_user_contest_stats(cursor, db, username)
+            else:
+                rebuild_user_contest_stats(cursor, db)
+        else:
+            from bitsets import rebuild_user_bitsets, refresh_tag_bitsets
+
+            refresh_tag_bitsets(cursor, db)
+            for username in usernames or fetch_all_usernames(cursor):
+                rebuild_user_stats(cursor, db, username)
+                rebuild_user_bitsets(cursor, db, username)
+                print(f"Rebuilt aggregates for {username}")
+    finally:
+        close_db_connection(db, cursor)
@@ -145,18 +145,53 @@ app.get('/api/users', (req, res) => {
     });
 });
 
-// Endpoint to get specific user data files
+// Build a single user artifact on demand with jsonify/artifact.py
+function buildUserArtifact(username, filetype, callback) {
+    const scriptPath = path.join(__dirname, 'jsonify', 'artifact.py');
+    const child = spawn('python3', [scriptPath, username, filetype], { cwd: __dirname });
+
+    let scriptError = '';
+    child.stderr.on('data', (data) => {
+        scriptError += data.toString();
+    });
+    child.on('close', (code) => callback(code, scriptError));
+    child.on('error', (err) => callback(-1, err.message));
+}
+
+// Artifacts that depend on other users' data (percentiles), so a file written for an
+// earlier request goes stale without this user being re-ingested. They are rebuilt on
+// every request; artifact.py only recomputes the volatile part, the rest is cached.
+const VOLATILE_ARTIFACTS = new Set(['rating_analytics', 'last_10_submissions']);
+
+// Endpoint to get specific user data files (generated lazily on first request)
 app.get('/api/users/:username/:filetype', (req, res) => {
     const { username, filetype } = req.params;
     const filePath = path.join(__dirname, 'users', username, `${username}_${filetype}.json`);
 
-    fs.readFile(filePath, 'utf8', (err, data) => {
-        if (err) {
-            console.error(`Failed to read file: ${filePath}`, err);
-            return res.status(404).json({ message: "File not found." });
+    const sendFile = () => {
+        fs.readFile(filePath, 'utf8', (err, data) => {
+            if (err) {
+                console.error(`Failed to read file: ${filePath}`, err);
+                return res.status(404).json({ message: "File not found." });
+            }
+            res.setHeader('Content-Type', 'application/json');
+            res.send(data);
+        });
+    };
+
+    if (!VOLATILE_ARTIFACTS.has(filetype) && fs.existsSync(filePath)) {
+        return sendFile();
+    }
+
+    buildUserArtifact(username, filetype, (code, scriptError) => {
+        if (code === 2) {
+            return res.status(404).json({ message: "Unknown file type." });
+        }
+        if (code !== 0) {
+            console.error(`artifact.py exited with code ${code}: ${scriptError}`);
+            return res.status(500).json({ message: "Failed to generate file." });
         }
-        res.setHeader('Content-Type', 'application/json');
-        res.send(data);
+        sendFile();
     });
 });
 
@@ -1,5 +1,22 @@
 USE cpdbs;
 
+DROP TABLE IF EXISTS submission_perf_stats;
+DROP TABLE IF EXISTS problem_daily_hll;
+DROP TABLE IF EXISTS problem_hll;
+DROP TABLE IF EXISTS problem_rating_stats;
+DROP TABLE IF EXISTS problem_title_stats;
+DROP TABLE IF EXISTS problem_verdict_stats;
+DROP TABLE IF EXISTS problem_stats;
+DROP TABLE IF EXISTS tag_bitsets;
+DROP TABLE IF EXISTS user_bitsets;
+DROP TABLE IF EXISTS problem_bit_index;
+DROP TABLE IF EXISTS user_daily_activity;
+DROP TABLE IF EXISTS user_contest_stats;
+DROP TABLE IF EXISTS user_rating_stats;
+DROP TABLE IF EXISTS user_tag_stats;
+DROP TABLE IF EXISTS user_verdict_stats;
+DROP TABLE IF EXISTS user_stats;
+DROP TABLE IF EXISTS user_problems;
 DROP TABLE IF EXISTS problem_tags;
 DROP TABLE IF EXISTS user_contests;
 DROP TABLE IF EXISTS contest_authors;
@@ -19,7 +36,10 @@ CREATE TABLE users (
     max_rating SMALLINT DEFAULT NULL,
     rating_title VARCHAR(30),
     last_updated DATETIME NULL,
-    password VARCHAR(255) NOT NULL
+    password VARCHAR(255) NOT NULL,
+    -- Bumped when profile details or contest results are rewritten; last_updated only
+    -- tracks submissions (it is the ingest watermark), so caches key on both
+    profile_version INT DEFAULT 0
 );
 
 CREATE TABLE contests (
@@ -29,7 +49,16 @@ CREATE TABLE contests (
     end_time DATETIME,
     duration VARCHAR(20),
     contest_type VARCHAR(20),
-    is_balanced BOOL DEFAULT TRUE
+    is_balanced BOOL DEFAULT TRUE,
+    -- Bumped whenever a problem is added to the contest; label.py records the
+    -- version it labeled so unchanged contests are skipped on the next run
+    problems_version INT DEFAULT 0,
+    labeled_version INT DEFAULT -1,
+    -- Written by `model.py score`: predicted probability that the contest is balanced,
+    -- the model version that produced it and the problems_version it was scored from
+    balance_score FLOAT DEFAULT NULL,
+    scored_model_version INT DEFAULT NULL,
+    scored_version INT DEFAULT -1
 );
 
 CREATE TABLE problems (
@@ -74,6 +103,8 @@ CREATE TABLE user_contests(
     rating_change SMALLINT,
     final_rating SMALLINT,
     penalty SMALLINT,
+    -- One row per user and contest; re-ingesting a user updates it in place
+    UNIQUE KEY uq_user_contests (username, contest_id),
     FOREIGN KEY (username) REFERENCES users(username),
     FOREIGN KEY (contest_id) REFERENCES contests(contest_id)
 );
@@ -85,6 +116,177 @@ CREATE TABLE contest_authors(
     FOREIGN KEY (contest_id) REFERENCES contests(contest_id)
 );
 
+-- Per-user aggregates, maintained on ingest by jsonify/user_stats.py
+CREATE TABLE user_problems(
+    username VARCHAR(50),
+    problem_id VARCHAR(10),
+    attempts INT DEFAULT 0,
+    attempts_before_ac INT DEFAULT 0,
+    solved BOOL DEFAULT FALSE,
+    first_attempt_solved BOOL DEFAULT FALSE,
+    first_attempt_time DATETIME NULL,
+    first_ac_time DATETIME NULL,
+    last_attempt_time DATETIME NULL,
+    verdicts VARCHAR(255) DEFAULT '',
+    PRIMARY KEY (username, problem_id),
+    INDEX idx_user_problems_unsolved (username, solved, last_attempt_time),
+    FOREIGN KEY (username) REFERENCES users(username),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+CREATE TABLE user_stats(
+    username VARCHAR(50) PRIMARY KEY,
+    solved_count INT DEFAULT 0,
+    attempted_count INT DEFAULT 0,
+    first_attempt_solved INT DEFAULT 0,
+    total_submissions INT DEFAULT 0,
+    accepted_submissions INT DEFAULT 0,
+    accepted_rating_sum BIGINT DEFAULT 0,
+    max_accepted_rating SMALLINT DEFAULT 0,
+    last_submission_time DATETIME NULL,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+
+CREATE TABLE user_verdict_stats(
+    username VARCHAR(50),
+    verdict VARCHAR(30),
+    problem_count INT DEFAULT 0,
+    submission_count INT DEFAULT 0,
+    PRIMARY KEY (username, verdict),
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+
+CREATE TABLE user_tag_stats(
+    username VARCHAR(50),
+    tag_id INT,
+    solved_count INT DEFAULT 0,
+    attempted_count INT DEFAULT 0,
+    PRIMARY KEY (username, tag_id),
+    FOREIGN KEY (username) REFERENCES users(username),
+    FOREIGN KEY (tag_id) REFERENCES tags(tag_id)
+);
+
+CREATE TABLE user_rating_stats(
+    username VARCHAR(50),
+    diff_rating SMALLINT,
+    solved_count INT DEFAULT 0,
+    accepted_submissions INT DEFAULT 0,
+    PRIMARY KEY (username, diff_rating),
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+
+CREATE TABLE user_contest_stats(
+    username VARCHAR(50),
+    contest_id INT,
+    problems_solved INT DEFAULT 0,
+    problems_attempted INT DEFAULT 0,
+    first_ac_time DATETIME NULL,
+    PRIMARY KEY (username, contest_id),
+    FOREIGN KEY (username) REFERENCES users(username),
+    FOREIGN KEY (contest_id) REFERENCES contests(contest_id)
+);
+
+CREATE TABLE user_daily_activity(
+    username VARCHAR(50),
+    activity_date DATE,
+    solved_count INT DEFAULT 0,
+    attempted_count INT DEFAULT 0,
+    submission_count INT DEFAULT 0,
+    accepted_count INT DEFAULT 0,
+    PRIMARY KEY (username, activity_date),
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+
+-- Solved/attempted sets as bitsets over a dense problem index (jsonify/bitsets.py)
+CREATE TABLE problem_bit_index(
+    bit_index INT PRIMARY KEY AUTO_INCREMENT,
+    problem_id VARCHAR(10) UNIQUE,
+    -- Set once the problem's tags are in tag_bitsets
+    tagged BOOLEAN DEFAULT FALSE,
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+CREATE TABLE user_bitsets(
+    username VARCHAR(50) PRIMARY KEY,
+    solved_bits MEDIUMBLOB,
+    attempted_bits MEDIUMBLOB,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+
+CREATE TABLE tag_bitsets(
+    tag_id INT PRIMARY KEY,
+    problem_bits MEDIUMBLOB,
+    FOREIGN KEY (tag_id) REFERENCES tags(tag_id)
+);
+
+-- Per-problem aggregates maintained on ingest (jsonify/problem_stats.py)
+CREATE TABLE problem_stats(
+    problem_id VARCHAR(10) PRIMARY KEY,
+    total_submissions INT DEFAULT 0,
+    accepted_submissions INT DEFAULT 0,
+    attempter_count INT DEFAULT 0,
+    solver_count INT DEFAULT 0,
+    attempts_before_ac_sum BIGINT DEFAULT 0,
+    solver_submissions BIGINT DEFAULT 0,
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+CREATE TABLE problem_verdict_stats(
+    problem_id VARCHAR(10),
+    verdict VARCHAR(30) DEFAULT '',
+    submission_count INT DEFAULT 0,
+    PRIMARY KEY (problem_id, verdict),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+CREATE TABLE problem_title_stats(
+    problem_id VARCHAR(10),
+    rating_title VARCHAR(30) DEFAULT '',
+    solver_count INT DEFAULT 0,
+    rating_sum BIGINT DEFAULT 0,
+    PRIMARY KEY (problem_id, rating_title),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+-- Solver-rating histogram in 25-point buckets, read as a quantile sketch
+CREATE TABLE problem_rating_stats(
+    problem_id VARCHAR(10),
+    rating_bucket SMALLINT,
+    solver_count INT DEFAULT 0,
+    PRIMARY KEY (problem_id, rating_bucket),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+-- HyperLogLog sketches of distinct attempters/solvers (jsonify/hll.py)
+CREATE TABLE problem_hll(
+    problem_id VARCHAR(10),
+    kind VARCHAR(10),
+    rating_title VARCHAR(30) DEFAULT '*',
+    registers BLOB,
+    PRIMARY KEY (problem_id, kind, rating_title),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+CREATE TABLE problem_daily_hll(
+    problem_id VARCHAR(10),
+    kind VARCHAR(10),
+    sketch_date DATE,
+    registers BLOB,
+    PRIMARY KEY (problem_id, kind, sketch_date),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
+-- Log-bucketed runtime/memory histograms of accepted submissions (jsonify/perf_stats.py)
+CREATE TABLE submission_perf_stats(
+    problem_id VARCHAR(10),
+    language_used VARCHAR(50) DEFAULT '',
+    metric VARCHAR(10),
+    bucket SMALLINT,
+    solution_count INT DEFAULT 0,
+    PRIMARY KEY (problem_id, language_used, metric, bucket),
+    FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+);
+
 INSERT INTO tags (tag_name) VALUES 
 ('implementation'), 
 ('dp'), 
@@ -27,7 +27,7 @@ def fetch_user_contests(user_handle, last_update):
 
 def insert_user_contests(cursor, db, username, contests):
     query = """
-    INSERT INTO user_contests (username, contest_id)
+    INSERT IGNORE INTO user_contests (username, contest_id)
     VALUES (%s, %s)
     """
     for contest_id, _ in contests:
@@ -52,7 +52,10 @@ function UserAnalytics({ handle, onLogout }) {
         const problemCountByRating = await import(`../../users/${handle}/${handle}_problem_count_by_rating.json`);
         const contestCards = await import(`../../users/${handle}/${handle}_contest_cards.json`);
         const contestCountBestRank = await import(`../../users/${handle}/${handle}_contest_count_best_rank.json`);
-        const lastSubmissionsData = await import(`../../users/${handle}/submissions/${handle}_last_10_submissions.json`);
+        // Served by the API: percentiles move with other users' submissions, so it is rebuilt per request
+        const lastSubmissionsResponse = await fetch(`http://localhost:5000/api/users/${encodeURIComponent(handle)}/last_10_submissions`);
+        if (!lastSubmissionsResponse.ok) throw new Error(`Failed to fetch last_10_submissions for ${handle}`);
+        const lastSubmissionsData = await lastSubmissionsResponse.json();
         const monthlyProblemCountData = await import(`../../users/${handle}/monthly_problem_count.json`);
         const userBasicInfo = await import(`../../users/${handle}/${handle}_basic_info.json`);
         const recommendedProblemsData = await import(`../../users/${handle}/recommended_problems.json`); // Fetch recommended problems
@@ -69,7 +72,7 @@ function UserAnalytics({ handle, onLogout }) {
         setProblemTagData(userDataFile.default.problem_tags_count);
         setContestData(contestCards.default);
         setContestStats(contestCountBestRank.default[0]);
-        setLastSubmissions(lastSubmissionsData.default);
+        setLastSubmissions(lastSubmissionsData);
         setMonthlyProblemCount(monthlyProblemCountData.default); // Set monthly problem count
         setRecommendedProblems(recommendedProblemsData.default); // Set recommended problems
       } catch (error) {
@@ -0,0 +1,41 @@
+-- Upgrades an existing cpdbs database in place (setup_database.sql drops every table).
+-- Run each section once, in order, on databases created before that change.
+USE cpdbs;
+
+-- user_contests: one row per (username, contest_id).
+-- Re-ingests used to insert the same contest again. Duplicates come from the same
+-- Codeforces record, so collapsing them with MIN keeps the values they agree on.
+START TRANSACTION;
+
+CREATE TEMPORARY TABLE duplicate_user_contests AS
+SELECT
+    username,
+    contest_id,
+    MIN(contest_rank) AS contest_rank,
+    MIN(rating_change) AS rating_change,
+    MIN(final_rating) AS final_rating,
+    MIN(penalty) AS penalty
+FROM user_contests
+GROUP BY username, contest_id
+HAVING COUNT(*) > 1;
+
+DELETE uc
+FROM user_contests uc
+JOIN duplicate_user_contests d ON uc.username = d.username AND uc.contest_id = d.contest_id;
+
+INSERT INTO user_contests (username, contest_id, contest_rank, rating_change, final_rating, penalty)
+SELECT username, contest_id, contest_rank, rating_change, final_rating, penalty
+FROM duplicate_user_contests;
+
+DROP TEMPORARY TABLE duplicate_user_contests;
+
+COMMIT;
+
+ALTER TABLE user_contests ADD UNIQUE KEY uq_user_contests (username, contest_id);
+
+-- users.profile_version: bumped by profile and contest writers, part of the result cache keys
+ALTER TABLE users ADD COLUMN profile_version INT DEFAULT 0;
+
+-- problem_bit_index.tagged: problems already folded into tag_bitsets.
+-- Existing problems start unmarked and are folded in on the next tag count read.
+ALTER TABLE problem_bit_index ADD COLUMN tagged BOOLEAN DEFAULT FALSE;
@@ -6,7 +6,6 @@ const fetch = require('node-fetch');
 const router = express.Router();
 const path = require('path');
 const db = require('./db');
-const fs = require('fs');
 
 // Simple Registration Endpoint with automatic Codeforces data fetch
 // Extracted registration handler so we can mount it on multiple paths
@@ -543,63 +542,105 @@ async function loginHandler(req, res) {
 router.post('/login', loginHandler);
 router.post('/users/login', loginHandler);
 
-// Generate Problem Analysis Endpoint
-router.post('/problems/analysis', (req, res) => {
-  const { problem_id } = req.body;
+// Long-lived author_problem_anal.py worker: one Python process with warm MySQL
+// connections answers every /problems/analysis request over newline-delimited
+// JSON on stdin/stdout. It is started on first use and restarted if it dies.
+let analysisWorker = null;
+let nextAnalysisRequestId = 1;
 
-  if (!problem_id) {
-    return res.status(400).json({ error: 'Problem ID is required.' });
+function getAnalysisWorker() {
+  if (analysisWorker) {
+    return analysisWorker;
   }
 
-  const scriptPath = path.join(__dirname, "jsonify", 'author_problem_anal.py'); // Adjusted path
-
-  const process = spawn('python3', [scriptPath, problem_id]);
+  const scriptPath = path.join(__dirname, 'jsonify', 'author_problem_anal.py');
+  const worker = spawn('python3', [scriptPath, '--serve'], { cwd: __dirname });
+  worker.pending = new Map();
+  let buffer = '';
+
+  worker.stdout.on('data', (data) => {
+    buffer += data.toString();
+    let newline;
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (!line.trim()) {
+        continue;
+      }
 
-  let scriptOutput = '';
-  let scriptError = '';
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (parseErr) {
+        console.error(`Invalid response from problem analysis worker: ${parseErr.message}`);
+        continue;
+      }
 
-  process.stdout.on('data', (data) => {
-    scriptOutput += data.toString();
+      const callback = worker.pending.get(message.id);
+      if (callback) {
+        worker.pending.delete(message.id);
+        callback(message.error ? new Error(message.error) : null, message.report);
+      }
+    }
   });
 
-  process.stderr.on('data', (data) => {
-    scriptError += data.toString();
+  worker.stderr.on('data', (data) => {
+    console.error(`author_problem_anal.py: ${data.toString()}`);
   });
 
-  process.on('close', (code) => {
-    if (code !== 0) {
-      console.error(`Script exited with code ${code}: ${scriptError}`);
-      return res.status(500).json({ error: 'Failed to generate problem analysis.' });
+  const failPending = (err) => {
+    if (analysisWorker === worker) {
+      analysisWorker = null;
     }
-
-    const filePath = path.join(__dirname, 'problem_analysis', `${problem_id}_analysis.json`); // Updated path
-
-    // Check if the JSON file exists
-    if (!fs.existsSync(filePath)) {
-      console.error(`JSON file not found at path: ${filePath}`);
-      return res.status(500).json({ error: 'Problem analysis JSON file not found.' });
+    for (const callback of worker.pending.values()) {
+      callback(err);
     }
+    worker.pending.clear();
+  };
 
-    // Read the generated JSON file
-    fs.readFile(filePath, 'utf8', (err, data) => {
-      if (err) {
-        console.error(`Error reading JSON file: ${err.message}`);
-        return res.status(500).json({ error: 'Failed to read problem analysis data.' });
-      }
+  worker.on('exit', (code) => {
+    failPending(new Error(`Problem analysis worker exited with code ${code}`));
+  });
 
-      try {
-        const jsonData = JSON.parse(data);
-        return res.status(200).json(jsonData);
-      } catch (parseErr) {
-        console.error(`JSON parse error: ${parseErr.message}`);
-        return res.status(500).json({ error: 'Invalid JSON format.' });
-      }
-    });
+  worker.on('error', (err) => {
+    failPending(new Error(`Failed to start author_problem_anal.py: ${err.message}`));
   });
 
-  process.on('error', (err) => {
-    console.error(`Failed to start author_problem_anal.py: ${err.message}`);
-    return res.status(500).json({ error: 'Failed to execute problem analysis script.' });
+  // Writes to a worker that has just died fail with EPIPE; surface that to the waiting requests
+  worker.stdin.on('error', (err) => {
+    failPending(err);
+  });
+
+  analysisWorker = worker;
+  return worker;
+}
+
+// start/end (YYYY-MM-DD, optional) limit unique_user_interactions to that date range
+function requestProblemAnalysis(problemId, range, callback) {
+  const worker = getAnalysisWorker();
+  const id = nextAnalysisRequestId++;
+  worker.pending.set(id, callback);
+  worker.stdin.write(JSON.stringify({ id, problem_id: problemId, start: range.start, end: range.end }) + '\n');
+}
+
+// Generate Problem Analysis Endpoint
+router.post('/problems/analysis', (req, res) => {
+  const { problem_id, start = null, end = null } = req.body;
+
+  if (!problem_id) {
+    return res.status(400).json({ error: 'Problem ID is required.' });
+  }
+  const isDate = (value) => value === null || /^\d{4}-\d{2}-\d{2}$/.test(String(value));
+  if (!isDate(start) || !isDate(end)) {
+    return res.status(400).json({ error: 'start and end must be YYYY-MM-DD dates.' });
+  }
+
+  requestProblemAnalysis(String(problem_id), { start, end }, (err, report) => {
+    if (err) {
+      console.error(`Problem analysis failed for ${problem_id}: ${err.message}`);
+      return res.status(500).json({ error: 'Failed to generate problem analysis.' });
+    }
+    return res.status(200).json(report);
   });
 });
 